@@ -0,0 +1,29 @@
+from rest_framework import serializers
+from database.models import BookingInfo
+
+
+class BookingItemInputSerializer(serializers.Serializer):
+    """
+    One ticket line of a booking to create.
+    """
+    ticket_type_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class BookingInfoInputSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BookingInfo
+        fields = ['phone_number', 'email', 'full_name', 'country', 'hotel_address', 'state']
+
+
+class BookingInputSerializer(serializers.Serializer):
+    """
+    Input of the bulk booking creation, validated without touching the database.
+    """
+    tour_id = serializers.IntegerField()
+    departure_date = serializers.DateTimeField()
+    items = BookingItemInputSerializer(many=True, allow_empty=False)
+    info = BookingInfoInputSerializer(required=False, allow_null=True)
+    status = serializers.ChoiceField(choices=['pending', 'confirmed'], default='pending')
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+    discount_code = serializers.CharField(required=False, allow_blank=True, default='')
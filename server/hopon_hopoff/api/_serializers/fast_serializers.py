@@ -0,0 +1,145 @@
+from itertools import islice
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from rest_framework import serializers
+
+# Fields whose to_representation is a no-op for values coming straight from the database
+PASSTHROUGH_FIELDS = (
+    serializers.CharField, serializers.IntegerField, serializers.BooleanField, serializers.ReadOnlyField,
+)
+
+# Registry of fast serializers by DRF serializer class, used to compile nested serializers
+registry = {}
+
+
+class FastListSerializer:
+    """
+    Read-only, list-only counterpart of a DRF serializer.
+    The serializer fields are compiled once into a values_list() projection and a row -> dict plan
+    with precompiled formatters. The output has the same JSON shape as `serializer_class(many=True).data`.
+
+    method_fields: SerializerMethodField name -> (column, formatter or None), formatter gets the raw value.
+    batch_fields: field name -> (key column, loader), loader(keys) returns {key: value} for every key of a page.
+    """
+    def __init__(self, serializer_class, method_fields=None, batch_fields=None):
+        self.serializer_class = serializer_class
+        self.method_fields = method_fields or {}
+        self.batch_fields = batch_fields or {}
+        self.columns = None
+        self.plan = None
+        self.batches = None
+        registry[serializer_class] = self
+
+    def compile(self):
+        columns = []
+        batches = []
+        plan = self.compile_serializer(self.serializer_class(), '', (), columns, batches)
+        self.columns = columns
+        self.batches = batches
+        # Published last: serialize() only checks the plan
+        self.plan = plan
+
+    def compile_serializer(self, serializer, prefix, names, columns, batches):
+        spec = registry.get(type(serializer), self)
+        model = serializer.Meta.model
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in spec.batch_fields:
+                key, loader = spec.batch_fields[name]
+                batches.append((name, loader, names))
+                plan.append((name, self.add_column(columns, prefix + key), None))
+            elif isinstance(field, serializers.SerializerMethodField):
+                if name not in spec.method_fields:
+                    raise ImproperlyConfigured(f"{type(serializer).__name__}.{name} needs a fast formatter.")
+                column, formatter = spec.method_fields[name]
+                plan.append((name, self.add_column(columns, prefix + column), formatter))
+            elif isinstance(field, serializers.BaseSerializer):
+                nested_prefix = prefix + field.source.replace('.', '__') + '__'
+                plan.append((name, None, self.compile_serializer(field, nested_prefix, names + (name,), columns, batches)))
+            else:
+                path = field.source.replace('.', '__')
+                if not self.is_model_path(model, path):
+                    # Same fallback as DRF when the attribute does not exist
+                    if field.allow_null:
+                        plan.append((name, None, None))
+                        continue
+                    if not field.required:
+                        continue
+                    raise ImproperlyConfigured(f"{type(serializer).__name__}.{name} is not a model field.")
+                formatter = None if isinstance(field, PASSTHROUGH_FIELDS) else self.skip_none(field.to_representation)
+                plan.append((name, self.add_column(columns, prefix + path), formatter))
+        return plan
+
+    @staticmethod
+    def add_column(columns, column):
+        if column not in columns:
+            columns.append(column)
+        return columns.index(column)
+
+    @staticmethod
+    def is_model_path(model, path):
+        for part in path.split('__'):
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                return False
+            model = field.related_model or model
+        return True
+
+    @staticmethod
+    def skip_none(to_representation):
+        def formatter(value):
+            return None if value is None else to_representation(value)
+        return formatter
+
+    @classmethod
+    def build(cls, plan, row):
+        data = {}
+        for name, index, formatter in plan:
+            if index is None:
+                # Nested serializer (list plan) or constant None
+                data[name] = cls.build(formatter, row) if formatter else None
+            elif formatter is None:
+                data[name] = row[index]
+            else:
+                data[name] = formatter(row[index])
+        return data
+
+    def serialize(self, queryset) -> list:
+        """
+        Serialize a (possibly sliced) queryset in one query plus one per batch field.
+        """
+        if self.plan is None:
+            self.compile()
+        rows = [self.build(self.plan, row) for row in queryset.values_list(*self.columns)]
+        self.load_batches(rows)
+        return rows
+
+    def iterate(self, queryset, chunk_size=2000):
+        """
+        Lazily serialize a large queryset with a server-side cursor, chunk by chunk,
+        so memory stays constant regardless of the result size.
+        """
+        if self.plan is None:
+            self.compile()
+        cursor = queryset.values_list(*self.columns).iterator(chunk_size=chunk_size)
+        while True:
+            rows = [self.build(self.plan, row) for row in islice(cursor, chunk_size)]
+            if not rows:
+                return
+            self.load_batches(rows)
+            yield from rows
+
+    def load_batches(self, rows):
+        for name, loader, names in self.batches:
+            targets = [self.nested(data, names) for data in rows]
+            values = loader({target[name] for target in targets})
+            for target in targets:
+                target[name] = values.get(target[name])
+
+    @staticmethod
+    def nested(data, names):
+        for name in names:
+            data = data[name]
+        return data
@@ -1,7 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from database.models import Profile
 from api.ultils import format_datetime
+from api._serializers.fast_serializers import FastListSerializer
+from api.services.permission_services import load_permission_codes_bulk
+from api.services import registration_services
 
 class UserSerializer(serializers.ModelSerializer):
     """
@@ -16,7 +20,8 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'is_staff', 'is_superuser', 'is_active', 'date_joined', 'password', 'password2']
         read_only_fields = ['id', 'date_joined']
         extra_kwargs = {
-            'username': {'required': True},
+            # No UniqueValidator query: the unique index answers when the user is saved
+            'username': {'required': True, 'validators': [UnicodeUsernameValidator()]},
             'email': {'required': True},
             'first_name': {'required': True},
             'last_name': {'required': True},
@@ -36,28 +41,26 @@ class UserSerializer(serializers.ModelSerializer):
         """
         if data['password'] != data['password2']:
             raise serializers.ValidationError("Mật khẩu không khớp.")
-        if User.objects.filter(username=data['username']).exists():
-            raise serializers.ValidationError("Username đã tồn tại.")
-        if User.objects.filter(email=data['email']).exists():
-            raise serializers.ValidationError("Email đã tồn tại.")
+        # Username and email uniqueness: checked by the database on save (registration_services)
         return data
 
     def create(self, validated_data):
         """
-        Create a new user.
+        Create a new user and its profile.
         """
         validated_data.pop('password2')
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            password=validated_data['password'],
-            email=validated_data['email'],
-            first_name=validated_data['first_name'],
-            last_name=validated_data['last_name'],
-            is_staff=validated_data.get('is_staff', False),
-            is_superuser=validated_data.get('is_superuser', False),
-        )
-        Profile.objects.create(user=user)
-        return user
+        try:
+            return registration_services.register(
+                username=validated_data['username'],
+                password=validated_data['password'],
+                email=validated_data['email'],
+                first_name=validated_data['first_name'],
+                last_name=validated_data['last_name'],
+                is_staff=validated_data.get('is_staff', False),
+                is_superuser=validated_data.get('is_superuser', False),
+            )
+        except registration_services.UserExists as e:
+            raise serializers.ValidationError(e.errors)
 
     def update(self, instance, validated_data):
         """
@@ -72,7 +75,10 @@ class UserSerializer(serializers.ModelSerializer):
         instance.is_superuser = validated_data.get('is_superuser', instance.is_superuser)
         if 'password' in validated_data:
             instance.set_password(validated_data['password'])
-        instance.save()
+        try:
+            registration_services.save_user(instance)
+        except registration_services.UserExists as e:
+            raise serializers.ValidationError(e.errors)
         return instance
 
 class ProfileSerializer(serializers.ModelSerializer):
@@ -114,10 +120,21 @@ class ProfileSerializer(serializers.ModelSerializer):
 
     def get_permissions(self, obj):
         """
-        Get the permissions of the user.
+        Get the permission codes of the user (direct grants and role grants).
+        Reads the codes already resolved by permission_services.get_permission_codes(),
+        else the data prefetched by Profile.objects.for_serializer() when present.
         """
-        permissions = obj.user.user_permissions.all()
-        return [permission.code for permission in permissions]
+        codes = getattr(obj.user, '_permission_codes', None)
+        if codes is not None:
+            return sorted(codes)
+        codes = {item.permission.code for item in obj.user.userpermission_set.all()}
+        try:
+            role = obj.user.userrole.role
+        except AttributeError:
+            role = None
+        if role is not None:
+            codes.update(item.permission.code for item in role.permissions.all())
+        return sorted(codes)
     
     def get_role(self, obj):
         """
@@ -142,6 +159,17 @@ class ProfileSerializer(serializers.ModelSerializer):
         instance.gender = validated_data.get('gender', instance.gender)
         instance.save()
         return instance
-        
-    
-    
+
+
+# Fast read-only serializers for list endpoints, same output as the serializers above
+UserListSerializer = FastListSerializer(UserSerializer, method_fields={
+    'date_joined': ('date_joined', format_datetime),
+})
+
+ProfileListSerializer = FastListSerializer(ProfileSerializer, method_fields={
+    'created_at': ('created_at', format_datetime),
+    'updated_at': ('updated_at', format_datetime),
+    'role': ('user__userrole__role__name', None),
+}, batch_fields={
+    'permissions': ('user_id', load_permission_codes_bulk),
+})
@@ -0,0 +1,37 @@
+from rest_framework.views import APIView
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from api.ultils import app_response
+from api.permissions import HasPermission
+from api._serializers.booking_serializers import BookingInputSerializer
+from api.services.booking_services import create_bookings
+from api.services.inventory_services import SoldOut
+from api.services.pricing_services import PricingError
+
+
+class BookingBulkCreateView(APIView):
+    """
+    View for creating many bookings in one request (agency imports): {"bookings": [...]}.
+    Either every booking is created or none.
+    """
+    permission_classes = [IsAuthenticated, HasPermission('can_create_booking')]
+
+    def post(self, request):
+        if not isinstance(request.data, dict):
+            # A JSON list (or scalar) body instead of {"bookings": [...]}
+            return app_response(False, "Expected an object with a 'bookings' list.", status=status.HTTP_400_BAD_REQUEST)
+        serializer = BookingInputSerializer(data=request.data.get('bookings'), many=True)
+        if not serializer.is_valid():
+            return app_response(False, serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        rows = [dict(row, user_id=request.user.pk) for row in serializer.validated_data]
+        try:
+            bookings = create_bookings(rows)
+        except PricingError as e:
+            return app_response(False, str(e), status=status.HTTP_400_BAD_REQUEST)
+        except SoldOut as e:
+            return app_response(False, str(e), status=status.HTTP_409_CONFLICT)
+        data = [
+            {'id': booking.pk, 'status': booking.status, 'final_price': booking.final_price}
+            for booking in bookings
+        ]
+        return app_response(True, data, status.HTTP_201_CREATED, total=len(data))
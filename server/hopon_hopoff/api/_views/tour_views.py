@@ -0,0 +1,56 @@
+from rest_framework.views import APIView
+from rest_framework import status
+from rest_framework.permissions import AllowAny
+from api.ultils import app_response, load_table_params
+from api.services.availability_services import get_month_availability
+from api.services.catalogue_services import get_catalogue
+from api.services.tour_search_services import search_tours, parse_search_filters
+
+# Max number of tours per availability request
+MAX_AVAILABILITY_TOURS = 100
+
+
+class TourAvailabilityView(APIView):
+    """
+    View for the availability calendar of many tours (?tour_ids=1,2,3&month=YYYY-MM).
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        try:
+            tour_ids = [int(tour_id) for tour_id in request.GET.get("tour_ids", "").split(",") if tour_id]
+            data = get_month_availability(tour_ids[:MAX_AVAILABILITY_TOURS], request.GET.get("month", ""))
+        except ValueError:
+            return app_response(False, "Invalid tour_ids or month (YYYY-MM).", status=status.HTTP_400_BAD_REQUEST)
+        return app_response(True, data, status.HTTP_200_OK)
+
+
+class CatalogueView(APIView):
+    """
+    View for the destinations menu: cities and destinations with active tour counts and popularity ranks.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return app_response(True, get_catalogue(), status.HTTP_200_OK)
+
+
+class TourSearchView(APIView):
+    """
+    View for searching tours with facets.
+    ?search=&filter=city=1|2,type=3,price=0|1,dynamic_level=2,date_from=YYYY-MM-DD,date_to=YYYY-MM-DD
+    &sort_by=price|rating|start_date&sort_order=asc|desc&page_size=&cursor=
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        (page, page_size, search, sort_by, sort_order, filters, cursor) = load_table_params(request)
+        try:
+            result = search_tours(
+                search, sort_by=sort_by, sort_order=sort_order, page_size=page_size, cursor=cursor,
+                **parse_search_filters(filters),
+            )
+        except ValueError as e:
+            return app_response(False, str(e), status=status.HTTP_400_BAD_REQUEST)
+        meta = {"facets": result["facets"], "next_cursor": result["next_cursor"]}
+        return app_response(True, result["tours"], status.HTTP_200_OK, total=result["total"], meta=meta)
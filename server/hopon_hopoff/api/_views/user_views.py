@@ -3,16 +3,20 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import ValidationError
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import logout
-from django.core.mail import send_mail, EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.contrib.auth.models import User
 from api._serializers.user_serializers import UserSerializer, ProfileSerializer
 from database.models import Profile, RefreshToken, PasswordResetToken
-from api.ultils import app_response, get_UI_URL, load_table_params
-from api.controllers.user_controllers import process_user_data
+from api.ultils import app_response, app_stream_response, get_UI_URL, load_table_params
+from api.controllers.user_controllers import process_user_data, export_user_data, USER_FILTERS
+from api.permissions import IsStaffOrHasPermission
+from api.services.token_services import token_cache
+from api.services import email_services, login_services
+from api.services.signed_token_services import signed_tokens, SignedToken
 from django.conf import settings
 
 class RegisterView(APIView):
@@ -21,7 +25,11 @@ class RegisterView(APIView):
     def post(self, request):
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                serializer.save()
+            except ValidationError as e:
+                # Username or email taken, reported by the unique indexes
+                return app_response(False, e.detail, status=status.HTTP_400_BAD_REQUEST)
             return app_response(True, serializer.data, status.HTTP_201_CREATED)
         return app_response(False, serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -34,26 +42,14 @@ class LoginView(APIView):
     def post(self, request):
         email = request.data.get('email')
         password = request.data.get('password')
-        # user = authenticate(username=username, password=password)
-        user = User.objects.filter(email=email).first()
-        if user and not user.check_password(password):
-            return app_response(False, "Invalid credentials", status=status.HTTP_401_UNAUTHORIZED)
-        if not user:
+        result = login_services.login(email, password) if email and password else None
+        if result is None:
             return app_response(False, "Invalid credentials", status=status.HTTP_401_UNAUTHORIZED)
-        # Create or retrieve the token for the user
-        token, _ = Token.objects.get_or_create(user=user)
-
-        # Create a refresh token
-        refresh_token, _ = RefreshToken.objects.get_or_create(user=user)
-        if refresh_token.is_expired():
-            refresh_token.delete()
-            refresh_token = RefreshToken.objects.create(user=user)
-
-        profile = Profile.objects.get(user=user) if user else None
+        user, profile, access_key, refresh_key = result
         data = ProfileSerializer(profile).data if profile else None
         response = {
-            'access_token': token.key,
-            'refresh_token': refresh_token.key,
+            'access_token': access_key,
+            'refresh_token': refresh_key,
             'profile': data
         }
         return app_response(True, response, status.HTTP_200_OK)
@@ -70,16 +66,11 @@ class RefreshTokenView(APIView):
             return app_response(False, "Refresh token is required", status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            refresh_token = RefreshToken.objects.get(key=refresh_token_key)
-            if refresh_token.is_expired():
-                refresh_token.delete()
-                return app_response(False, "Refresh token has expired", status=status.HTTP_401_UNAUTHORIZED)
-            
-            # Create a new access token
-            token, _ = Token.objects.get_or_create(user=refresh_token.user)
-            return app_response(True, {'access_token': token.key}, status=status.HTTP_200_OK)
-        except RefreshToken.DoesNotExist:
-            return app_response(False, "Invalid refresh token", status=status.HTTP_401_UNAUTHORIZED)
+            access_key, refresh_key = login_services.refresh(refresh_token_key)
+        except login_services.RefreshError as e:
+            return app_response(False, str(e), status=status.HTTP_401_UNAUTHORIZED)
+        # The refresh token rotates: the one sent is no longer valid
+        return app_response(True, {'access_token': access_key, 'refresh_token': refresh_key}, status=status.HTTP_200_OK)
     
 class LogoutView(APIView):
     """
@@ -88,9 +79,15 @@ class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        if isinstance(request.auth, SignedToken):
+            # Stateless token: revoke every signed token of the user issued until now
+            signed_tokens.revocations.revoke(request.user.pk)
+            RefreshToken.objects.filter(user_id=request.user.pk).delete()
+            return app_response(True, "Logout successful", status=status.HTTP_200_OK)
         try:
             token = Token.objects.get(user=request.user)
             if token:
+                token_cache.invalidate(token.key)
                 token.delete()
             request.user.auth_token.delete()
 
@@ -134,28 +131,19 @@ class ResetPasswordView(APIView):
         password_reset_token = PasswordResetToken.objects.create(user=user)
         reset_link = f"{get_UI_URL()}/profile/reset-password-confirm?token={password_reset_token.token}"
 
-        try:
-            subject = "Password Reset Request"
-            from_email = settings.DEFAULT_FROM_EMAIL
-            to = [email]
-            text_content = f'Click the link to reset your password: {reset_link}'
-            html_content = render_to_string(
-                'email/forgot-password.html',
-                {'reset_link': reset_link, 'full_name': user.get_full_name()}
-            )
-            msg = EmailMultiAlternatives(subject, text_content, from_email, to)
-            msg.attach_alternative(html_content, "text/html")
-            msg.send()
-            # send_mail(
-            #     subject,
-            #     text_content,
-            #     from_email,
-            #     to,
-            #     fail_silently=False,
-            # )
-        except Exception as e:
-            print(f"Error sending email: {e}")
-            return app_response(False, f"Failed to send email: {e}", status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Sent by the outbox workers: no SMTP round trip in the request
+        html_content = render_to_string(
+            'email/forgot-password.html',
+            {'reset_link': reset_link, 'full_name': user.get_full_name()}
+        )
+        email_services.enqueue(
+            "Password Reset Request",
+            f'Click the link to reset your password: {reset_link}',
+            [email],
+            html_body=html_content,
+            user=user,
+            dedupe_key=f"reset-password:{user.pk}",
+        )
         return app_response(True, "Password reset link sent to your email", status=status.HTTP_200_OK)
     
 class ResetPasswordConfirmView(APIView):
@@ -184,6 +172,8 @@ class ResetPasswordConfirmView(APIView):
         # Optionally
         RefreshToken.objects.filter(user=user).delete()
         # Optionally
+        token_cache.invalidate_user(user)
+        signed_tokens.revocations.revoke(user.pk)
         Token.objects.filter(user=user).delete()
         return app_response(True, "Password reset successfully", status=status.HTTP_200_OK)
 
@@ -197,7 +187,7 @@ class ProfileView(APIView):
     def get(self, request):
         user = request.user
         if user.is_authenticated:
-            profile = Profile.objects.get(user=user) if user else None
+            profile = Profile.objects.for_serializer().get(user=user) if user else None
             data = ProfileSerializer(profile).data if profile else None
             return app_response(True, data, status=status.HTTP_200_OK)
         return app_response(False, "User not authenticated", status=status.HTTP_401_UNAUTHORIZED)
@@ -212,14 +202,23 @@ class UserListView(APIView):
         # test commit
         print('request.user', request.user)
         print('request.auth', request.auth)
-        (page, page_size, search, sort_by, sort_order, filters) = load_table_params(request)
-        (data, total) = process_user_data(page, page_size, search, sort_by, sort_order, filters)
-        return app_response(True, data, status.HTTP_200_OK, total)
+        (page, page_size, search, sort_by, sort_order, filters, cursor) = load_table_params(request)
+        try:
+            filters = USER_FILTERS.compile(filters)
+            (data, total, meta) = process_user_data(page, page_size, search, sort_by, sort_order, filters, cursor)
+        except ValueError as e:
+            # Filter or sort not allowed, invalid cursor
+            return app_response(False, str(e), status=status.HTTP_400_BAD_REQUEST)
+        return app_response(True, data, status.HTTP_200_OK, total, meta)
 
     def post(self, request):
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                serializer.save()
+            except ValidationError as e:
+                # Username or email taken, reported by the unique indexes
+                return app_response(False, e.detail, status=status.HTTP_400_BAD_REQUEST)
             return app_response(True, serializer.data, status.HTTP_201_CREATED)
         return app_response(False, serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -227,6 +226,26 @@ class UserListView(APIView):
         user = User.objects.get(pk=pk)
         serializer = UserSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                serializer.save()
+            except ValidationError as e:
+                return app_response(False, e.detail, status=status.HTTP_400_BAD_REQUEST)
             return app_response(True, serializer.data, status.HTTP_200_OK)
         return app_response(False, serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class UserExportView(APIView):
+    """
+    View for exporting the user list as a stream (?export=json|ndjson|csv).
+    Accepts the same search, sort and filter params as the user list, without pagination.
+    Restricted to staff and holders of the can_export_user permission.
+    """
+    permission_classes = [IsAuthenticated, IsStaffOrHasPermission('can_export_user')]
+
+    def get(self, request):
+        (page, page_size, search, sort_by, sort_order, filters, cursor) = load_table_params(request)
+        try:
+            filters = USER_FILTERS.compile(filters)
+            rows = export_user_data(search, sort_by, sort_order, filters)
+        except ValueError as e:
+            return app_response(False, str(e), status=status.HTTP_400_BAD_REQUEST)
+        return app_stream_response(rows, request.GET.get("export", "json"), filename="users")
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from api import signals  # noqa: F401
+        from api.services.sweeper_services import token_sweeper
+        from api.services.signed_token_services import signed_tokens
+        # Signed tokens need shared revocations and permission versions
+        signed_tokens.check()
+        # No-op unless TOKEN_SWEEP_INTERVAL is set
+        token_sweeper.start()
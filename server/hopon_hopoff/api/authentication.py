@@ -2,9 +2,13 @@ from rest_framework.authentication import BaseAuthentication, get_authorization_
 from rest_framework.authtoken.models import Token
 from rest_framework import HTTP_HEADER_ENCODING, exceptions
 from django.contrib.auth.models import User
+from django.db import router
 from django.utils import timezone
 from datetime import timedelta
+from functools import partial
 from .contants import TOKEN_EXPIRE_TIME
+from .services.token_services import token_cache
+from .services.signed_token_services import signed_tokens, InvalidToken
 
 class CustomTokenAuthentication(BaseAuthentication):
     """
@@ -39,9 +43,10 @@ class CustomTokenAuthentication(BaseAuthentication):
         return self.authenticate_credentials(token)
     
     def authenticate_credentials(self, key):
-        try:
-            token = Token.objects.select_related('user').get(key=key)
-        except Token.DoesNotExist:
+        if signed_tokens.enabled and signed_tokens.is_signed(key):
+            return self.authenticate_signed(key)
+        token = token_cache.get_or_load(key, self.load_token)
+        if token is None:
             raise exceptions.AuthenticationFailed('Invalid token.')
 
         if not token.user.is_active:
@@ -49,10 +54,50 @@ class CustomTokenAuthentication(BaseAuthentication):
         
         #Check if token has expired
         if token.created < timezone.now() - timedelta(seconds=TOKEN_EXPIRE_TIME):
+            token_cache.invalidate(token.key)
             token.delete() # Delete expired token
             raise exceptions.AuthenticationFailed('Token has expired')
 
         return (token.user, token)
+
+    def authenticate_signed(self, key):
+        """
+        Stateless access token: no database query. request.auth is the SignedToken.
+        The user only has its id loaded, other fields are read from the database on first access
+        (see load_signed_user), which refuses a user deactivated or deleted since the token was issued.
+        """
+        try:
+            token = signed_tokens.verify(key)
+        except InvalidToken as e:
+            raise exceptions.AuthenticationFailed(str(e))
+        user = User.from_db(router.db_for_read(User), ['id'], [token.user_id])
+        # Deferred fields are loaded through refresh_from_db()
+        user.refresh_from_db = partial(self.load_signed_user, user)
+        return (user, token)
+
+    @staticmethod
+    def load_signed_user(user, using=None, fields=None, from_queryset=None):
+        """
+        Load every field of a signed token user at once, raises AuthenticationFailed if it is inactive or deleted.
+        """
+        try:
+            User.refresh_from_db(
+                user, using=using, from_queryset=from_queryset,
+                fields=[field.attname for field in user._meta.concrete_fields],
+            )
+        except User.DoesNotExist:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+    def load_token(self, key):
+        """
+        Load the token and its user from the database, None if the key does not exist.
+        """
+        try:
+            return Token.objects.select_related('user').get(key=key)
+        except Token.DoesNotExist:
+            return None
     
     def authenticate_header(self, request):
         """
@@ -3,4 +3,88 @@
 TOKEN_EXPIRE_TIME =  60 * 60 * 24  # Token expiration time in seconds (1 day)
 REFRESH_TOKEN_EXPIRE_TIME = 60 * 60 * 24 * 7  # Refresh token expiration time in seconds (7 days)
 PASSWORD_RESET_TIMEOUT = 60 * 60 * 24  # Password reset token expiration time in seconds (1 day)
-PAGE_SIZE = 10  # Default page size for pagination
\ No newline at end of file
+PAGE_SIZE = 10  # Default page size for pagination
+
+# Token resolution cache (see api/services/token_services.py)
+TOKEN_CACHE_ENABLED = True  # Toggle the token cache on/off
+TOKEN_CACHE_MAX_SIZE = 10000  # Max number of tokens kept in the in-process LRU
+TOKEN_CACHE_LOCAL_TTL = 60  # In-process entries live at most 60 seconds
+# Without a shared tier (TOKEN_CACHE_ALIAS) other processes never hear of a logout or a deleted token:
+# their in-process entries then live only this long
+TOKEN_CACHE_UNSHARED_LOCAL_TTL = 2
+TOKEN_CACHE_NEGATIVE_TTL = 30  # Unknown keys are remembered for 30 seconds
+# Shared cache alias (Redis, Memcached) for the shared tier, e.g. 'default' (None = disabled). Set it when several
+# processes serve requests: it also carries invalidations (logout, deleted token) to their in-process tier
+TOKEN_CACHE_ALIAS = None
+TOKEN_CACHE_SHARED_TTL = 60 * 10  # Shared entries live at most 10 minutes
+TOKEN_CACHE_INVALIDATION_SYNC = 1  # Seconds between pulls of invalidations made by other processes
+
+# Permission resolution cache (see api/services/permission_services.py)
+# Django cache alias holding resolved permission sets and role versions. Must be shared by every process
+# (Redis, Memcached): with a process-local cache (LocMemCache, the default) permissions are not cached.
+PERMISSION_CACHE_ALIAS = 'default'
+PERMISSION_CACHE_TTL = 60 * 60  # Resolved permission sets live at most 1 hour
+
+# Total count strategies for list endpoints (see api/services/count_services.py)
+# endpoint -> filter complexity ('none', 'simple', 'complex') -> 'exact' | 'estimate' | 'cached'
+COUNT_STRATEGIES = {
+    'user_list': {'none': 'estimate', 'simple': 'cached', 'complex': 'cached'},
+}
+COUNT_ESTIMATE_THRESHOLD = 100000  # Estimates below this are replaced by an exact count
+COUNT_CACHE_TTL = 60  # Cached exact counts live 60 seconds
+COUNT_CACHE_ALIAS = 'default'
+
+# Database alias for filters that cannot use an index (see api/services/filter_services.py), None = default database
+SLOW_QUERY_DB_ALIAS = None
+EXPORT_CHUNK_SIZE = 2000  # Rows fetched per server-side cursor round trip when streaming exports
+SEAT_HOLD_TTL = 60 * 15  # Seats held for a pending booking are released after 15 minutes
+BULK_BOOKING_BATCH_SIZE = 500  # Rows per INSERT when creating bookings in bulk
+
+# Discount codes
+DISCOUNT_CACHE_ALIAS = 'default'
+DISCOUNT_CACHE_TTL = 30  # Validated codes are re-read from the database after 30 seconds
+DISCOUNT_SHARDS = 8  # Counters per hot code, see api/services/discount_services.py
+
+# Buffered view counters (api/services/counter_services.py)
+VIEW_COUNTER_FLUSH_INTERVAL = 10  # Seconds between background flushes
+VIEW_COUNTER_MAX_PENDING = 1000  # Flush early once this many increments are buffered
+VIEW_COUNTER_CACHE_ALIAS = None  # Buffer in this cache (shared by processes) instead of process memory
+
+# Tour ratings: Bayesian average = (weight * prior mean + sum of ratings) / (weight + number of ratings)
+RATING_PRIOR_MEAN = 4.0
+RATING_PRIOR_WEIGHT = 10
+
+# Destinations menu (api/services/catalogue_services.py)
+CATALOGUE_CACHE_ALIAS = 'default'
+CATALOGUE_CACHE_TTL = 60 * 60  # Rebuilt at least hourly, invalidated on Tour/Destination/City changes
+# When CATALOGUE_CACHE_ALIAS is process-local (LocMemCache) an invalidation only reaches the process that made it:
+# the others rebuild the tree after this many seconds instead
+CATALOGUE_LOCAL_CACHE_TTL = 30
+
+# Tour search: lower bounds of the price facet buckets (from price of a tour)
+TOUR_PRICE_BUCKETS = [0, 500000, 1000000, 2000000, 5000000]
+
+# Email outbox (api/services/email_services.py)
+# In-process sender threads per web worker. 0 = emails are only sent by the send_outbox command, which must then
+# run as its own process (send_outbox --forever) or from cron (see README.md)
+EMAIL_OUTBOX_WORKERS = 0
+EMAIL_OUTBOX_BATCH_SIZE = 50  # Messages sent over one SMTP connection
+EMAIL_OUTBOX_POLL_INTERVAL = 5  # Seconds between checks for due retries (new messages wake the workers)
+EMAIL_OUTBOX_MAX_ATTEMPTS = 6  # Then the message is marked failed
+EMAIL_OUTBOX_RETRY_DELAY = 30  # Seconds before the first retry, doubled on each attempt
+EMAIL_OUTBOX_MAX_RETRY_DELAY = 60 * 60
+EMAIL_OUTBOX_LEASE = 60 * 5  # A claimed message is retried after this if its worker died
+EMAIL_OUTBOX_BACKLOG_WARNING = 60 * 10  # Log a warning when a due message has waited this long (no sender running)
+
+# Expired token sweeper (api/services/sweeper_services.py)
+TOKEN_SWEEP_BATCH_SIZE = 1000  # Rows per DELETE: each statement holds its locks briefly
+TOKEN_SWEEP_PAUSE = 0.05  # Seconds between batches, lets other writers through
+TOKEN_SWEEP_INTERVAL = None  # Seconds between in-process sweeps, None = only the sweep_tokens command (cron)
+
+# Stateless access tokens (api/services/signed_token_services.py)
+# Issue HMAC-signed access tokens verified without the database instead of Token keys.
+# Requires SIGNED_TOKEN_REVOCATION_ALIAS and PERMISSION_CACHE_ALIAS to name a shared cache (checked at startup)
+SIGNED_TOKENS_ENABLED = False
+SIGNED_TOKEN_TTL = 60 * 15  # Signed access tokens are short-lived: clients renew them with their refresh token
+SIGNED_TOKEN_REVOCATION_ALIAS = None  # Shared cache alias (Redis, Memcached) carrying revocations to every process
+SIGNED_TOKEN_REVOCATION_SYNC = 5  # Seconds between pulls of new revocations from the shared cache
@@ -1,31 +1,95 @@
 from django.db.models import Q
 from django.contrib.auth.models import User
-from api._serializers.user_serializers import UserSerializer
-from api.ultils import format_datetime, pagination, sort_queryset
+from api._serializers.user_serializers import UserSerializer, UserListSerializer
+from api.ultils import pagination, cursor_pagination, sort_queryset
+from api.services.count_services import count_queryset, NONE, SIMPLE, COMPLEX
+from api.services.search_services import search_users
+from api.services.filter_services import FilterSpec, FilterField
+from api.contants import SLOW_QUERY_DB_ALIAS, EXPORT_CHUNK_SIZE
+from datetime import datetime
 
+# Filterable user fields. Booleans and names have no index and go to the slow tier.
+USER_FILTERS = FilterSpec({
+    'id': FilterField('id', int, ('eq', 'in', 'gte', 'lte', 'range'), indexed=('eq', 'in', 'gte', 'lte', 'range')),
+    'username': FilterField('username', str, ('eq', 'in', 'prefix'), indexed=('eq', 'in', 'prefix')),
+    'email': FilterField('email', str, ('eq', 'in', 'prefix'), indexed=('eq', 'in', 'prefix')),
+    'date_joined': FilterField('date_joined', datetime, ('gte', 'lte', 'range'), indexed=('gte', 'lte', 'range')),
+    'last_login': FilterField('last_login', datetime, ('gte', 'lte', 'range')),
+    'first_name': FilterField('first_name', str, ('eq', 'prefix')),
+    'last_name': FilterField('last_name', str, ('eq', 'prefix')),
+    'is_active': FilterField('is_active', bool),
+    'is_staff': FilterField('is_staff', bool),
+    'is_superuser': FilterField('is_superuser', bool),
+}, allow_slow=True)
+# Sortable user columns (sort_by param). The sort key of the last row is returned in the page cursor,
+# so only columns shown in the list belong here: never secrets or relations.
+USER_SORTS = {
+    'id': 'id',
+    'username': 'username',
+    'email': 'email',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'date_joined': 'date_joined',
+    'last_login': 'last_login',
+}
 
-def process_user_data(page, page_size, search, sort_by, sort_order, filters):
+
+def build_user_queryset(search, filters):
+    """
+    Build the user queryset for the given search term and CompiledFilter.
+    """
+    users = User.objects.all()
+    if filters:
+        users = filters.apply(users)
+        if filters.slow and SLOW_QUERY_DB_ALIAS:
+            users = users.using(SLOW_QUERY_DB_ALIAS)
+    if search:
+        # Ranked by relevance unless an explicit sort is requested
+        users = search_users(users, search)
+    return users
+
+
+def export_user_data(search, sort_by, sort_order, filters, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Iterate over every matching user as a dict, chunk by chunk, for streaming exports.
+    """
+    users = sort_queryset(build_user_queryset(search, filters), sort_by, sort_order, USER_SORTS)
+    return UserListSerializer.iterate(users, chunk_size=chunk_size)
+
+
+def process_user_data(page, page_size, search, sort_by, sort_order, filters, cursor=None):
     """
     Process user data to extract relevant information.
+    `filters` is a CompiledFilter from USER_FILTERS.compile().
+    Uses keyset pagination when a cursor is given (empty string for the first page).
+    returns a tuple of user data, total count and extra response meta (next cursor, approximate total).
+    raises ValueError (FilterError) for a sort that is not in USER_SORTS or an invalid cursor.
     """
     user_data = []
     total = 0
+    meta = {}
     try:
-        users = User.objects.all()
-        if filters:
-            for key, value in filters.items():
-                users = users.filter(**{key: value})
-        if search:
-            users = users.filter(Q(username__icontains=search) | Q(email__icontains=search))
-
-        users = sort_queryset(users, sort_by, sort_order)
-        (data, total) = pagination(users, page, page_size)
-        serializer = UserSerializer(data, many=True)
-        user_data = serializer.data
+        users = build_user_queryset(search, filters)
+        complexity = COMPLEX if search or (filters and filters.slow) else SIMPLE if filters else NONE
+        (total, approximate) = count_queryset(users, endpoint="user_list", complexity=complexity)
+        if approximate:
+            meta["total_approximate"] = True
+        if cursor is not None:
+            (data, total, next_cursor) = cursor_pagination(
+                users, page_size, cursor, sort_by, sort_order, total, sorts=USER_SORTS,
+            )
+            meta["next_cursor"] = next_cursor
+        else:
+            users = sort_queryset(users, sort_by, sort_order, USER_SORTS)
+            (data, total) = pagination(users, page, page_size, total)
+        user_data = UserListSerializer.serialize(data)
         
+    except ValueError:
+        # Invalid request (sort or cursor), reported to the client
+        raise
     except Exception as e:
         print(f"Error processing user data: {e}")
         user_data = []
 
-    return user_data, total
+    return user_data, total, meta
     
\ No newline at end of file
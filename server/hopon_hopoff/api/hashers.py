@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    Django's PBKDF2-SHA256 hasher (same algorithm name, existing hashes stay valid)
+    with the iteration count taken from settings.PASSWORD_HASH_ITERATIONS.
+    must_update() compares iteration counts, so check_password() rehashes old hashes on login.
+    """
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
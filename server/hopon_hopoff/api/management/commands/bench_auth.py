@@ -0,0 +1,55 @@
+import time
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from api.authentication import CustomTokenAuthentication
+from api.services.token_services import token_cache
+from api.services.signed_token_services import signed_tokens
+
+
+class Command(BaseCommand):
+    help = "Benchmark per-request token authentication overhead with the token cache on and off, and signed tokens."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='Number of authentications per run')
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        auth = CustomTokenAuthentication()
+        enabled = token_cache.enabled
+        signed_enabled = signed_tokens.enabled
+
+        with transaction.atomic():
+            user = User.objects.create_user(username='bench_auth_user', email='bench_auth@example.com', password='x')
+            key = Token.objects.create(user=user).key
+            try:
+                for label, cache_on in (('cache off', False), ('cache on', True)):
+                    token_cache.enabled = cache_on
+                    token_cache.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        for _ in range(n):
+                            auth.authenticate_credentials(key)
+                        elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f"{label:>9}: {elapsed / n * 1e6:8.1f} us/request, "
+                        f"{len(queries) / n:.3f} queries/request ({n} requests)"
+                    )
+                signed_tokens.enabled = True
+                signed_key = signed_tokens.issue(user.pk, None)
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    for _ in range(n):
+                        auth.authenticate_credentials(signed_key)
+                    elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{'signed':>9}: {elapsed / n * 1e6:8.1f} us/request, "
+                    f"{len(queries) / n:.3f} queries/request ({n} requests)"
+                )
+            finally:
+                signed_tokens.enabled = signed_enabled
+                token_cache.enabled = enabled
+                token_cache.clear()
+                transaction.set_rollback(True)
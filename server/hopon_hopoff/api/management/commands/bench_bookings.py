@@ -0,0 +1,76 @@
+import time
+from datetime import time as dtime, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from database.models import Tour, TicketType, Booking, BookingItem, BookingInfo
+from api.services.booking_services import create_bookings
+
+INFO = {
+    'phone_number': '0123456789', 'email': 'agency@example.com', 'full_name': 'Agency guest',
+    'country': 'VN', 'hotel_address': '', 'state': 'HCM',
+}
+
+
+class Command(BaseCommand):
+    help = "Benchmark bulk booking creation (bookings/sec) against the model save() path."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=1000, help='Bookings per path')
+        parser.add_argument('--lines', type=int, default=4, help='Ticket lines per booking')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            today = timezone.now().date()
+            tours = [
+                Tour.objects.create(
+                    name=f'Booking bench {i}', description='', price=Decimal('100'), duration=1,
+                    max_participants=10 ** 9, start_date=today, end_date=today + timedelta(days=30),
+                    departure_time=dtime(8, 0),
+                )
+                for i in range(10)
+            ]
+            ticket_types = [
+                TicketType.objects.create(name=f'Bench {i}', code=f'BENCH{i}', price_percentage=100 - i * 10)
+                for i in range(options['lines'])
+            ]
+            departure = timezone.now() + timedelta(days=7)
+            rows = [
+                {
+                    'tour_id': tours[i % len(tours)].pk,
+                    'departure_date': departure,
+                    'status': 'confirmed',
+                    'items': [{'ticket_type_id': ticket_type.pk, 'quantity': 2} for ticket_type in ticket_types],
+                    'info': INFO,
+                }
+                for i in range(options['bookings'])
+            ]
+
+            for label, create in (('save() path', self.save_path), ('bulk path', create_bookings)):
+                queries = []
+                # Counted with a wrapper: the debug query log keeps only the last 9000 queries
+                with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+                    start = time.perf_counter()
+                    create(rows)
+                    elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{label:>12}: {len(rows) / elapsed:10.1f} bookings/s, "
+                    f"{len(queries) / len(rows):6.2f} queries/booking ({len(rows)} bookings x {options['lines']} lines)"
+                )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def save_path(rows):
+        for row in rows:
+            # Booking.save() cannot compute totals before its items exist, so it is saved twice
+            booking = Booking.objects.create(
+                tour_id=row['tour_id'], departure_date=row['departure_date'], status=row['status'],
+                total_price=Decimal('1'), final_price=Decimal('1'),
+            )
+            for item in row['items']:
+                BookingItem.objects.create(booking=booking, ticket_type_id=item['ticket_type_id'], quantity=item['quantity'])
+            booking.total_price = booking.calculate_total_price()
+            booking.final_price = 0
+            booking.save()
+            BookingInfo.objects.create(booking=booking, **row['info'])
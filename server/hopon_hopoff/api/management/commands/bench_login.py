@@ -0,0 +1,47 @@
+import statistics
+import time
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from database.models import Profile
+from api.services import login_services
+
+
+class Command(BaseCommand):
+    help = "Time PBKDF2 at several work factors and full logins (queries, latency) to pick PASSWORD_HASH_ITERATIONS."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20, help='Logins timed per work factor')
+        parser.add_argument(
+            '--iterations', type=int, nargs='+',
+            default=[100000, 260000, 600000, settings.PASSWORD_HASH_ITERATIONS],
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"configured PASSWORD_HASH_ITERATIONS = {settings.PASSWORD_HASH_ITERATIONS}")
+        for iterations in sorted(set(options['iterations'])):
+            with override_settings(PASSWORD_HASH_ITERATIONS=iterations), transaction.atomic():
+                start = time.perf_counter()
+                make_password('bench-password')
+                hashing = (time.perf_counter() - start) * 1000
+
+                user = User.objects.create_user('bench_login_user', email='bench_login@example.com', password='bench-password')
+                Profile.objects.create(user=user)
+                login_services.login('bench_login@example.com', 'bench-password')  # warm the permission cache
+                timings = []
+                queries = []
+                for _ in range(options['logins']):
+                    count = []
+                    with connection.execute_wrapper(lambda execute, *args: count.append(1) or execute(*args)):
+                        begin = time.perf_counter()
+                        login_services.login('bench_login@example.com', 'bench-password')
+                        timings.append((time.perf_counter() - begin) * 1000)
+                    queries.append(len(count))
+                self.stdout.write(
+                    f"{iterations:>8} iterations: hash {hashing:7.1f} ms, login median {statistics.median(timings):7.1f} ms, "
+                    f"max {max(queries)} queries/login on {connection.vendor}"
+                )
+                transaction.set_rollback(True)
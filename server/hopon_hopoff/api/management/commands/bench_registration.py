@@ -0,0 +1,95 @@
+import random
+import threading
+import time
+from collections import Counter
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, OperationalError
+from django.db.models.functions import Lower
+from django.test.utils import override_settings
+from database.models import Profile
+from api.services.registration_services import register, UserExists
+
+PREFIX = 'bench_signup_'
+
+
+class Command(BaseCommand):
+    help = "Concurrent sign-up benchmark: threads register users, some racing for the same username or email."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--signups', type=int, default=2000, help='Registration attempts')
+        parser.add_argument('--threads', type=int, default=20, help='Worker threads')
+        parser.add_argument('--contested', type=float, default=0.2, help='Share of attempts reusing a taken name')
+        parser.add_argument(
+            '--iterations', type=int, default=1000,
+            help='PBKDF2 iterations while benchmarking, so the database path is measured rather than the hasher',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            # Same setup as loadtest_inventory: WAL, and writers wait for the lock instead of failing
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode=WAL')
+            connection.settings_dict.setdefault('OPTIONS', {})['transaction_mode'] = 'IMMEDIATE'
+
+        rng = random.Random(7)
+        attempts = []
+        for i in range(options['signups']):
+            if i and rng.random() < options['contested']:
+                # Same username, or the same email with another case, as an earlier attempt
+                other = rng.randrange(i)
+                if rng.random() < 0.5:
+                    attempts.append((f'{PREFIX}{other}', f'{PREFIX}{i}@example.com'))
+                else:
+                    attempts.append((f'{PREFIX}{i}', f'{PREFIX}{other}@example.com'.upper()))
+            else:
+                attempts.append((f'{PREFIX}{i}', f'{PREFIX}{i}@example.com'))
+
+        results = Counter()
+        lock = threading.Lock()
+        start_barrier = threading.Barrier(options['threads'])
+
+        def worker(my_attempts):
+            start_barrier.wait()
+            try:
+                for username, email in my_attempts:
+                    try:
+                        register(username, email, 'bench-password')
+                        outcome = 'created'
+                    except UserExists as e:
+                        outcome = 'username taken' if 'username' in e.errors else 'email taken'
+                    except OperationalError:
+                        outcome = 'errors'
+                    with lock:
+                        results[outcome] += 1
+            finally:
+                connections.close_all()
+
+        with override_settings(PASSWORD_HASH_ITERATIONS=options['iterations']):
+            count = []
+            with connection.execute_wrapper(lambda execute, *args: count.append(1) or execute(*args)):
+                register(f'{PREFIX}probe', f'{PREFIX}probe@example.com', 'bench-password')
+            self.stdout.write(f"one registration: {len(count)} queries")
+
+            chunks = [attempts[i::options['threads']] for i in range(options['threads'])]
+            threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+        users = User.objects.filter(username__startswith=PREFIX)
+        created = users.count() - 1
+        duplicate_emails = created + 1 - users.values_list(Lower('email'), flat=True).distinct().count()
+        without_profile = users.exclude(pk__in=Profile.objects.values('user_id')).count()
+        self.stdout.write(
+            f"{len(attempts)} sign-ups on {options['threads']} threads ({connection.vendor}): "
+            f"{len(attempts) / elapsed:.0f} attempts/s, {dict(results)}"
+        )
+        self.stdout.write(
+            f"users created {created} (reported {results['created']}), "
+            f"duplicate emails {duplicate_emails}, users without profile {without_profile}"
+        )
+        users.delete()
@@ -0,0 +1,55 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.utils.encoders import JSONEncoder
+from database.models import Profile
+from api._serializers.user_serializers import (
+    UserSerializer, ProfileSerializer, UserListSerializer, ProfileListSerializer,
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the fast list serializers against the DRF serializers on one admin page."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500, help='Rows per page')
+        parser.add_argument('--repeat', type=int, default=20, help='Serialisations per path')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        repeat = options['repeat']
+
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=f'bench_serializer_{i}', email=f'bench_serializer_{i}@example.com') for i in range(rows)
+            ])
+            Profile.objects.bulk_create([Profile(user=user, phone_number='0123456789', country='VN') for user in users])
+            user_page = User.objects.filter(username__startswith='bench_serializer_').order_by('id')
+            profile_page = Profile.objects.filter(user__in=users).order_by('id')
+
+            paths = [
+                ('UserSerializer', lambda: UserSerializer(user_page.all(), many=True).data),
+                ('UserListSerializer', lambda: UserListSerializer.serialize(user_page)),
+                ('ProfileSerializer', lambda: ProfileSerializer(profile_page.for_serializer(), many=True).data),
+                ('ProfileListSerializer', lambda: ProfileListSerializer.serialize(profile_page)),
+            ]
+            outputs = {}
+            for label, serialize in paths:
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    for _ in range(repeat):
+                        outputs[label] = serialize()
+                    elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{label:>22}: {elapsed / repeat * 1000:8.2f} ms/page, "
+                    f"{len(queries) // repeat} queries/page ({rows} rows)"
+                )
+
+            for drf, fast in (('UserSerializer', 'UserListSerializer'), ('ProfileSerializer', 'ProfileListSerializer')):
+                same = json.dumps(outputs[drf], cls=JSONEncoder) == json.dumps(outputs[fast], cls=JSONEncoder)
+                self.stdout.write(f"{fast} output identical to {drf}: {same}")
+
+            transaction.set_rollback(True)
@@ -0,0 +1,91 @@
+import random
+import statistics
+import time
+from datetime import date, time as dtime, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from database.models import Tour, TourSearch, City, Destination, TourType, TicketType
+from api.services.tour_search_services import refresh_documents, search_tours, FACETS
+
+
+class Command(BaseCommand):
+    help = "Benchmark the tour search (facets + keyset pages) on a generated catalogue, rolled back afterwards."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tours', type=int, default=100000, help='Tours to generate')
+        parser.add_argument('--cities', type=int, default=60)
+        parser.add_argument('--searches', type=int, default=200, help='Random searches to time')
+
+    def handle(self, *args, **options):
+        rng = random.Random(7)
+        with transaction.atomic():
+            types = [TourType.objects.create(name=name, code=f'bench_{name}') for name in ('Domestic', 'International')]
+            cities = City.objects.bulk_create([City(name=f'Bench city {i}', country='VN') for i in range(options['cities'])])
+            destinations = Destination.objects.bulk_create([
+                Destination(name=f'Bench destination {i}', city=cities[i % len(cities)], type=types[i % 2])
+                for i in range(options['cities'] * 4)
+            ])
+            TicketType.objects.create(name='Bench adult', code='BENCH_ADULT', price_percentage=100)
+            TicketType.objects.create(name='Bench child', code='BENCH_CHILD', price_percentage=70)
+            words = ['beach', 'mountain', 'city', 'food', 'river', 'island', 'heritage', 'night']
+            start = date.today()
+
+            created = time.perf_counter()
+            # bulk_create sends no signals: the documents are built by refresh_documents() below
+            Tour.objects.bulk_create([
+                Tour(
+                    name=f'{rng.choice(words).title()} tour {i}', description=' '.join(rng.sample(words, 3)),
+                    price=Decimal(rng.randrange(100000, 8000000, 50000)), duration=rng.randint(1, 7),
+                    max_participants=30, start_date=start + timedelta(days=rng.randint(0, 180)),
+                    end_date=start + timedelta(days=rng.randint(181, 365)), departure_time=dtime(8, 0),
+                    destination=rng.choice(destinations), tour_type=rng.choice(types),
+                    dynamic_level=rng.randint(1, 5), rating_score=rng.uniform(3, 5),
+                )
+                for i in range(options['tours'])
+            ], batch_size=5000)
+            self.stdout.write(f"created {options['tours']} tours in {time.perf_counter() - created:.1f}s")
+
+            built = time.perf_counter()
+            written = refresh_documents()
+            self.stdout.write(f"built {written} search documents in {time.perf_counter() - built:.1f}s")
+            # Fresh planner statistics after the bulk load, as autovacuum would gather them
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {TourSearch._meta.db_table}')
+
+            timings = []
+            queries = []
+            for _ in range(options['searches']):
+                selected = {}
+                if rng.random() < 0.8:
+                    selected['city'] = {rng.choice(cities).pk}
+                if rng.random() < 0.5:
+                    selected['type'] = {rng.choice(types).pk}
+                if rng.random() < 0.5:
+                    selected['price'] = set(rng.sample(range(5), 2))
+                if rng.random() < 0.3:
+                    selected['dynamic_level'] = {rng.randint(1, 5)}
+                arguments = {
+                    'search': rng.choice(words) if rng.random() < 0.3 else '',
+                    'selected': selected,
+                    'date_from': start + timedelta(days=rng.randint(0, 200)) if rng.random() < 0.5 else None,
+                    'sort_by': rng.choice(['price', 'rating', 'start_date']),
+                    'page_size': 20,
+                }
+                count = []
+                with connection.execute_wrapper(lambda execute, *args: count.append(1) or execute(*args)):
+                    begin = time.perf_counter()
+                    result = search_tours(**arguments)
+                    if result['next_cursor']:
+                        # Second page through the cursor
+                        search_tours(cursor=result['next_cursor'], **arguments)
+                    timings.append((time.perf_counter() - begin) * 1000)
+                queries.append(len(count))
+
+            timings.sort()
+            self.stdout.write(
+                f"{len(timings)} searches (first + second page, facets on {', '.join(FACETS)}) on {connection.vendor}: "
+                f"median {statistics.median(timings):.1f} ms, p95 {timings[int(len(timings) * 0.95) - 1]:.1f} ms, "
+                f"max {max(queries)} queries"
+            )
+            transaction.set_rollback(True)
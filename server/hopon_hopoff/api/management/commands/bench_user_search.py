@@ -0,0 +1,57 @@
+import random
+import string
+import time
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Q
+from api.services.search_services import search_users
+
+
+class Command(BaseCommand):
+    help = "Benchmark the indexed user search against the legacy icontains scan on a large user table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000, help='Number of synthetic users to insert')
+        parser.add_argument('--queries', type=int, default=50, help='Number of searches per path')
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--keep', action='store_true', help='Keep the synthetic users instead of rolling back')
+
+    def handle(self, *args, **options):
+        n_users = options['users']
+        n_queries = options['queries']
+        page_size = options['page_size']
+        rng = random.Random(42)
+
+        with transaction.atomic():
+            self.stdout.write(f"inserting {n_users} users on {connection.vendor}...")
+            batch = []
+            for i in range(n_users):
+                name = ''.join(rng.choices(string.ascii_lowercase, k=8))
+                batch.append(User(username=f"{name}{i}", email=f"{name}.{i}@bench.example.com"))
+                if len(batch) == 10000:
+                    User.objects.bulk_create(batch)
+                    batch = []
+            User.objects.bulk_create(batch)
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE auth_user')
+
+            terms = [''.join(rng.choices(string.ascii_lowercase, k=rng.choice([2, 3, 4, 5]))) for _ in range(n_queries)]
+            paths = {
+                'icontains': lambda term: User.objects.filter(
+                    Q(username__icontains=term) | Q(email__icontains=term)
+                ).order_by('id'),
+                'search_users': lambda term: search_users(User.objects.all(), term),
+            }
+            for label, build in paths.items():
+                start = time.perf_counter()
+                for term in terms:
+                    queryset = build(term)
+                    queryset.count()
+                    list(queryset[:page_size])
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f"{label:>13}: {elapsed / n_queries * 1000:8.2f} ms/search (count + first page)")
+
+            if not options['keep']:
+                transaction.set_rollback(True)
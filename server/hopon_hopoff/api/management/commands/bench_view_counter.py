@@ -0,0 +1,57 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from database.models import Post
+from api.services.counter_services import BufferedCounter
+
+
+class Command(BaseCommand):
+    help = "Benchmark DB writes per 10k post views: one save() per view against the buffered counter."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--views', type=int, default=10000, help='Page views to simulate')
+        parser.add_argument('--posts', type=int, default=200, help='Posts (views follow a hot-spot distribution)')
+        parser.add_argument('--max-pending', type=int, default=1000, help='Buffered increments before a flush')
+        parser.add_argument('--cache', default=None, help='Buffer in this cache alias instead of process memory')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            posts = Post.objects.bulk_create([
+                Post(title=f'View bench {i}', content='') for i in range(options['posts'])
+            ])
+            rng = random.Random(7)
+            # A few posts get most of the views
+            hits = [posts[min(int(rng.paretovariate(1.2)) - 1, len(posts) - 1)].pk for _ in range(options['views'])]
+            counter = BufferedCounter(
+                Post, 'views', flush_interval=3600, max_pending=options['max_pending'], cache_alias=options['cache'],
+            )
+
+            def save_path():
+                for pk in hits:
+                    # What a post detail request did: load the post, then Post.increase_views() before this change
+                    post = Post.objects.get(pk=pk)
+                    post.views += 1
+                    post.save(update_fields=['views'])
+
+            def buffered_path():
+                for pk in hits:
+                    counter.incr(pk)
+                counter.flush()
+
+            for label, run in (('save() per view', save_path), ('buffered counter', buffered_path)):
+                Post.objects.filter(pk__in=[post.pk for post in posts]).update(views=0)
+                writes = []
+                with connection.execute_wrapper(lambda execute, sql, *args: (
+                    writes.append(1) if sql.lstrip().upper().startswith('UPDATE') else None
+                ) or execute(sql, *args)):
+                    start = time.perf_counter()
+                    run()
+                    elapsed = time.perf_counter() - start
+                total = Post.objects.filter(pk__in=[post.pk for post in posts]).aggregate(total=Sum('views'))['total']
+                self.stdout.write(
+                    f"{label:>17}: {len(writes) * 10000 / len(hits):8.1f} writes/10k views, "
+                    f"{len(hits) / elapsed:10.0f} views/s, {total} of {len(hits)} views stored"
+                )
+            transaction.set_rollback(True)
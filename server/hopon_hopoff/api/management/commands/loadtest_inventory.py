@@ -0,0 +1,95 @@
+import random
+import threading
+import time
+from datetime import time as dtime
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, OperationalError
+from django.utils import timezone
+from database.models import Tour, TourDeparture, SeatHold
+from api.services.inventory_services import hold_seats, confirm_hold, release_expired_holds, SoldOut
+
+
+class Command(BaseCommand):
+    help = "Concurrent load test: many buyers race for a few seats, the tour must never be oversold."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=500, help='Number of concurrent buyers')
+        parser.add_argument('--seats', type=int, default=100, help='Tour capacity')
+        parser.add_argument('--threads', type=int, default=50, help='Worker threads')
+        parser.add_argument('--max-quantity', type=int, default=3, help='Seats per buyer (1..n)')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            # WAL lets readers run while one writer holds the lock, and BEGIN IMMEDIATE makes
+            # read-then-write transactions wait for the lock instead of failing (worker connections only)
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode=WAL')
+            connection.settings_dict.setdefault('OPTIONS', {})['transaction_mode'] = 'IMMEDIATE'
+
+        today = timezone.now().date()
+        tour = Tour.objects.create(
+            name='Inventory load test', description='', price=Decimal('100'), duration=1,
+            max_participants=options['seats'], start_date=today, end_date=today, departure_time=dtime(8, 0),
+        )
+        buyers = list(range(options['buyers']))
+        rng = random.Random(7)
+        wanted = {buyer: rng.randint(1, options['max_quantity']) for buyer in buyers}
+        results = {'sold': 0, 'sold_out': 0, 'errors': 0}
+        lock = threading.Lock()
+        start_barrier = threading.Barrier(options['threads'])
+
+        def worker(my_buyers):
+            start_barrier.wait()
+            try:
+                for buyer in my_buyers:
+                    try:
+                        hold = hold_seats(
+                            tour.pk, wanted[buyer], ttl=0 if buyer % 5 == 0 else 600, departure_date=today,
+                        )
+                        if buyer % 5 != 0:
+                            confirm_hold(hold)
+                        outcome, seats = 'sold', wanted[buyer] if buyer % 5 else 0
+                    except SoldOut:
+                        outcome, seats = 'sold_out', 0
+                    except OperationalError:
+                        outcome, seats = 'errors', 0
+                    with lock:
+                        results[outcome] += seats if outcome == 'sold' else 1
+                    if buyer % 50 == 0:
+                        # Expired holds (every 5th buyer lets its hold expire) go back on sale
+                        try:
+                            release_expired_holds()
+                        except OperationalError:
+                            with lock:
+                                results['errors'] += 1
+            finally:
+                connections.close_all()
+
+        chunks = [buyers[i::options['threads']] for i in range(options['threads'])]
+        threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        release_expired_holds(batch_size=options['buyers'])
+        tour.refresh_from_db()
+        open_holds = SeatHold.objects.filter(tour=tour).count()
+        self.stdout.write(
+            f"{options['buyers']} buyers on {connection.vendor} in {elapsed:.2f}s: "
+            f"{results['sold']} seats sold, {results['sold_out']} sold out, {results['errors']} db errors, "
+            f"{open_holds} open holds"
+        )
+        departure = TourDeparture.objects.filter(tour=tour, date=today).first()
+        sold, held = (departure.sold, departure.held) if departure else (0, 0)
+        self.stdout.write(f"capacity {tour.max_participants}, current_participants {tour.current_participants}")
+        self.stdout.write(f"departure {today}: sold {sold}, held {held}")
+        ok = tour.current_participants <= tour.max_participants and tour.current_participants == results['sold']
+        ok = ok and sold == results['sold'] and held == 0
+        tour.delete()
+        if not ok:
+            raise SystemExit("OVERSOLD or seat count drift detected")
+        self.stdout.write("no oversell")
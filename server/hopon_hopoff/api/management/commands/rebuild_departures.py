@@ -0,0 +1,12 @@
+import time
+from django.core.management.base import BaseCommand
+from api.services.availability_services import rebuild_departures
+
+
+class Command(BaseCommand):
+    help = "Recount the sold and held seats of every departure date from bookings and seat holds."
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        dates = rebuild_departures()
+        self.stdout.write(f"Recounted {dates} departure dates in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,15 @@
+import time
+from django.core.management.base import BaseCommand
+from api.services.rating_services import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = "Rebuild the rating aggregates of every tour from Review (one grouped query, bulk updates)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tours per UPDATE')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        rated = rebuild_ratings(batch_size=options['batch_size'])
+        self.stdout.write(f"Rebuilt ratings of {rated} reviewed tours in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,15 @@
+import time
+from django.core.management.base import BaseCommand
+from api.services.tour_search_services import refresh_documents
+
+
+class Command(BaseCommand):
+    help = "Rebuild the search documents of every active tour (after ticket type changes or a bulk import)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tours per batch')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = refresh_documents(batch_size=options['batch_size'])
+        self.stdout.write(f"Rebuilt {written} tour search documents in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from api.services.email_services import EmailOutbox
+
+
+class Command(BaseCommand):
+    help = "Send the due outbox emails (cron), or keep sending them with --forever (dedicated worker process)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forever', action='store_true', help='Keep polling the outbox')
+        parser.add_argument('--batch-size', type=int, default=None, help='Messages per SMTP connection')
+
+    def handle(self, *args, **options):
+        outbox = EmailOutbox()
+        if options['batch_size']:
+            outbox.batch_size = options['batch_size']
+        if options['forever']:
+            outbox.run()
+        sent = outbox.process()
+        self.stdout.write(f"Sent {sent} emails")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from api.contants import TOKEN_SWEEP_BATCH_SIZE, TOKEN_SWEEP_PAUSE
+from api.services.sweeper_services import sweep_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired access, refresh and password reset tokens in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=TOKEN_SWEEP_BATCH_SIZE, help='Rows per DELETE')
+        parser.add_argument('--pause', type=float, default=TOKEN_SWEEP_PAUSE, help='Seconds between batches')
+
+    def handle(self, *args, **options):
+        metrics = sweep_expired(batch_size=options['batch_size'], pause=options['pause'])
+        for name, table in metrics.items():
+            self.stdout.write(
+                f"{name}: deleted {table['deleted']} rows in {table['batches']} batches, "
+                f"{table['seconds']:.2f}s ({table['rows_per_second']} rows/s)"
+            )
@@ -1,73 +1,119 @@
+import fnmatch
+from glob import has_magic
+from django.core.exceptions import ImproperlyConfigured
+from django.http import JsonResponse
+from django.urls import URLResolver, get_resolver
 from rest_framework.permissions import BasePermission
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from database.models import User, Role, Permission, UserPermission, RolePermission, UserRole
+from api.services import permission_services
+from api.authentication import CustomTokenAuthentication
 
 def has_permission(user, code):
     """
     Check if the user has the specified permission code.
+    The user's effective permissions are resolved once and cached (see api.services.permission_services).
     """
-    if not user or not user.is_authenticated:
-        return False
-    # Check direct user-permission
-    if UserPermission.objects.filter(user=user, permission__code=code).exists():
-        return True
-    
-    # Check through role
-    try:
-        role = user.userrole.role
-        return RolePermission.objects.filter(role=role, permission__code=code).exists()
-    except UserRole.role.RelatedObjectDoesNotExist:
-        return False
+    return permission_services.has_permission(user, code)
     
+class PermissionRouter:
+    """
+    Lookup table (view name, HTTP method) -> permission code, compiled once at startup.
+    Route keys are URL names (``namespace:name``) or glob patterns over URL names (``tour_*``),
+    values map HTTP methods (or ``*`` for any method) to a permission code.
+    Exact names always win over glob patterns.
+    Raises ImproperlyConfigured for a name or pattern that matches no URL: a typo would leave the route open.
+    """
+    ANY_METHOD = '*'
+
+    def __init__(self, routes, urlconf=None):
+        self.table = self.compile(routes, urlconf)
+
+    @staticmethod
+    def iter_url_names(patterns, namespace=None):
+        """
+        Yield every named URL of a URLconf, prefixed with its namespace.
+        """
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                child = pattern.namespace
+                if namespace and child:
+                    child = f"{namespace}:{child}"
+                yield from PermissionRouter.iter_url_names(pattern.url_patterns, child or namespace)
+            elif pattern.name:
+                yield f"{namespace}:{pattern.name}" if namespace else pattern.name
+
+    @classmethod
+    def compile(cls, routes, urlconf=None) -> dict:
+        names = list(cls.iter_url_names(get_resolver(urlconf).url_patterns))
+        table = {}
+        # Glob patterns first so exact names override them
+        known = set(names)
+        for pattern in sorted(routes, key=lambda route: not has_magic(route)):
+            matched = fnmatch.filter(names, pattern) if has_magic(pattern) else [pattern]
+            if not matched or not known.issuperset(matched):
+                raise ImproperlyConfigured(f"Permission route '{pattern}' does not match any URL name.")
+            for name in matched:
+                for method, code in routes[pattern].items():
+                    table[(name, method.upper())] = code
+        return table
+
+    def resolve(self, view_name, method):
+        """
+        Return the permission code required for the view and method, None if the route is public.
+        """
+        code = self.table.get((view_name, method))
+        if code is None:
+            code = self.table.get((view_name, self.ANY_METHOD))
+        return code
+
+
 class PermissionMiddleware:
     """
     Middleware to check user permissions for specific views.
+    Routes are matched on the resolved URL name, so every path variant of a route (pk, slug...) is covered.
+    Staff users (admins, see Profile.is_admin) pass every route.
     """
+    # add url name (api/urls.py) → {method → permission} mapping here
+    permission_routes = {
+        'user_list': {'GET': 'can_read_user', 'POST': 'can_create_user', 'PUT': 'can_update_user'},
+        'user_export': {'*': 'can_export_user'},
+        'booking_bulk_create': {'*': 'can_create_booking'},
+    }
+
     def __init__(self, get_response):
         self.get_response = get_response
-        # add path → permission mapping here
-        self.permission_map = {
-            '/api/tours/create/': 'can_create_tour',
-            '/api/tours/delete/': 'can_delete_tour',
-            '/api/tours/update/': 'can_update_tour',
-        }
+        self.router = PermissionRouter(self.permission_routes)
 
     def __call__(self, request):
-        # Get the view and method from the request
-        # view = request.resolver_match.view_name
-        # method = request.method
-        
-        # # Define permission codes based on view and method
-        # permission_codes = {
-        #     'tour': {
-        #         'GET': 'view_tour',
-        #         'POST': 'add_tour',
-        #         'PUT': 'change_tour',
-        #         'DELETE': 'delete_tour'
-        #     },
-        #     'user': {
-        #         'GET': 'view_user',
-        #         'POST': 'add_user',
-        #         'PUT': 'change_user',
-        #         'DELETE': 'delete_user'
-        #     }
-        # }
-        
-        # # Check if the view is in the permission codes
-        # if view in permission_codes:
-        #     code = permission_codes[view].get(method)
-        #     if code and not has_permission(request.user, code):
-        #         return Response({'detail': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
-
-        # Check if the request path is in the permission map
-        path = request.path
-        if path in self.permission_map:
-            code = self.permission_map[path]
-            if not has_permission(request.user, code):
-                return Response({'detail': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
-        
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        code = self.router.resolve(match.view_name, request.method) if match else None
+        if code is None:
+            return None
+
+        try:
+            user = self.get_user(request)
+            # Reading is_staff may load a signed token user, which fails if it was deactivated
+            is_staff = bool(user and user.is_staff)
+        except AuthenticationFailed as e:
+            return JsonResponse({'detail': str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+        if not is_staff and not has_permission(user, code):
+            return JsonResponse({'detail': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        return None
+
+    def get_user(self, request):
+        """
+        DRF authenticates inside the view, so resolve the token user here when the session has none.
+        """
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user
+        result = CustomTokenAuthentication().authenticate(request)
+        return result[0] if result else None
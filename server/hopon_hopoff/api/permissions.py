@@ -1,25 +1,25 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 from database.models import Permission, UserPermission, RolePermission
+from api.services import permission_services
 
 def HasPermission(code):
     class CustomPermission(BasePermission):
         def has_permission(self, request, view):
             if not request.user or not request.user.is_authenticated:
                 return False
+            # Kiểm tra user-permission trực tiếp và qua role (đã được cache)
+            return permission_services.has_permission(request.user, code)
             
-            user = request.user
-            # Kiểm tra user-permission trực tiếp
-            if UserPermission.objects.filter(user=user, code=code).exists():
-                return True
-            # Kiểm tra qua role
-            try:
-                role = user.userrole.role
-                return RolePermission.objects.filter(   
-                    role=role, permission__code=code
-                ).exists()
-            except:
+    return CustomPermission
+
+
+def IsStaffOrHasPermission(code):
+    class CustomPermission(BasePermission):
+        def has_permission(self, request, view):
+            if not request.user or not request.user.is_authenticated:
                 return False
-            
+            return request.user.is_staff or permission_services.has_permission(request.user, code)
+
     return CustomPermission
 
 
@@ -0,0 +1,167 @@
+import calendar
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from django.db import transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from database.models import Tour, TourDeparture, BookingItem, SeatHold
+
+# Booking statuses counted as sold seats on their departure date
+SOLD_STATUSES = ('confirmed', 'completed')
+
+
+def departure_day(value):
+    """
+    Booking.departure_date is a DateTimeField, departures are stored per local date.
+    """
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    return value
+
+
+def ensure_departure(tour_id, day):
+    """
+    Create the departure row of a date on first use, with the tour capacity.
+    """
+    TourDeparture.objects.get_or_create(
+        tour_id=tour_id, date=departure_day(day),
+        defaults={'capacity': lambda: Tour.objects.filter(pk=tour_id).values_list('max_participants', flat=True).first() or 0},
+    )
+
+
+def adjust_departure(tour_id, day, sold=0, held=0):
+    """
+    Add `sold`/`held` deltas to one departure row with a single UPDATE, without a capacity check
+    (seats are taken with inventory_services.reserve_seats).
+    The row is created on first use with the tour capacity. Counts never go below 0: giving back seats
+    the row never counted must not open capacity that is not there.
+    """
+    if not (sold or held) or day is None:
+        return
+    day = departure_day(day)
+    if sold > 0 or held > 0:
+        # Nothing to take back from a row that was never created
+        ensure_departure(tour_id, day)
+    TourDeparture.objects.filter(tour_id=tour_id, date=day).update(
+        sold=Greatest(F('sold') + sold, Value(0)), held=Greatest(F('held') + held, Value(0)),
+    )
+
+
+def adjust_departures(deltas):
+    """
+    Apply many deltas at once: {(tour_id, day): (sold, held)}.
+    """
+    for (tour_id, day), (sold, held) in deltas.items():
+        adjust_departure(tour_id, day, sold=sold, held=held)
+
+
+def rebuild_departures() -> int:
+    """
+    Recount the sold and held seats of every departure date: items of bookings in SOLD_STATUSES and
+    seat holds, per (tour, date). Departure rows are created as needed, dates without seats go back to 0.
+    Run when bookings are not being taken (migration 0023, `rebuild_departures` command).
+    returns the number of dates with seats taken.
+    """
+    counts = defaultdict(lambda: [0, 0])  # (tour_id, day) -> [sold, held]
+    sold = BookingItem.objects.filter(booking__status__in=SOLD_STATUSES).values_list(
+        'booking__tour_id', 'booking__departure_date',
+    ).annotate(total=Sum('quantity')).order_by()
+    for tour_id, departure_date, total in sold:
+        counts[tour_id, departure_day(departure_date)][0] += total
+    held = SeatHold.objects.filter(departure_date__isnull=False).values_list(
+        'tour_id', 'departure_date',
+    ).annotate(total=Sum('quantity')).order_by()
+    for tour_id, day, total in held:
+        counts[tour_id, day][1] += total
+
+    with transaction.atomic():
+        TourDeparture.objects.exclude(sold=0, held=0).update(sold=0, held=0)
+        departures = {
+            (departure.tour_id, departure.date): departure
+            for departure in TourDeparture.objects.filter(tour_id__in={tour_id for tour_id, _ in counts})
+        }
+        capacities = dict(Tour.objects.filter(pk__in={tour_id for tour_id, _ in counts}).values_list('id', 'max_participants'))
+        created = []
+        for (tour_id, day), (sold_seats, held_seats) in counts.items():
+            departure = departures.get((tour_id, day))
+            if departure is None:
+                created.append(TourDeparture(
+                    tour_id=tour_id, date=day, capacity=capacities.get(tour_id) or 0, sold=sold_seats, held=held_seats,
+                ))
+            else:
+                departure.sold, departure.held = sold_seats, held_seats
+        TourDeparture.objects.bulk_create(created, batch_size=1000)
+        TourDeparture.objects.bulk_update(
+            [departure for key, departure in departures.items() if key in counts], ['sold', 'held'], batch_size=1000,
+        )
+    return len(counts)
+
+
+def booking_state(booking):
+    """
+    The part of a booking that decides where its seats are counted.
+    """
+    return booking.tour_id, departure_day(booking.departure_date), booking.status in SOLD_STATUSES
+
+
+def record_booking_transition(booking, old_state, new_state):
+    """
+    Move the sold seats of a booking when its status, tour or date changes.
+    """
+    if old_state == new_state or not (old_state[2] or new_state[2]):
+        return
+    quantity = BookingItem.objects.filter(booking_id=booking.pk).aggregate(total=Sum('quantity'))['total'] or 0
+    if not quantity:
+        return
+    if old_state[2]:
+        adjust_departure(old_state[0], old_state[1], sold=-quantity)
+    if new_state[2]:
+        adjust_departure(new_state[0], new_state[1], sold=quantity)
+
+
+def month_range(month):
+    """
+    'YYYY-MM' -> (first day, last day).
+    """
+    year, month = (int(part) for part in month.split('-'))
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def get_availability(tours, start, end) -> dict:
+    """
+    Availability of many tours for every day of [start, end], in one query over tour_departure.
+    `tours` are Tour instances (or ids, which costs one more query for the capacities).
+    Days without a departure row have the full tour capacity, days outside the tour period are skipped.
+    returns {tour_id: [{date, capacity, sold, held, available}, ...]}
+    """
+    tours = list(tours)
+    if tours and not isinstance(tours[0], Tour):
+        tours = list(Tour.objects.filter(pk__in=tours).only('id', 'max_participants', 'start_date', 'end_date'))
+    rows = {
+        (tour_id, day): (capacity, sold, held)
+        for tour_id, day, capacity, sold, held in TourDeparture.objects.filter(
+            tour_id__in=[tour.pk for tour in tours], date__range=(start, end),
+        ).values_list('tour_id', 'date', 'capacity', 'sold', 'held')
+    }
+    result = {tour.pk: [] for tour in tours}
+    for tour in tours:
+        day = max(start, tour.start_date)
+        last = min(end, tour.end_date)
+        while day <= last:
+            capacity, sold, held = rows.get((tour.pk, day), (tour.max_participants, 0, 0))
+            result[tour.pk].append({
+                'date': day,
+                'capacity': capacity,
+                'sold': sold,
+                'held': held,
+                'available': max(capacity - sold - held, 0),
+            })
+            day += timedelta(days=1)
+    return result
+
+
+def get_month_availability(tours, month) -> dict:
+    return get_availability(tours, *month_range(month))
@@ -0,0 +1,126 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from database.models import Booking, BookingItem, BookingInfo, SeatHold
+from api.contants import BULK_BOOKING_BATCH_SIZE, SEAT_HOLD_TTL
+from api.services.availability_services import SOLD_STATUSES, departure_day
+from api.services.discount_services import get_discount, redeem
+from api.services.inventory_services import SoldOut, reserve_seats
+from api.services.pricing_services import PriceTable, PricingError
+
+BOOKING_INFO_FIELDS = ('phone_number', 'email', 'full_name', 'country', 'hotel_address', 'state')
+# Booking.seat_status by status: pending bookings hold their seats, the others that take seats sold them
+SEAT_STATUSES = {'pending': 'held', **{status: 'sold' for status in SOLD_STATUSES}}
+
+
+def basket_of(items) -> dict:
+    """
+    [{ticket_type_id, quantity}, ...] -> {ticket_type_id: quantity}, repeated ticket types are merged.
+    """
+    basket = defaultdict(int)
+    for item in items:
+        basket[int(item['ticket_type_id'])] += int(item['quantity'])
+    if not basket:
+        raise PricingError("A booking needs at least one ticket.")
+    return dict(basket)
+
+
+def load_discounts(codes) -> dict:
+    """
+    Usable discounts of many codes (from the discount cache): {code: Discount}.
+    Raises PricingError for a code that does not exist, is not valid now or has no uses left:
+    the booking is refused rather than silently taken at full price.
+    """
+    discounts = {code: get_discount(code) for code in set(codes) if code}
+    for code, discount in discounts.items():
+        if discount is None:
+            raise PricingError(f"Discount code {code} is not valid.")
+    return discounts
+
+
+def create_bookings(rows, batch_size=BULK_BOOKING_BATCH_SIZE) -> list:
+    """
+    Create many bookings at once.
+    rows: [{tour_id, departure_date, items: [{ticket_type_id, quantity}], info: {...} or None,
+            user_id, status, notes, discount_code}, ...]
+
+    Prices are computed in memory from one PriceTable, then Booking, BookingItem, BookingInfo
+    (and SeatHold for pending bookings) are inserted with bulk_create in one transaction.
+    Seats are reserved with one conditional UPDATE per departure date (and one on the tour total),
+    discount uses are redeemed with one guarded UPDATE per code.
+    Raises PricingError for an invalid basket or an exhausted discount and SoldOut when a date is full,
+    nothing is created then.
+    returns the created Booking objects, in input order.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    prices = PriceTable({int(row['tour_id']) for row in rows})
+    discounts = load_discounts(row.get('discount_code') for row in rows)
+
+    bookings = []
+    quotes = []
+    for row in rows:
+        quote = prices.quote(int(row['tour_id']), basket_of(row['items']), discounts.get(row.get('discount_code')))
+        if not quote['discount_amount'] > 0:
+            # Below the code's minimum purchase: nothing is discounted, no use is spent
+            quote['discount_code'] = ''
+        quotes.append(quote)
+        bookings.append(Booking(
+            tour_id=quote['tour_id'],
+            user_id=row.get('user_id'),
+            departure_date=row['departure_date'],
+            status=row.get('status', 'pending'),
+            seat_status=SEAT_STATUSES.get(row.get('status', 'pending'), 'none'),
+            notes=row.get('notes', ''),
+            discount_code=quote['discount_code'],
+            # Redeemed below, in the same transaction
+            discount_uses=1 if quote['discount_code'] else 0,
+            discount_amount=quote['discount_amount'],
+            total_price=quote['total_price'],
+            final_price=quote['final_price'],
+        ))
+
+    departures = defaultdict(lambda: [0, 0])
+    redemptions = defaultdict(int)
+    for quote in quotes:
+        if quote['discount_code']:
+            redemptions[quote['discount_code']] += 1
+    for booking, quote in zip(bookings, quotes):
+        if booking.status not in ('pending',) + SOLD_STATUSES:
+            continue
+        quantity = sum(item['quantity'] for item in quote['items'])
+        # [sold, held] per departure: pending bookings hold their seats, the others sold them
+        departure = departures[booking.tour_id, departure_day(booking.departure_date)]
+        departure[1 if booking.status == 'pending' else 0] += quantity
+
+    with transaction.atomic():
+        for (tour_id, day), (sold, held) in departures.items():
+            if not reserve_seats(tour_id, day, sold=sold, held=held):
+                raise SoldOut(f"Not enough seats left on tour {tour_id} on {day}.")
+        for code, uses in redemptions.items():
+            if not redeem(discounts[code], uses):
+                raise PricingError(f"Discount code {code} has no uses left.")
+        # Bookings need their primary keys before the rows that point to them (RETURNING on Postgres)
+        Booking.objects.bulk_create(bookings, batch_size=batch_size)
+        BookingItem.objects.bulk_create([
+            BookingItem(
+                booking=booking, ticket_type_id=item['ticket_type_id'], quantity=item['quantity'],
+                unit_price=item['unit_price'], total_price=item['total_price'],
+            )
+            for booking, quote in zip(bookings, quotes) for item in quote['items']
+        ], batch_size=batch_size)
+        BookingInfo.objects.bulk_create([
+            BookingInfo(booking=booking, **{field: row['info'].get(field, '') for field in BOOKING_INFO_FIELDS})
+            for booking, row in zip(bookings, rows) if row.get('info')
+        ], batch_size=batch_size)
+        expires_at = timezone.now() + timedelta(seconds=SEAT_HOLD_TTL)
+        SeatHold.objects.bulk_create([
+            SeatHold(
+                tour_id=booking.tour_id, booking=booking, departure_date=departure_day(booking.departure_date),
+                quantity=sum(item['quantity'] for item in quote['items']), expires_at=expires_at,
+            )
+            for booking, quote in zip(bookings, quotes) if booking.status == 'pending'
+        ], batch_size=batch_size)
+    return bookings
@@ -0,0 +1,98 @@
+import time
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Q
+from database.models import Destination
+from api.contants import CATALOGUE_CACHE_ALIAS, CATALOGUE_CACHE_TTL, CATALOGUE_LOCAL_CACHE_TTL
+from api.ultils import get_shared_cache
+
+VERSION_KEY = "catalogue:version"
+SUMMARY_KEY = "catalogue:summary:{}"
+
+
+def get_cache():
+    """
+    (cache, ttl): the shared cache with the full TTL, else the process-local one with a short TTL,
+    since other processes never see its invalidations.
+    """
+    cache = get_shared_cache(CATALOGUE_CACHE_ALIAS)
+    if cache is not None:
+        return cache, CATALOGUE_CACHE_TTL
+    return caches[CATALOGUE_CACHE_ALIAS], CATALOGUE_LOCAL_CACHE_TTL
+
+
+def new_version() -> int:
+    # Never a value used before, even when the version key was evicted from the cache
+    return time.time_ns()
+
+
+def build_catalogue() -> list:
+    """
+    Active cities with their active destinations, active tour counts and popularity ranks,
+    from one grouped query. Cities and destinations are sorted by rank (most tours first).
+    """
+    rows = Destination.objects.filter(is_active=True, city__is_active=True).values(
+        'id', 'name', 'icon', 'type_id', 'city_id', 'city__name', 'city__country',
+    ).annotate(tour_count=Count('tour', filter=Q(tour__is_active=True))).order_by()
+
+    cities = {}
+    for row in rows:
+        city = cities.setdefault(row['city_id'], {
+            'id': row['city_id'],
+            'name': row['city__name'],
+            'country': row['city__country'],
+            'tour_count': 0,
+            'destinations': [],
+        })
+        city['tour_count'] += row['tour_count']
+        city['destinations'].append({
+            'id': row['id'],
+            'name': row['name'],
+            'icon': row['icon'],
+            'type_id': row['type_id'],
+            'tour_count': row['tour_count'],
+        })
+
+    catalogue = sorted(cities.values(), key=lambda city: (-city['tour_count'], city['name']))
+    for rank, city in enumerate(catalogue, 1):
+        city['rank'] = rank
+        city['destinations'].sort(key=lambda destination: (-destination['tour_count'], destination['name']))
+        for destination_rank, destination in enumerate(city['destinations'], 1):
+            destination['rank'] = destination_rank
+    return catalogue
+
+
+def get_catalogue() -> list:
+    """
+    The whole destinations tree in one call, from the cache in the common case.
+    """
+    cache, ttl = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, new_version(), None)
+        version = cache.get(VERSION_KEY)
+    key = SUMMARY_KEY.format(version)
+    catalogue = cache.get(key)
+    if catalogue is None:
+        catalogue = build_catalogue()
+        cache.set(key, catalogue, ttl)
+    return catalogue
+
+
+def get_city_summary(city_id):
+    """
+    One city of the cached tree (counts, rank, popular destinations), None if it has no active destination.
+    """
+    return next((city for city in get_catalogue() if city['id'] == city_id), None)
+
+
+def bump_version():
+    cache, _ = get_cache()
+    cache.set(VERSION_KEY, new_version(), None)
+
+
+def invalidate():
+    """
+    Drop the cached tree once the current transaction commits, so it is never rebuilt from stale rows.
+    """
+    transaction.on_commit(bump_version)
@@ -0,0 +1,94 @@
+import hashlib
+import json
+from django.core.cache import caches
+from django.db import connections
+from api.contants import COUNT_STRATEGIES, COUNT_ESTIMATE_THRESHOLD, COUNT_CACHE_TTL, COUNT_CACHE_ALIAS
+
+EXACT = 'exact'
+ESTIMATE = 'estimate'
+CACHED = 'cached'
+
+# Filter complexity levels
+NONE = 'none'
+SIMPLE = 'simple'
+COMPLEX = 'complex'
+
+
+def choose_strategy(endpoint, complexity=NONE) -> str:
+    """
+    Pick the count strategy configured for an endpoint and filter complexity, exact by default.
+    """
+    return COUNT_STRATEGIES.get(endpoint, {}).get(complexity, EXACT)
+
+
+def exact_count(queryset) -> int:
+    return queryset.count()
+
+
+def cached_count(queryset) -> int:
+    """
+    Exact count cached for COUNT_CACHE_TTL seconds, keyed by the SQL of the queryset.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.md5(f"{sql}|{params!r}".encode()).hexdigest()
+    key = f"count:{queryset.model._meta.db_table}:{digest}"
+    cache = caches[COUNT_CACHE_ALIAS]
+    total = cache.get(key)
+    if total is None:
+        total = queryset.count()
+        cache.set(key, total, COUNT_CACHE_TTL)
+    return total
+
+
+def table_estimate(queryset):
+    """
+    Planner row estimate of the whole table from pg_class.reltuples, None if unknown.
+    """
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 for tables that were never vacuumed/analyzed
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def plan_estimate(queryset):
+    """
+    Planner row estimate of a filtered queryset from EXPLAIN, None if unknown.
+    """
+    try:
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+def estimated_count(queryset, filtered):
+    """
+    Planner estimate on Postgres. Returns a tuple of (total, is_approximate).
+    Small results and other databases fall back to an exact count.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return exact_count(queryset), False
+    estimate = plan_estimate(queryset) if filtered else table_estimate(queryset)
+    if estimate is None or estimate < COUNT_ESTIMATE_THRESHOLD:
+        return exact_count(queryset), False
+    return estimate, True
+
+
+def count_queryset(queryset, endpoint=None, complexity=NONE):
+    """
+    Count a queryset with the strategy configured for the endpoint.
+    returns a tuple of total count and whether it is approximate.
+    """
+    strategy = choose_strategy(endpoint, complexity)
+    if strategy == ESTIMATE:
+        return estimated_count(queryset, filtered=complexity != NONE)
+    if strategy == CACHED:
+        return cached_count(queryset), False
+    return exact_count(queryset), False
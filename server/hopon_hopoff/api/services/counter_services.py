@@ -0,0 +1,163 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from django.core.cache import caches
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F
+from database.models import Post
+from api.contants import VIEW_COUNTER_FLUSH_INTERVAL, VIEW_COUNTER_MAX_PENDING, VIEW_COUNTER_CACHE_ALIAS
+
+logger = logging.getLogger(__name__)
+
+# Primary keys per UPDATE ... WHERE id IN (...)
+FLUSH_BATCH_SIZE = 1000
+
+# Every counter of the process, flushed on shutdown
+counters = []
+
+
+class BufferedCounter:
+    """
+    Write-behind counter for an integer column (Post.views...).
+    Increments are accumulated in process memory, or in a cache backend when `cache_alias` is set,
+    and written every `flush_interval` seconds (or once `max_pending` increments are buffered)
+    as `UPDATE ... SET col = col + n WHERE id IN (...)`: one UPDATE per distinct n, never one per hit.
+    Increments are never lost to concurrent read-modify-write, only delayed.
+    """
+    def __init__(self, model, field, flush_interval=VIEW_COUNTER_FLUSH_INTERVAL,
+                 max_pending=VIEW_COUNTER_MAX_PENDING, cache_alias=VIEW_COUNTER_CACHE_ALIAS):
+        self.model = model
+        self.field = field
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.cache_alias = cache_alias
+        self.lock = threading.Lock()
+        self.pending = defaultdict(int)  # pk -> buffered increments (cache mode: rows this process must flush)
+        self.size = 0
+        self.thread = None
+        counters.append(self)
+
+    def key(self, pk):
+        return f"counter:{self.model._meta.label_lower}:{self.field}:{pk}"
+
+    def incr(self, pk, n=1):
+        full = self.buffer(pk, n)
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.start()
+        if full:
+            self.flush()
+
+    def buffer(self, pk, n) -> bool:
+        """
+        Add n to the buffer, True once the buffer is full.
+        """
+        if self.cache_alias:
+            cache = caches[self.cache_alias]
+            key = self.key(pk)
+            cache.add(key, 0, None)
+            cache.incr(key, n)
+        with self.lock:
+            self.pending[pk] += n
+            self.size += n
+            return self.size >= self.max_pending
+
+    def get_pending(self, pk) -> int:
+        """
+        Increments of a row not written yet, to show an up-to-date count.
+        """
+        if self.cache_alias:
+            return caches[self.cache_alias].get(self.key(pk)) or 0
+        with self.lock:
+            return self.pending.get(pk, 0)
+
+    def take(self) -> dict:
+        """
+        Swap the buffer for an empty one: pk -> increments to write.
+        """
+        with self.lock:
+            pending, self.pending, self.size = self.pending, defaultdict(int), 0
+        if not self.cache_alias:
+            return pending
+        cache = caches[self.cache_alias]
+        taken = {}
+        for pk in pending:
+            n = self.claim(cache, self.key(pk))
+            if n:
+                taken[pk] = n
+        return taken
+
+    @staticmethod
+    def claim(cache, key) -> int:
+        """
+        Take the increments buffered under `key` in the cache, returns how many this call owns.
+        The atomic decr decides: when another process flushing the same row claimed first, the value
+        drops below zero and the part claimed twice is given back, so every increment is written once.
+        decr, not delete: increments made by other processes meanwhile stay in the cache.
+        """
+        n = cache.get(key) or 0
+        if n <= 0:
+            return 0
+        before = cache.decr(key, n) + n
+        claimed = max(0, min(n, before))
+        if claimed < n:
+            cache.incr(key, n - claimed)
+        return claimed
+
+    def restore(self, pending):
+        for pk, n in pending.items():
+            self.buffer(pk, n)
+
+    def flush(self) -> int:
+        """
+        Write the buffered increments. returns the number of UPDATE statements.
+        """
+        pending = self.take()
+        by_amount = defaultdict(list)
+        for pk, n in pending.items():
+            by_amount[n].append(pk)
+        writes = 0
+        try:
+            with transaction.atomic():
+                for n, pks in by_amount.items():
+                    for start in range(0, len(pks), FLUSH_BATCH_SIZE):
+                        self.model.objects.filter(pk__in=pks[start:start + FLUSH_BATCH_SIZE]).update(
+                            **{self.field: F(self.field) + n}
+                        )
+                        writes += 1
+        except DatabaseError:
+            # Keep the increments for the next flush
+            logger.exception("Could not flush %s.%s, retrying later", self.model._meta.label, self.field)
+            self.restore(pending)
+            return 0
+        return writes
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.run, name=f"counter-{self.model._meta.label_lower}-{self.field}", daemon=True,
+        )
+        self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Counter flush failed")
+            finally:
+                close_old_connections()
+
+
+def flush_all():
+    for counter in counters:
+        counter.flush()
+
+
+# Buffered increments are written when the process exits normally (worker restart, deploy...)
+atexit.register(flush_all)
+
+post_views = BufferedCounter(Post, 'views')
@@ -0,0 +1,193 @@
+import random
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from database.models import Discount, DiscountShard
+from api.contants import DISCOUNT_CACHE_ALIAS, DISCOUNT_CACHE_TTL, DISCOUNT_SHARDS
+
+CODE_KEY = "discount:{}"
+# Cached marker for codes that do not exist or have no uses left
+MISSING = 'missing'
+EXHAUSTED = 'exhausted'
+SNAPSHOT_FIELDS = (
+    'id', 'code', 'discount_percentage', 'valid_from', 'valid_to', 'is_active',
+    'max_uses', 'current_uses', 'min_purchase_amount',
+)
+
+
+def get_cache():
+    return caches[DISCOUNT_CACHE_ALIAS]
+
+
+def load_snapshot(code):
+    """
+    Discount fields of a code plus its number of shards, MISSING if the code does not exist.
+    The uses of a sharded code are summed here, once per cache miss.
+    """
+    discount = Discount.objects.filter(code=code).values(*SNAPSHOT_FIELDS).first()
+    if discount is None:
+        return MISSING
+    shards = DiscountShard.objects.filter(discount_id=discount['id']).aggregate(count=Count('id'), uses=Sum('uses'))
+    discount['shards'] = shards['count']
+    if shards['count']:
+        Discount.objects.filter(pk=discount['id']).update(current_uses=shards['uses'])
+        discount['current_uses'] = shards['uses']
+    return discount
+
+
+def get_snapshot(code):
+    cache = get_cache()
+    key = CODE_KEY.format(code)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = load_snapshot(code)
+        cache.set(key, snapshot, DISCOUNT_CACHE_TTL)
+    return snapshot
+
+
+def get_discount(code):
+    """
+    Usable discount of a code, None if it does not exist, is not valid now or has no uses left.
+    Answered from the cache (short TTL) in the common case, the returned Discount is a read-only
+    snapshot: redeem it with redeem(), never save it.
+    """
+    if not code:
+        return None
+    snapshot = get_snapshot(code)
+    if snapshot in (MISSING, EXHAUSTED):
+        return None
+    discount = Discount(**{field: snapshot[field] for field in SNAPSHOT_FIELDS})
+    discount.shard_count = snapshot['shards']
+    return discount if discount.is_valid() else None
+
+
+def invalidate(code):
+    get_cache().delete(CODE_KEY.format(code))
+
+
+def mark_exhausted(code):
+    """
+    Remember that a code ran out of uses until the code changes or the TTL expires.
+    """
+    get_cache().set(CODE_KEY.format(code), EXHAUSTED, DISCOUNT_CACHE_TTL)
+
+
+def redeemable(queryset, uses, used='current_uses', limit='max_uses'):
+    """
+    Rows that still have `uses` uses left: the guard of the redemption UPDATE.
+    """
+    return queryset.filter(
+        Q(**{f'{limit}__isnull': True})
+        | Q(**{f'{used}__lte': F(limit) - uses})
+        | Q(**{f'{used}__isnull': True, f'{limit}__gte': uses})
+    )
+
+
+def redeem(discount, uses=1) -> bool:
+    """
+    Claim `uses` uses of a discount with a single guarded UPDATE, True on success.
+    UPDATE discount SET current_uses = current_uses + n WHERE current_uses + n <= max_uses (and still valid):
+    concurrent checkouts never overshoot max_uses and never wait on a row lock held across a request.
+    Sharded codes claim from a random shard first, then from the others (see redeem_shard).
+    """
+    if getattr(discount, 'shard_count', None) is None:
+        discount.shard_count = DiscountShard.objects.filter(discount_id=discount.pk).count()
+    if discount.shard_count:
+        redeemed = redeem_shard(discount, uses)
+    else:
+        now = timezone.now()
+        redeemed = redeemable(
+            Discount.objects.filter(pk=discount.pk, is_active=True, valid_from__lte=now, valid_to__gte=now), uses,
+        ).update(current_uses=Coalesce(F('current_uses'), 0) + uses) == 1
+    if not redeemed and uses == 1:
+        mark_exhausted(discount.code)
+    return redeemed
+
+
+def redeem_shard(discount, uses) -> bool:
+    """
+    Claim `uses` uses from the shards of a code, starting with a random shard. A multi-use claim takes
+    what each shard has left until it is complete, and is rolled back if the shards together fall short.
+    """
+    now = timezone.now()
+    if not Discount.objects.filter(pk=discount.pk, is_active=True, valid_from__lte=now, valid_to__gte=now).exists():
+        return False
+    shards = list(DiscountShard.objects.filter(discount_id=discount.pk).values_list('shard', 'uses', 'max_uses'))
+    random.shuffle(shards)
+    remaining = uses
+    with transaction.atomic():
+        for shard, used, limit in shards:
+            shard_rows = DiscountShard.objects.filter(discount_id=discount.pk, shard=shard)
+            while remaining:
+                take = remaining if limit is None else min(remaining, limit - used)
+                if take <= 0:
+                    break
+                if redeemable(shard_rows, take, used='uses').update(uses=F('uses') + take):
+                    remaining -= take
+                    break
+                # Another checkout used this shard in between: read what is left and try again
+                used, limit = shard_rows.values_list('uses', 'max_uses').get()
+            if not remaining:
+                return True
+        transaction.set_rollback(True)
+    return False
+
+
+def release(discount, uses=1) -> bool:
+    """
+    Give back uses (cancelled booking). Sharded codes return them to the shards that have uses,
+    spread over several shards if needed.
+    """
+    if DiscountShard.objects.filter(discount_id=discount.pk).exists():
+        remaining = uses
+        with transaction.atomic():
+            for shard, used in DiscountShard.objects.filter(discount_id=discount.pk, uses__gt=0).values_list('pk', 'uses'):
+                take = min(remaining, used)
+                if DiscountShard.objects.filter(pk=shard, uses__gte=take).update(uses=F('uses') - take):
+                    remaining -= take
+                if not remaining:
+                    break
+        released = not remaining
+    else:
+        released = Discount.objects.filter(pk=discount.pk, current_uses__gte=uses).update(
+            current_uses=F('current_uses') - uses,
+        ) == 1
+    invalidate(discount.code)
+    return released
+
+
+def enable_sharding(discount, shards=DISCOUNT_SHARDS):
+    """
+    Split the remaining uses of a hot code over `shards` counters.
+    The first shard starts with the uses already made, so the shards always sum to the total.
+    """
+    with transaction.atomic():
+        discount = Discount.objects.select_for_update().get(pk=discount.pk)
+        if DiscountShard.objects.filter(discount=discount).exists():
+            return
+        used = discount.current_uses or 0
+        if discount.max_uses is None:
+            limits = [None] * shards
+        else:
+            remaining = max(discount.max_uses - used, 0)
+            limits = [remaining // shards + (1 if i < remaining % shards else 0) for i in range(shards)]
+            limits[0] += used
+        DiscountShard.objects.bulk_create([
+            DiscountShard(discount=discount, shard=i, uses=used if i == 0 else 0, max_uses=limit)
+            for i, limit in enumerate(limits)
+        ])
+    invalidate(discount.code)
+
+
+def sync_uses(discount) -> int:
+    """
+    Sum the shards of a code into Discount.current_uses now (reports), instead of at the next cache miss.
+    returns the total number of uses.
+    """
+    total = DiscountShard.objects.filter(discount_id=discount.pk).aggregate(total=Sum('uses'))['total']
+    if total is None:
+        return Discount.objects.filter(pk=discount.pk).values_list('current_uses', flat=True).get() or 0
+    Discount.objects.filter(pk=discount.pk).update(current_uses=total)
+    return total
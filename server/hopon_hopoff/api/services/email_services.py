@@ -0,0 +1,216 @@
+import logging
+import random
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from database.models import OutboxEmail
+from api.contants import (
+    EMAIL_OUTBOX_WORKERS, EMAIL_OUTBOX_BATCH_SIZE, EMAIL_OUTBOX_POLL_INTERVAL, EMAIL_OUTBOX_MAX_ATTEMPTS,
+    EMAIL_OUTBOX_RETRY_DELAY, EMAIL_OUTBOX_MAX_RETRY_DELAY, EMAIL_OUTBOX_LEASE, EMAIL_OUTBOX_BACKLOG_WARNING,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(subject, body, to, html_body='', from_email=None, user=None, dedupe_key=None) -> OutboxEmail:
+    """
+    Store an email in the outbox, it is sent by the send_outbox command (or the in-process pool when
+    EMAIL_OUTBOX_WORKERS is set) once the transaction commits.
+    While a message with the same dedupe_key is still pending, it is replaced instead of queuing a second one
+    (a user asking twice for a reset link gets one email, with the latest link).
+    """
+    fields = {
+        'user': user,
+        'subject': subject,
+        'body': body,
+        'html_body': html_body,
+        'from_email': from_email or settings.DEFAULT_FROM_EMAIL or '',
+        'to': ','.join(to),
+        # A replaced message starts over: a worker sending the old content will not mark it sent
+        'attempts': 0,
+        'next_attempt_at': timezone.now(),
+        'last_error': '',
+    }
+    message = None
+    if dedupe_key:
+        message = replace_pending(dedupe_key, fields)
+    if message is None:
+        try:
+            with transaction.atomic():
+                message = OutboxEmail.objects.create(dedupe_key=dedupe_key, **fields)
+        except IntegrityError:
+            # Queued concurrently with the same key
+            message = replace_pending(dedupe_key, fields)
+            if message is None:
+                raise
+    transaction.on_commit(outbox.wake)
+    return message
+
+
+def replace_pending(dedupe_key, fields):
+    pending = OutboxEmail.objects.filter(dedupe_key=dedupe_key, status='pending')
+    if not pending.update(**fields):
+        return None
+    return pending.first()
+
+
+def claim(batch_size=EMAIL_OUTBOX_BATCH_SIZE) -> list:
+    """
+    Take up to batch_size due messages: their next attempt moves EMAIL_OUTBOX_LEASE seconds ahead,
+    so other workers skip them and they come back by themselves if this worker dies.
+    """
+    now = timezone.now()
+    lease = now + timedelta(seconds=EMAIL_OUTBOX_LEASE)
+    due = OutboxEmail.objects.filter(status='pending', next_attempt_at__lte=now)
+    with transaction.atomic():
+        messages = list(due.order_by('next_attempt_at', 'id').select_for_update(skip_locked=True)[:batch_size])
+        if not messages:
+            return []
+        # Still guarded by the due filter: backends without row locks may let two workers read the same rows
+        claimed = due.filter(pk__in=[message.pk for message in messages]).update(
+            attempts=F('attempts') + 1, next_attempt_at=lease,
+        )
+    if claimed < len(messages):
+        return list(OutboxEmail.objects.filter(pk__in=[message.pk for message in messages], next_attempt_at=lease))
+    for message in messages:
+        message.attempts += 1
+    return messages
+
+
+def retry_delay(attempts) -> float:
+    delay = min(EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1), EMAIL_OUTBOX_MAX_RETRY_DELAY)
+    # Jitter: messages failed together are not retried together
+    return delay * random.uniform(0.8, 1.2)
+
+
+def build(message, connection) -> EmailMultiAlternatives:
+    email = EmailMultiAlternatives(
+        message.subject, message.body, message.from_email or None, message.to.split(','), connection=connection,
+    )
+    if message.html_body:
+        email.attach_alternative(message.html_body, "text/html")
+    return email
+
+
+def deliver(messages) -> int:
+    """
+    Send claimed messages over one SMTP connection. returns the number of messages sent.
+    Failed messages are retried with exponential backoff, then marked failed after EMAIL_OUTBOX_MAX_ATTEMPTS.
+    """
+    sent = []
+    errors = {}
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        errors = {message.pk: e for message in messages}
+    else:
+        try:
+            for message in messages:
+                try:
+                    build(message, connection).send()
+                    sent.append(message)
+                except Exception as e:
+                    errors[message.pk] = e
+        finally:
+            connection.close()
+
+    now = timezone.now()
+    # Guarded by attempts: a message replaced meanwhile (enqueue with the same dedupe key) stays pending
+    for message in sent:
+        OutboxEmail.objects.filter(pk=message.pk, attempts=message.attempts).update(
+            status='sent', sent_at=now, last_error='',
+        )
+    for message in messages:
+        if message.pk not in errors:
+            continue
+        if message.attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+            update = {'status': 'failed'}
+        else:
+            update = {'next_attempt_at': now + timedelta(seconds=retry_delay(message.attempts))}
+        OutboxEmail.objects.filter(pk=message.pk, attempts=message.attempts).update(
+            last_error=str(errors[message.pk])[:1000], **update,
+        )
+    return len(sent)
+
+
+class EmailOutbox:
+    """
+    Pool of background threads sending the outbox in batches.
+    Opt-in (EMAIL_OUTBOX_WORKERS): started on the first enqueue, woken up by each new message and every
+    `poll_interval` seconds for retries. Without workers, the outbox is sent by the send_outbox command only.
+    """
+    def __init__(self, workers=EMAIL_OUTBOX_WORKERS, batch_size=EMAIL_OUTBOX_BATCH_SIZE,
+                 poll_interval=EMAIL_OUTBOX_POLL_INTERVAL):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.threads = []
+        self.checked_at = None
+
+    def wake(self):
+        if not self.workers:
+            self.check_backlog()
+            return
+        if not self.threads:
+            with self.lock:
+                if not self.threads:
+                    self.start()
+        self.event.set()
+
+    def check_backlog(self):
+        """
+        Without in-process workers the outbox is only sent by the send_outbox command: warn when a message
+        has been due for more than EMAIL_OUTBOX_BACKLOG_WARNING seconds (nothing is sending).
+        Checked at most once a minute, with one query on the due index.
+        """
+        if self.checked_at is not None and time.monotonic() - self.checked_at < 60:
+            return
+        self.checked_at = time.monotonic()
+        limit = timezone.now() - timedelta(seconds=EMAIL_OUTBOX_BACKLOG_WARNING)
+        oldest = OutboxEmail.objects.filter(status='pending', next_attempt_at__lte=limit).order_by(
+            'next_attempt_at',
+        ).values_list('next_attempt_at', flat=True).first()
+        if oldest is not None:
+            logger.warning(
+                "Email outbox is backing up: a message has been due since %s. Run `manage.py send_outbox --forever` "
+                "(or from cron), or set EMAIL_OUTBOX_WORKERS.", oldest,
+            )
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.run, name=f"email-outbox-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def run(self):
+        while True:
+            self.event.wait(self.poll_interval)
+            self.event.clear()
+            try:
+                self.process()
+            except Exception:
+                logger.exception("Sending the email outbox failed")
+            finally:
+                close_old_connections()
+
+    def process(self) -> int:
+        """
+        Send every due message now, batch by batch. returns the number of messages sent.
+        """
+        sent = 0
+        while True:
+            messages = claim(self.batch_size)
+            if not messages:
+                return sent
+            sent += deliver(messages)
+
+
+outbox = EmailOutbox()
@@ -0,0 +1,145 @@
+from datetime import date, datetime
+from functools import lru_cache
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+# Query string operator -> ORM lookup. Syntax: ?filter=field=value,field__op=value, lists separated by "|"
+OPERATORS = {
+    'eq': 'exact',
+    'in': 'in',
+    'gte': 'gte',
+    'lte': 'lte',
+    'range': 'range',
+    'prefix': 'istartswith',
+}
+LIST_SEPARATOR = '|'
+
+
+class FilterError(ValueError):
+    """
+    Raised for filters that are not allowed on a resource (unknown field/operator, bad value, unindexed).
+    """
+
+
+def to_bool(value: str) -> bool:
+    value = value.lower()
+    if value in ('true', '1', 'yes'):
+        return True
+    if value in ('false', '0', 'no'):
+        return False
+    raise ValueError(value)
+
+
+def to_date(value: str) -> date:
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+def to_datetime(value: str) -> datetime:
+    parsed = parse_datetime(value)
+    if parsed is None:
+        parsed = datetime.combine(to_date(value), datetime.min.time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+TYPES = {
+    str: str,
+    int: int,
+    bool: to_bool,
+    date: to_date,
+    datetime: to_datetime,
+}
+
+
+def sort_column(sorts: dict, sort_by: str) -> str:
+    """
+    Resolve a sort_by query param through a resource's whitelist of sortable columns ({name: column}).
+    Empty sort_by resolves to "". raises FilterError for anything else.
+    """
+    if not sort_by:
+        return ""
+    column = sorts.get(sort_by)
+    if column is None:
+        raise FilterError(f"Cannot sort by '{sort_by}'.")
+    return column
+
+
+class FilterField:
+    """
+    A filterable field: ORM lookup path, value type, allowed operators and those served by an index.
+    """
+    def __init__(self, lookup, type=str, operators=('eq',), indexed=()):
+        self.lookup = lookup
+        self.coerce = TYPES[type]
+        self.operators = frozenset(operators)
+        self.indexed = frozenset(indexed)
+
+
+class CompiledFilter:
+    """
+    Result of compiling a filter string: a Q object and whether it needs the slow tier (no index).
+    """
+    def __init__(self, q, slow=False):
+        self.q = q
+        self.slow = slow
+
+    def __bool__(self):
+        return bool(self.q)
+
+    def apply(self, queryset):
+        return queryset.filter(self.q) if self.q else queryset
+
+
+class FilterSpec:
+    """
+    Whitelist of filterable fields for a resource.
+    Filters that cannot use an index are rejected, unless `allow_slow` routes them to the slow tier.
+    Compiled filters are cached by their canonical filter string.
+    """
+    def __init__(self, fields: dict, allow_slow=False, cache_size=1024):
+        self.fields = fields
+        self.allow_slow = allow_slow
+        self.compile_string = lru_cache(maxsize=cache_size)(self._compile_string)
+
+    def compile(self, filters: dict) -> CompiledFilter:
+        """
+        Compile the {key: value} dict returned by load_table_params.
+        """
+        canonical = ",".join(f"{key}={value}" for key, value in sorted(filters.items()))
+        return self.compile_string(canonical)
+
+    def _compile_string(self, canonical: str) -> CompiledFilter:
+        q = Q()
+        slow = False
+        for item in canonical.split(",") if canonical else []:
+            key, value = item.split("=", 1)
+            name, _, operator = key.partition("__")
+            operator = operator or 'eq'
+            field = self.fields.get(name)
+            if field is None:
+                raise FilterError(f"Filtering on '{name}' is not allowed.")
+            if operator not in field.operators or operator not in OPERATORS:
+                raise FilterError(f"Operator '{operator}' is not allowed on '{name}'.")
+            if operator not in field.indexed:
+                if not self.allow_slow:
+                    raise FilterError(f"Filter '{key}' cannot use an index.")
+                slow = True
+            q &= Q(**{f"{field.lookup}__{OPERATORS[operator]}": self.coerce(field, operator, value)})
+        return CompiledFilter(q, slow)
+
+    @staticmethod
+    def coerce(field, operator, value):
+        try:
+            if operator in ('in', 'range'):
+                values = [field.coerce(item) for item in value.split(LIST_SEPARATOR) if item != ""]
+                if operator == 'range' and len(values) != 2:
+                    raise ValueError(value)
+                return values
+            return field.coerce(value)
+        except ValueError:
+            raise FilterError(f"Invalid value '{value}' for '{field.lookup}'.")
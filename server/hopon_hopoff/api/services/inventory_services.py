@@ -0,0 +1,219 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from database.models import Tour, TourDeparture, Booking, BookingItem, Discount, SeatHold
+from api.contants import SEAT_HOLD_TTL
+from api.services.availability_services import adjust_departure, adjust_departures, departure_day, ensure_departure
+from api.services import discount_services
+
+# Booking statuses that occupy seats
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+
+class SoldOut(Exception):
+    """
+    Raised when a departure date does not have enough seats left.
+    """
+
+
+def reserve_seats(tour_id, day, sold=0, held=0) -> bool:
+    """
+    Atomically take `sold` + `held` seats on one departure date if it stays within the day's capacity.
+    Single conditional UPDATE on tour_departure: SET sold = sold + s, held = held + h
+    WHERE sold + held + s + h <= capacity. No read-modify-write, no oversell, and a full date
+    does not block the other dates. Tour.current_participants is kept as the running total.
+    """
+    quantity = sold + held
+    day = departure_day(day)
+    if day is None:
+        raise ValueError("Seats are reserved on a departure date.")
+    departure = TourDeparture.objects.filter(tour_id=tour_id, date=day, capacity__gte=F('sold') + F('held') + quantity)
+    updated = departure.update(sold=F('sold') + sold, held=F('held') + held)
+    if not updated:
+        # First booking of the date: create its row, then try again
+        ensure_departure(tour_id, day)
+        updated = departure.update(sold=F('sold') + sold, held=F('held') + held)
+    if updated:
+        count_participants(tour_id, quantity)
+    return updated == 1
+
+
+def release_seats(tour_id, day, sold=0, held=0):
+    """
+    Atomically give `sold` + `held` seats back to a departure date.
+    """
+    adjust_departure(tour_id, day, sold=-sold, held=-held)
+    count_participants(tour_id, -(sold + held))
+
+
+def count_participants(tour_id, delta):
+    """
+    Keep Tour.current_participants, the number of seats taken over all dates, in step.
+    """
+    tours = Tour.objects.filter(pk=tour_id)
+    if delta < 0:
+        tours = tours.filter(current_participants__gte=-delta)
+    tours.update(current_participants=F('current_participants') + delta)
+
+
+def hold_seats(tour_id, quantity, booking=None, ttl=SEAT_HOLD_TTL, departure_date=None) -> SeatHold:
+    """
+    Reserve seats on a departure date for a pending booking until the hold expires.
+    The date defaults to the booking's.
+    Raises SoldOut if the date does not have enough seats left.
+    """
+    if departure_date is None and booking is not None:
+        departure_date = booking.departure_date
+    departure_date = departure_day(departure_date)
+    with transaction.atomic():
+        if not reserve_seats(tour_id, departure_date, held=quantity):
+            raise SoldOut(f"Not enough seats left on tour {tour_id} on {departure_date}.")
+        if booking is not None:
+            Booking.objects.filter(pk=booking.pk).update(seat_status='held')
+            booking.seat_status = 'held'
+        return SeatHold.objects.create(
+            tour_id=tour_id, booking=booking, quantity=quantity, departure_date=departure_date,
+            expires_at=timezone.now() + timedelta(seconds=ttl),
+        )
+
+
+def claim_hold(hold) -> bool:
+    """
+    Remove a hold row. Whoever deletes it (confirm, cancel or the expiry sweep) owns its seats.
+    """
+    deleted, _ = SeatHold.objects.filter(pk=hold.pk).delete()
+    return deleted > 0
+
+
+def confirm_hold(hold):
+    """
+    Turn a hold into sold seats. If the hold already expired and was released, try to reserve again.
+    Raises SoldOut if the seats are gone. Holds of a booking are confirmed with confirm_booking().
+    """
+    with transaction.atomic():
+        if claim_hold(hold):
+            adjust_departure(hold.tour_id, hold.departure_date, sold=hold.quantity, held=-hold.quantity)
+        elif not reserve_seats(hold.tour_id, hold.departure_date, sold=hold.quantity):
+            raise SoldOut(f"Not enough seats left on tour {hold.tour_id} on {hold.departure_date}.")
+
+
+def set_status(booking, status, seat_status):
+    """
+    The status was written with a queryset UPDATE (no signals): keep the instance, and the state
+    the booking signals compare against on its next save(), in step.
+    """
+    booking.status = status
+    booking.seat_status = seat_status
+    booking._loaded_state = (booking.tour_id, booking.departure_date, status)
+
+
+def flip_status(booking, statuses, status, seat_status, **fields):
+    """
+    Move a booking from one of `statuses` to `status` / `seat_status` (and `fields`) with a guarded UPDATE.
+    Only one concurrent caller wins: it owns what the booking held before.
+    returns the previous (status, seat_status, discount_uses), None if the booking is not in one of `statuses`.
+    """
+    while True:
+        previous = Booking.objects.filter(pk=booking.pk, status__in=statuses).values_list(
+            'status', 'seat_status', 'discount_uses',
+        ).first()
+        if previous is None:
+            return None
+        # Queryset update: the seats are counted by the caller, the booking signals must not count them again
+        if Booking.objects.filter(pk=booking.pk, status=previous[0], seat_status=previous[1]).update(
+            status=status, seat_status=seat_status, **fields,
+        ):
+            set_status(booking, status, seat_status)
+            for field, value in fields.items():
+                setattr(booking, field, value)
+            return previous
+        # Changed in between (the expiry sweep released the hold): read again
+
+
+def booking_quantity(booking) -> int:
+    return BookingItem.objects.filter(booking=booking).aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def confirm_booking(booking) -> bool:
+    """
+    Confirm a pending booking. Its hold becomes sold seats. When the booking owns no seats any more
+    (hold expired and swept) or never did, they are reserved again, as in confirm_hold().
+    Raises SoldOut if the date is full, nothing is changed then. returns False if the booking was not pending.
+    """
+    with transaction.atomic():
+        previous = flip_status(booking, ('pending',), 'confirmed', 'sold')
+        if previous is None:
+            return False
+        try:
+            hold = SeatHold.objects.filter(booking=booking).first() if previous[1] == 'held' else None
+            if hold is not None:
+                confirm_hold(hold)
+            elif not reserve_seats(booking.tour_id, booking.departure_date, sold=booking_quantity(booking)):
+                raise SoldOut(f"Not enough seats left on tour {booking.tour_id} on {departure_day(booking.departure_date)}.")
+        except SoldOut:
+            # Rolled back
+            set_status(booking, *previous[:2])
+            raise
+    return True
+
+
+def cancel_booking(booking) -> bool:
+    """
+    Cancel a booking and give back exactly what it owns, once: its held or sold seats
+    (Booking.seat_status) and its redeemed discount uses (Booking.discount_uses).
+    returns False if the booking was not active.
+    """
+    with transaction.atomic():
+        previous = flip_status(booking, ACTIVE_STATUSES, 'cancelled', 'released', discount_uses=0)
+        if previous is None:
+            return False
+        status, seat_status, discount_uses = previous
+        # Only uses this booking redeemed (Booking.discount_uses), not every booking carrying a code
+        if discount_uses and booking.discount_code:
+            discount = Discount.objects.filter(code=booking.discount_code).first()
+            if discount is not None:
+                discount_services.release(discount, discount_uses)
+        if seat_status == 'held':
+            hold = SeatHold.objects.filter(booking=booking).first()
+            # Gone when the expiry sweep already released it
+            if hold is not None and claim_hold(hold):
+                release_seats(hold.tour_id, hold.departure_date, held=hold.quantity)
+        elif seat_status == 'sold':
+            release_seats(booking.tour_id, booking.departure_date, sold=booking_quantity(booking))
+        elif status == 'confirmed':
+            # Confirmed with save(): nothing was reserved, the booking signals counted its seats as sold
+            adjust_departure(booking.tour_id, booking.departure_date, sold=-booking_quantity(booking))
+        return True
+
+
+def release_expired_holds(batch_size=500) -> int:
+    """
+    Release seats of expired holds in one batch: one DELETE, one UPDATE of their bookings
+    plus one UPDATE per departure and per tour.
+    Rows locked by a concurrent confirm/cancel are skipped (Postgres) and picked up next time.
+    returns the number of released holds.
+    """
+    with transaction.atomic():
+        holds = list(
+            SeatHold.objects.select_for_update(skip_locked=True)
+            .filter(expires_at__lte=timezone.now())
+            .values_list('id', 'tour_id', 'departure_date', 'quantity', 'booking_id')[:batch_size]
+        )
+        if not holds:
+            return 0
+        SeatHold.objects.filter(pk__in=[hold[0] for hold in holds]).delete()
+        # Their bookings no longer own seats: cancelling them gives nothing back, confirming reserves again
+        Booking.objects.filter(pk__in=[hold[4] for hold in holds if hold[4]], seat_status='held').update(
+            seat_status='released',
+        )
+        per_tour = defaultdict(int)
+        per_departure = defaultdict(lambda: (0, 0))
+        for _, tour_id, day, quantity, _ in holds:
+            per_tour[tour_id] += quantity
+            per_departure[tour_id, day] = (0, per_departure[tour_id, day][1] - quantity)
+        adjust_departures(per_departure)
+        for tour_id, quantity in per_tour.items():
+            count_participants(tour_id, -quantity)
+    return len(holds)
@@ -0,0 +1,158 @@
+import binascii
+import os
+from datetime import timedelta, timezone as dt_timezone
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.authtoken.models import Token
+from database.models import Profile, RefreshToken, UserRole
+from api.contants import TOKEN_EXPIRE_TIME, REFRESH_TOKEN_EXPIRE_TIME
+from api.services.permission_services import get_permission_codes
+from api.services.token_services import token_cache
+from api.services.signed_token_services import signed_tokens
+
+# The existing key is kept while it is valid, an expired one is replaced in place
+ACCESS_UPSERT = """
+    INSERT INTO authtoken_token ("key", user_id, created) VALUES (%s, %s, %s)
+    ON CONFLICT (user_id) DO UPDATE SET
+        "key" = CASE WHEN authtoken_token.created < %s THEN excluded."key" ELSE authtoken_token."key" END,
+        created = CASE WHEN authtoken_token.created < %s THEN excluded.created ELSE authtoken_token.created END
+    RETURNING "key", created
+"""
+REFRESH_UPSERT = """
+    INSERT INTO auth_refresh_token ("key", user_id, created_at, expires_at) VALUES (%s, %s, %s, %s)
+    ON CONFLICT (user_id) DO UPDATE SET
+        "key" = CASE WHEN auth_refresh_token.expires_at < %s THEN excluded."key" ELSE auth_refresh_token."key" END,
+        created_at = CASE WHEN auth_refresh_token.expires_at < %s
+            THEN excluded.created_at ELSE auth_refresh_token.created_at END,
+        expires_at = CASE WHEN auth_refresh_token.expires_at < %s
+            THEN excluded.expires_at ELSE auth_refresh_token.expires_at END
+    RETURNING "key"
+"""
+
+
+class RefreshError(ValueError):
+    pass
+
+
+def generate_key() -> str:
+    return binascii.hexlify(os.urandom(20)).decode()
+
+
+def load_user(email):
+    """
+    User with its profile and role, one joined query.
+    """
+    return User.objects.select_related('profile', 'userrole__role').filter(email=email).order_by('pk').first()
+
+
+def issue_tokens(user):
+    """
+    Get or create the access and refresh tokens of a user with INSERT ... ON CONFLICT:
+    one statement on Postgres (both upserts in a CTE), one per table elsewhere.
+    returns (access token, refresh token key).
+    """
+    now = timezone.now()
+    access = [generate_key(), user.pk, now, now - timedelta(seconds=TOKEN_EXPIRE_TIME)]
+    access.append(access[-1])
+    refresh = [generate_key(), user.pk, now, now + timedelta(seconds=REFRESH_TOKEN_EXPIRE_TIME), now, now, now]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"WITH access AS ({ACCESS_UPSERT}), refresh AS ({REFRESH_UPSERT}) "
+                f"SELECT access.\"key\", access.created, refresh.\"key\" FROM access, refresh",
+                access + refresh,
+            )
+            access_key, created, refresh_key = cursor.fetchone()
+        else:
+            cursor.execute(ACCESS_UPSERT, access)
+            access_key, created = cursor.fetchone()
+            cursor.execute(REFRESH_UPSERT, refresh)
+            refresh_key, = cursor.fetchone()
+    if isinstance(created, str):
+        # Backends without a datetime type (SQLite) return the stored UTC text
+        created = timezone.make_aware(parse_datetime(created), dt_timezone.utc)
+    token = Token(key=access_key, user=user, created=created)
+    token._state.adding = False
+    return token, refresh_key
+
+
+def issue_refresh_token(user_id) -> str:
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(REFRESH_UPSERT, [
+            generate_key(), user_id, now, now + timedelta(seconds=REFRESH_TOKEN_EXPIRE_TIME), now, now, now,
+        ])
+        return cursor.fetchone()[0]
+
+
+def issue_access_token(user_id) -> str:
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=TOKEN_EXPIRE_TIME)
+    with connection.cursor() as cursor:
+        cursor.execute(ACCESS_UPSERT, [generate_key(), user_id, now, cutoff, cutoff])
+        return cursor.fetchone()[0]
+
+
+def login(email, password):
+    """
+    Check the credentials and issue the tokens.
+    Costs 2 queries on Postgres (3 on other backends: one upsert per token table), one more on a
+    permission cache miss and one UPDATE when the password hash is upgraded to the configured work factor.
+    In signed token mode the access token is a SignedToken string and only the refresh token is stored.
+    returns (user, profile or None, access token key, refresh token key), None for invalid credentials.
+    """
+    user = load_user(email)
+    if user is None:
+        # Hash anyway so unknown emails take as long as wrong passwords
+        User().set_password(password)
+        return None
+    # Rehashes and saves the password when its hasher or iteration count is outdated
+    if not user.check_password(password):
+        return None
+
+    try:
+        role = user.userrole.role
+    except UserRole.DoesNotExist:
+        role = None
+    # Memoised on the user, read by ProfileSerializer.get_permissions()
+    get_permission_codes(user, role.pk if role else None)
+
+    if signed_tokens.enabled:
+        access_key = signed_tokens.issue(user.pk, role.pk if role else None)
+        refresh_key = issue_refresh_token(user.pk)
+    else:
+        token, refresh_key = issue_tokens(user)
+        # The first authenticated request does not need to load the token
+        token_cache.set(token)
+        access_key = token.key
+    try:
+        profile = user.profile
+    except Profile.DoesNotExist:
+        profile = None
+    return user, profile, access_key, refresh_key
+
+
+def refresh(refresh_key):
+    """
+    Rotate a refresh token: the presented key is replaced by a new one (a key works once)
+    and a new access token is issued. Concurrent uses of the same key: only one wins.
+    returns (access token key, new refresh token key), raises RefreshError.
+    """
+    row = RefreshToken.objects.filter(key=refresh_key).values('expires_at', 'user_id', 'user__userrole__role_id').first()
+    if row is None:
+        raise RefreshError("Invalid refresh token")
+    now = timezone.now()
+    if row['expires_at'] < now:
+        RefreshToken.objects.filter(key=refresh_key).delete()
+        raise RefreshError("Refresh token has expired")
+    new_key = generate_key()
+    rotated = RefreshToken.objects.filter(key=refresh_key, expires_at__gte=now).update(
+        key=new_key, created_at=now, expires_at=now + timedelta(seconds=REFRESH_TOKEN_EXPIRE_TIME),
+    )
+    if not rotated:
+        raise RefreshError("Invalid refresh token")
+    if signed_tokens.enabled:
+        return signed_tokens.issue(row['user_id'], row['user__userrole__role_id']), new_key
+    return issue_access_token(row['user_id']), new_key
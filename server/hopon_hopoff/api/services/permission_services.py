@@ -0,0 +1,152 @@
+import time
+from django.db.models import Q
+from database.models import Permission, RolePermission, UserPermission, UserRole
+from api.contants import PERMISSION_CACHE_ALIAS, PERMISSION_CACHE_TTL
+from api.ultils import get_shared_cache
+
+USER_KEY = "perm:user:{}"
+ROLE_VERSION_KEY = "perm:role_version:{}"
+GLOBAL_VERSION_KEY = "perm:global_version"
+EMPTY = frozenset()
+# role_id argument of get_permission_codes() when the caller does not know it
+UNKNOWN = object()
+
+
+def get_cache():
+    """
+    The permission cache, None unless PERMISSION_CACHE_ALIAS is shared by every process: an invalidation
+    made in one worker must reach the others, permission sets are then loaded on every request.
+    """
+    return get_shared_cache(PERMISSION_CACHE_ALIAS)
+
+
+def new_version() -> int:
+    # Never a value used before, even when a version key was evicted from the cache
+    return time.time_ns()
+
+
+def load_versions(cache, role_id) -> dict:
+    """
+    Current role and global versions, created when missing (first use or evicted).
+    """
+    keys = [ROLE_VERSION_KEY.format(role_id), GLOBAL_VERSION_KEY]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, new_version(), None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def load_permission_codes(user, role_id) -> frozenset:
+    """
+    Load the effective permission codes of a user from the database.
+    Role grants and direct user grants are merged in a single query.
+    """
+    condition = Q(userpermission__user=user)
+    if role_id is not None:
+        condition |= Q(rolepermission__role_id=role_id)
+    return frozenset(Permission.objects.filter(condition).values_list('code', flat=True).distinct())
+
+
+def load_permission_codes_bulk(user_ids) -> dict:
+    """
+    Load the effective permission codes of many users in two queries.
+    returns {user_id: sorted list of codes} with an entry for every requested user.
+    """
+    codes = {user_id: set() for user_id in user_ids}
+    direct = UserPermission.objects.filter(user_id__in=codes).values_list('user_id', 'permission__code')
+    by_role = RolePermission.objects.filter(role__userrole__user_id__in=codes).values_list(
+        'role__userrole__user_id', 'permission__code'
+    )
+    for user_id, code in list(direct) + list(by_role):
+        codes[user_id].add(code)
+    return {user_id: sorted(values) for user_id, values in codes.items()}
+
+
+def get_permission_codes(user, role_id=UNKNOWN) -> frozenset:
+    """
+    Return the frozenset of permission codes granted to the user (directly or through the role).
+    The set is memoised on the user object for the rest of the request and, with a shared
+    PERMISSION_CACHE_ALIAS, cached per user, role version and global version, so a check never hits the database.
+    Pass the role id (None for no role) when it is already loaded to save a query on a cache miss.
+    """
+    if not user or not user.is_authenticated:
+        return EMPTY
+    codes = getattr(user, '_permission_codes', None)
+    if codes is not None:
+        return codes
+
+    cache = get_cache()
+    user_key = USER_KEY.format(user.pk)
+    entry = cache.get(user_key) if cache is not None else None
+    if entry is not None:
+        versions = cache.get_many([ROLE_VERSION_KEY.format(entry['role_id']), GLOBAL_VERSION_KEY])
+        # A missing version (evicted) never matches: the entry is reloaded
+        if (entry['role_version'] != versions.get(ROLE_VERSION_KEY.format(entry['role_id']))
+                or entry['global_version'] != versions.get(GLOBAL_VERSION_KEY)):
+            entry = None
+
+    if entry is None:
+        if role_id is UNKNOWN:
+            role_id = UserRole.objects.filter(user=user).values_list('role_id', flat=True).first()
+        entry = {'role_id': role_id, 'codes': None}
+        if cache is not None:
+            # Read versions before loading, so a concurrent change invalidates what we store
+            versions = load_versions(cache, role_id)
+            entry['role_version'] = versions[ROLE_VERSION_KEY.format(role_id)]
+            entry['global_version'] = versions[GLOBAL_VERSION_KEY]
+        entry['codes'] = load_permission_codes(user, role_id)
+        if cache is not None:
+            cache.set(user_key, entry, PERMISSION_CACHE_TTL)
+
+    user._permission_codes = entry['codes']
+    return entry['codes']
+
+
+def get_versions(role_id) -> tuple:
+    """
+    Current (role version, global version): they change whenever the permission set of the role changes.
+    (0, 0) without a shared permission cache.
+    """
+    cache = get_cache()
+    if cache is None:
+        return 0, 0
+    versions = load_versions(cache, role_id)
+    return versions[ROLE_VERSION_KEY.format(role_id)], versions[GLOBAL_VERSION_KEY]
+
+
+def has_permission(user, code) -> bool:
+    """
+    Check if the user has the specified permission code.
+    """
+    return code in get_permission_codes(user)
+
+
+def bump_version(key):
+    cache = get_cache()
+    if cache is not None:
+        cache.set(key, new_version(), None)
+
+
+def invalidate_user(user_id):
+    """
+    Drop the cached permission set of a single user (UserPermission / UserRole changed).
+    """
+    cache = get_cache()
+    if cache is not None:
+        cache.delete(USER_KEY.format(user_id))
+
+
+def invalidate_role(role_id):
+    """
+    Invalidate the permission sets of every user holding the role (RolePermission changed).
+    """
+    bump_version(ROLE_VERSION_KEY.format(role_id))
+
+
+def invalidate_all():
+    """
+    Invalidate every cached permission set (a Permission itself changed).
+    """
+    bump_version(GLOBAL_VERSION_KEY)
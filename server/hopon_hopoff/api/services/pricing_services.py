@@ -0,0 +1,104 @@
+from decimal import Decimal, ROUND_HALF_UP
+from database.models import Tour, TicketType, TourPricing
+from api.services.discount_services import get_discount
+
+CENT = Decimal('0.01')
+
+
+class PricingError(ValueError):
+    """
+    Raised when a basket cannot be priced (unknown tour or ticket type, bad quantity).
+    """
+
+
+def money(value) -> Decimal:
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class PriceTable:
+    """
+    Prices of many tours loaded up front: tour base prices, TourPricing overrides and active ticket types.
+    Loading costs 3 queries (2 when Tour instances are given), every quote after that is computed in memory.
+    A ticket costs its TourPricing override for the tour, else TicketType.price_percentage of the tour price.
+    """
+    def __init__(self, tours, ticket_types=None):
+        tours = list(tours)
+        if tours and isinstance(tours[0], Tour):
+            self.base_prices = {tour.pk: tour.price for tour in tours}
+        else:
+            self.base_prices = dict(Tour.objects.filter(pk__in=tours).values_list('id', 'price'))
+        if ticket_types is None:
+            ticket_types = TicketType.objects.filter(is_active=True).order_by('id')
+        self.ticket_types = {ticket_type.pk: ticket_type for ticket_type in ticket_types}
+        self.overrides = {
+            (tour_id, ticket_type_id): price
+            for tour_id, ticket_type_id, price in TourPricing.objects.filter(
+                tour_id__in=self.base_prices, ticket_type_id__in=self.ticket_types,
+            ).values_list('tour_id', 'ticket_type_id', 'price')
+        }
+
+    def unit_price(self, tour_id, ticket_type_id) -> Decimal:
+        if tour_id not in self.base_prices:
+            raise PricingError(f"Unknown tour {tour_id}.")
+        if ticket_type_id not in self.ticket_types:
+            raise PricingError(f"Unknown or inactive ticket type {ticket_type_id}.")
+        price = self.overrides.get((tour_id, ticket_type_id))
+        if price is None:
+            price = self.ticket_types[ticket_type_id].calculate_price(self.base_prices[tour_id])
+        return money(price)
+
+    def quote(self, tour_id, basket, discount=None) -> dict:
+        """
+        Price a basket {ticket_type_id: quantity} for one tour, then apply an optional Discount.
+        """
+        items = []
+        total = Decimal('0')
+        for ticket_type_id, quantity in basket.items():
+            if quantity < 1:
+                raise PricingError(f"Invalid quantity {quantity} for ticket type {ticket_type_id}.")
+            unit_price = self.unit_price(tour_id, ticket_type_id)
+            items.append({
+                'ticket_type_id': ticket_type_id,
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'total_price': unit_price * quantity,
+            })
+            total += unit_price * quantity
+        discount_amount = min(money(discount.apply_discount(total)), total) if discount else Decimal('0')
+        return {
+            'tour_id': tour_id,
+            'items': items,
+            'discount_code': discount.code if discount else '',
+            'total_price': total,
+            'discount_amount': discount_amount,
+            'final_price': total - discount_amount,
+        }
+
+    def quote_many(self, baskets, discount=None) -> dict:
+        """
+        {tour_id: basket} -> {tour_id: quote}
+        """
+        return {tour_id: self.quote(tour_id, basket, discount) for tour_id, basket in baskets.items()}
+
+    def from_price(self, tour_id):
+        """
+        Cheapest paid ticket of a tour ("from" price in listings), None without ticket types.
+        Free tickets (infants) are ignored unless every ticket is free.
+        """
+        prices = [self.unit_price(tour_id, ticket_type_id) for ticket_type_id in self.ticket_types]
+        paid = [price for price in prices if price > 0]
+        return min(paid or prices) if prices else None
+
+    def from_prices(self) -> dict:
+        return {tour_id: self.from_price(tour_id) for tour_id in self.base_prices}
+
+
+def quote(tour, basket, discount_code=None) -> dict:
+    return PriceTable([tour]).quote(tour.pk if isinstance(tour, Tour) else tour, basket, get_discount(discount_code))
+
+
+def from_prices(tours) -> dict:
+    """
+    "From" prices of many tours in 2-3 queries: {tour_id: Decimal or None}.
+    """
+    return PriceTable(tours).from_prices()
@@ -0,0 +1,81 @@
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from database.models import Tour, TourSearch, Review
+from api.contants import RATING_PRIOR_MEAN, RATING_PRIOR_WEIGHT
+
+STARS = range(1, 6)
+# Tours updated per statement when rebuilding
+REBUILD_BATCH_SIZE = 1000
+
+
+def bayesian_average(count, total) -> float:
+    """
+    Average pulled towards RATING_PRIOR_MEAN while a tour has few reviews, 0 without reviews.
+    """
+    if not count:
+        return 0.0
+    return (RATING_PRIOR_WEIGHT * RATING_PRIOR_MEAN + total) / (RATING_PRIOR_WEIGHT + count)
+
+
+def apply_ratings(tour_id, added=(), removed=()):
+    """
+    Add and remove ratings (lists of stars) of one tour with a single UPDATE.
+    Count, sum, histogram and Bayesian average are computed by the database from the current row,
+    so concurrent reviews never overwrite each other.
+    """
+    count = len(added) - len(removed)
+    total = sum(added) - sum(removed)
+    stars = {star: list(added).count(star) - list(removed).count(star) for star in STARS}
+    updates = {f'rating_{star}': F(f'rating_{star}') + delta for star, delta in stars.items() if delta}
+    if not (count or total or updates):
+        return
+    new_count = F('rating_count') + count
+    updates.update(
+        rating_count=new_count,
+        rating_sum=F('rating_sum') + total,
+        # Right-hand sides of SET see the old row, the score is computed from the new count and sum
+        rating_score=Case(
+            When(rating_count=-count, then=Value(0.0)),
+            default=(Value(float(RATING_PRIOR_WEIGHT * RATING_PRIOR_MEAN)) + F('rating_sum') + total)
+            / (Value(float(RATING_PRIOR_WEIGHT)) + new_count),
+            output_field=FloatField(),
+        ),
+    )
+    Tour.objects.filter(pk=tour_id).update(**updates)
+    TourSearch.objects.filter(tour_id=tour_id).update(
+        rating_score=Subquery(Tour.objects.filter(pk=tour_id).values('rating_score')[:1]),
+    )
+
+
+def rebuild_ratings(batch_size=REBUILD_BATCH_SIZE) -> int:
+    """
+    Recompute the rating aggregates of every tour from Review with one grouped query.
+    returns the number of tours with reviews.
+    """
+    with transaction.atomic():
+        aggregates = {
+            row['tour_id']: row
+            for row in Review.objects.order_by().values('tour_id').annotate(
+                count=Count('id'),
+                total=Sum('rating'),
+                **{f'stars_{star}': Count('id', filter=Q(rating=star)) for star in STARS},
+            )
+        }
+        # Tours without reviews: one UPDATE, the others are written in batches
+        empty = {'rating_count': 0, 'rating_sum': 0, 'rating_score': 0, **{f'rating_{star}': 0 for star in STARS}}
+        Tour.objects.exclude(Exists(Review.objects.filter(tour=OuterRef('pk')))).exclude(**empty).update(**empty)
+        tours = []
+        for tour_id, row in aggregates.items():
+            tour = Tour(pk=tour_id, rating_count=row['count'], rating_sum=row['total'])
+            for star in STARS:
+                setattr(tour, f'rating_{star}', row[f'stars_{star}'])
+            tour.rating_score = bayesian_average(row['count'], row['total'])
+            tours.append(tour)
+        Tour.objects.bulk_update(
+            tours, ['rating_count', 'rating_sum', 'rating_score'] + [f'rating_{star}' for star in STARS],
+            batch_size=batch_size,
+        )
+        TourSearch.objects.update(
+            rating_score=Subquery(Tour.objects.filter(pk=OuterRef('tour_id')).values('rating_score')[:1]),
+        )
+    return len(tours)
@@ -0,0 +1,70 @@
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from database.models import Profile
+
+# Case-insensitive unique index on auth_user.email (migration 0020)
+EMAIL_INDEX = 'auth_user_email_ci_uniq'
+# Same messages as the former exists() checks / DRF UniqueValidator
+USERNAME_TAKEN = User._meta.get_field('username').error_messages['unique']
+EMAIL_TAKEN = "Email đã tồn tại."
+
+
+class UserExists(ValueError):
+    """
+    Username or email already taken. `errors` has the shape of serializer.errors.
+    """
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def duplicate_errors(error, username, email) -> dict:
+    """
+    Map the IntegrityError of a duplicate user to the validation messages.
+    """
+    message = str(error)
+    if EMAIL_INDEX in message:
+        return {'non_field_errors': [EMAIL_TAKEN]}
+    if 'username' in message:
+        return {'username': [USERNAME_TAKEN]}
+    # Backends that do not name the constraint: look the duplicate up, on the error path only
+    if User.objects.filter(username=username).exists():
+        return {'username': [USERNAME_TAKEN]}
+    if email and User.objects.filter(email__iexact=email).exists():
+        return {'non_field_errors': [EMAIL_TAKEN]}
+    raise error
+
+
+def save_user(user):
+    """
+    Save a user, raises UserExists when its username or email belongs to another user.
+    """
+    try:
+        with transaction.atomic():
+            user.save()
+    except IntegrityError as e:
+        raise UserExists(duplicate_errors(e, user.username, user.email))
+
+
+def register(username, email, password, first_name='', last_name='', is_staff=False, is_superuser=False) -> User:
+    """
+    Create a user and its profile in one transaction: two INSERTs.
+    Uniqueness of the username and (case-insensitive) email is left to the unique indexes, so concurrent
+    sign-ups with the same username or email cannot both succeed. raises UserExists.
+    """
+    user = User(
+        username=User.normalize_username(username),
+        email=User.objects.normalize_email(email),
+        first_name=first_name,
+        last_name=last_name,
+        is_staff=is_staff,
+        is_superuser=is_superuser,
+    )
+    user.set_password(password)
+    try:
+        with transaction.atomic():
+            user.save()
+            Profile.objects.create(user=user)
+    except IntegrityError as e:
+        raise UserExists(duplicate_errors(e, user.username, user.email))
+    return user
@@ -0,0 +1,38 @@
+from django.db import connections
+from django.db.models import Case, When, Value, IntegerField, FloatField, Q
+from django.db.models.functions import Greatest
+
+# pg_trgm needs at least 3 characters to extract a useful trigram
+TRIGRAM_MIN_LENGTH = 3
+
+
+def search_users(queryset, search):
+    """
+    Search users by username/email.
+    On Postgres the filter is served by the pg_trgm GIN indexes on UPPER(username) and UPPER(email)
+    (migration 0011) and results are ranked by prefix match then trigram similarity.
+    Other databases (SQLite in tests) fall back to icontains ranked by prefix match only.
+    Short terms only match prefixes.
+    returns the filtered queryset ordered by relevance (rank annotated as `search_rank`).
+    """
+    search = search.strip()
+    if not search:
+        return queryset
+
+    prefix = Q(username__istartswith=search) | Q(email__istartswith=search)
+    if len(search) < TRIGRAM_MIN_LENGTH:
+        queryset = queryset.filter(prefix)
+    else:
+        queryset = queryset.filter(Q(username__icontains=search) | Q(email__icontains=search))
+
+    queryset = queryset.annotate(
+        search_prefix=Case(When(prefix, then=Value(1)), default=Value(0), output_field=IntegerField()),
+    )
+    if connections[queryset.db].vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+        queryset = queryset.annotate(
+            search_rank=Greatest(TrigramSimilarity('username', search), TrigramSimilarity('email', search)),
+        )
+    else:
+        queryset = queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return queryset.order_by('-search_prefix', '-search_rank', 'id')
@@ -0,0 +1,162 @@
+import threading
+import time
+from typing import NamedTuple, Optional
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from api.contants import (
+    SIGNED_TOKENS_ENABLED, SIGNED_TOKEN_TTL, SIGNED_TOKEN_REVOCATION_ALIAS, SIGNED_TOKEN_REVOCATION_SYNC,
+)
+from api.services import permission_services
+from api.services.permission_services import get_versions
+from api.ultils import get_shared_cache
+
+SALT = 'api.access_token'
+SEQUENCE_KEY = "signed_token:revocations"
+REVOCATION_KEY = "signed_token:revocation:{}"
+# Set when the sequence starts over, so a reset is noticed even once the sequence is back above `seen`
+EPOCH_KEY = "signed_token:revocations_epoch"
+# Revocations pulled at most per sync, older ones have expired with their tokens anyway
+MAX_SYNC = 1000
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class SignedToken(NamedTuple):
+    """
+    Claims of a signed access token, set as request.auth.
+    """
+    user_id: int
+    role_id: Optional[int]
+    versions: tuple  # (role version, global version) of the permission set when issued
+    issued_at: int  # Milliseconds
+
+
+class RevocationList:
+    """
+    Users whose signed tokens issued before a given time are revoked (logout, password reset, deactivation),
+    checked in process memory. Entries are dropped once every token they cover has expired.
+    With a shared cache alias, each revocation is also stored under a sequence number and other processes
+    pull the new ones at most every `sync_interval` seconds.
+    """
+    def __init__(self, ttl=SIGNED_TOKEN_TTL, alias=SIGNED_TOKEN_REVOCATION_ALIAS,
+                 sync_interval=SIGNED_TOKEN_REVOCATION_SYNC):
+        self.ttl = ttl
+        self.alias = alias
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self.revoked = {}  # user id -> tokens issued at or before this time (ms) are revoked
+        self.seen = 0
+        self.epoch = None
+        self.synced_at = 0
+
+    @property
+    def shared(self):
+        # A process-local cache (LocMemCache) would not carry revocations to the other workers
+        return get_shared_cache(self.alias)
+
+    def revoke(self, user_id, at=None):
+        at = at or now_ms()
+        self.add(user_id, at)
+        if self.shared is not None:
+            if self.shared.add(SEQUENCE_KEY, 0, None):
+                self.shared.set(EPOCH_KEY, time.time_ns(), None)
+            sequence = self.shared.incr(SEQUENCE_KEY)
+            self.shared.set(REVOCATION_KEY.format(sequence), (user_id, at), self.ttl)
+
+    def add(self, user_id, at):
+        limit = now_ms() - self.ttl * 1000
+        with self.lock:
+            self.revoked[user_id] = max(self.revoked.get(user_id, 0), at)
+            for key in [key for key, revoked_at in self.revoked.items() if revoked_at < limit]:
+                del self.revoked[key]
+
+    def is_revoked(self, user_id, issued_at) -> bool:
+        self.sync()
+        return self.revoked.get(user_id, 0) >= issued_at
+
+    def sync(self):
+        if self.shared is None or time.monotonic() - self.synced_at < self.sync_interval:
+            return
+        self.synced_at = time.monotonic()
+        values = self.shared.get_many([SEQUENCE_KEY, EPOCH_KEY])
+        sequence = values.get(SEQUENCE_KEY) or 0
+        if sequence < self.seen or values.get(EPOCH_KEY) != self.epoch:
+            # Sequence reset (evicted, cache restarted): new revocations are numbered from 1 again.
+            # Pull them all, the revocations already applied here are kept
+            self.seen = 0
+            self.epoch = values.get(EPOCH_KEY)
+        if sequence <= self.seen:
+            return
+        first = max(self.seen + 1, sequence - MAX_SYNC + 1)
+        revocations = self.shared.get_many([REVOCATION_KEY.format(i) for i in range(first, sequence + 1)])
+        for user_id, at in revocations.values():
+            self.add(user_id, at)
+        self.seen = sequence
+
+    def clear(self):
+        with self.lock:
+            self.revoked.clear()
+            self.seen = 0
+            self.epoch = None
+            self.synced_at = 0
+
+
+class SignedTokens:
+    """
+    Compact HMAC-signed access tokens (django.core.signing, SECRET_KEY): user id, role id,
+    permission set version and issue time. Verified without any database query.
+    """
+    def __init__(self, enabled=SIGNED_TOKENS_ENABLED, ttl=SIGNED_TOKEN_TTL):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.signer = signing.Signer(salt=SALT)
+        self.revocations = RevocationList(ttl)
+
+    def check(self):
+        """
+        Signed tokens are verified without the database: a revocation or a permission change made in one
+        process must reach the others through a shared cache (Redis, Memcached), or a revoked token
+        stays valid in every other worker until it expires.
+        raises ImproperlyConfigured when enabled without a shared revocation alias and permission cache.
+        """
+        if not self.enabled:
+            return
+        if self.revocations.shared is None:
+            raise ImproperlyConfigured(
+                "SIGNED_TOKENS_ENABLED requires SIGNED_TOKEN_REVOCATION_ALIAS to name a shared cache.")
+        if permission_services.get_cache() is None:
+            raise ImproperlyConfigured(
+                "SIGNED_TOKENS_ENABLED requires PERMISSION_CACHE_ALIAS to name a shared cache.")
+
+    @staticmethod
+    def is_signed(key) -> bool:
+        # Token keys are hexadecimal, signed tokens are "payload:signature"
+        return ':' in key
+
+    def issue(self, user_id, role_id) -> str:
+        role_version, global_version = get_versions(role_id)
+        return self.signer.sign_object([user_id, role_id, role_version, global_version, now_ms()], compress=True)
+
+    def verify(self, key) -> SignedToken:
+        try:
+            user_id, role_id, role_version, global_version, issued_at = self.signer.unsign_object(key)
+        except (signing.BadSignature, ValueError, TypeError):
+            raise InvalidToken('Invalid token.')
+        token = SignedToken(user_id, role_id, (role_version, global_version), issued_at)
+        if now_ms() - issued_at > self.ttl * 1000:
+            raise InvalidToken('Token has expired')
+        if self.revocations.is_revoked(user_id, issued_at):
+            raise InvalidToken('Token has been revoked')
+        if get_versions(role_id) != token.versions:
+            # Permissions of the role changed since the token was issued: the client refreshes it
+            raise InvalidToken('Token has expired')
+        return token
+
+
+signed_tokens = SignedTokens()
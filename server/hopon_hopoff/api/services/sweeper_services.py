@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+from django.db import close_old_connections
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from database.models import RefreshToken, PasswordResetToken
+from api.contants import TOKEN_EXPIRE_TIME, TOKEN_SWEEP_BATCH_SIZE, TOKEN_SWEEP_PAUSE, TOKEN_SWEEP_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+def expired_querysets(now) -> dict:
+    """
+    Expired rows of each token table, each filter is served by an index (migration 0019).
+    """
+    return {
+        'auth_token': Token.objects.filter(created__lt=now - timedelta(seconds=TOKEN_EXPIRE_TIME)),
+        'refresh_token': RefreshToken.objects.filter(expires_at__lt=now),
+        'password_reset_token': PasswordResetToken.objects.filter(expires_at__lt=now),
+    }
+
+
+def sweep(queryset, batch_size=TOKEN_SWEEP_BATCH_SIZE, pause=TOKEN_SWEEP_PAUSE) -> dict:
+    """
+    Delete the rows of a queryset in batches of primary keys, each DELETE in its own short transaction.
+    returns the metrics: deleted rows, batches, seconds and rows per second.
+    """
+    start = time.perf_counter()
+    deleted = batches = 0
+    while True:
+        pks = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        # Still filtered by expiry: a row renewed since the SELECT (login upsert) is kept
+        count, _ = queryset.filter(pk__in=pks).delete()
+        deleted += count
+        batches += 1
+        if len(pks) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    seconds = time.perf_counter() - start
+    return {
+        'deleted': deleted,
+        'batches': batches,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(deleted / seconds) if seconds else 0,
+    }
+
+
+def sweep_expired(batch_size=TOKEN_SWEEP_BATCH_SIZE, pause=TOKEN_SWEEP_PAUSE) -> dict:
+    """
+    Delete every expired access, refresh and password reset token. returns table -> metrics.
+    Expired tokens are already rejected when presented: this only keeps the tables and their key indexes small.
+    """
+    return {
+        name: sweep(queryset, batch_size, pause)
+        for name, queryset in expired_querysets(timezone.now()).items()
+    }
+
+
+class TokenSweeper:
+    """
+    Optional in-process sweep every `interval` seconds (TOKEN_SWEEP_INTERVAL), started by ApiConfig.ready().
+    `last_metrics` holds the result of the latest sweep.
+    """
+    def __init__(self, interval=TOKEN_SWEEP_INTERVAL):
+        self.interval = interval
+        self.thread = None
+        self.last_metrics = None
+
+    def start(self):
+        if not self.interval or self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run, name="token-sweeper", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.last_metrics = sweep_expired()
+            except Exception:
+                logger.exception("Token sweep failed")
+            finally:
+                close_old_connections()
+
+
+token_sweeper = TokenSweeper()
@@ -0,0 +1,235 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from api.contants import (
+    TOKEN_EXPIRE_TIME, TOKEN_CACHE_ENABLED, TOKEN_CACHE_MAX_SIZE, TOKEN_CACHE_LOCAL_TTL, TOKEN_CACHE_UNSHARED_LOCAL_TTL,
+    TOKEN_CACHE_NEGATIVE_TTL, TOKEN_CACHE_ALIAS, TOKEN_CACHE_SHARED_TTL, TOKEN_CACHE_INVALIDATION_SYNC,
+)
+from api.ultils import get_shared_cache
+
+# Marker stored for keys that do not exist in the database (negative cache)
+MISSING = "__missing__"
+SHARED_KEY_PREFIX = "auth_token:"
+INVALIDATION_SEQUENCE_KEY = "auth_token:invalidations"
+INVALIDATION_KEY = "auth_token:invalidation:{}"
+# Invalidations pulled at most per sync, the whole in-process tier is dropped when more were missed
+MAX_SYNC = 1000
+
+
+class LRUCache:
+    """
+    Small thread-safe LRU cache with a per-entry expiry.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def snapshot_token(token):
+    """
+    Convert a token (with its user) into plain data that can be cached and pickled.
+    """
+    user = token.user
+    fields = [field.attname for field in User._meta.concrete_fields]
+    return {
+        'created': token.created,
+        'db': token._state.db or DEFAULT_DB_ALIAS,
+        'user_fields': fields,
+        'user_values': [getattr(user, field) for field in fields],
+    }
+
+
+def restore_token(key, snapshot):
+    """
+    Rebuild a fresh Token/User pair from a snapshot, so cached objects are never shared between requests.
+    """
+    db = snapshot.get('db', DEFAULT_DB_ALIAS)
+    user = User.from_db(db, snapshot['user_fields'], snapshot['user_values'])
+    token = Token(key=key, user=user, created=snapshot['created'])
+    token._state.adding = False
+    token._state.db = db
+    return token
+
+
+def remaining_lifetime(created) -> int:
+    """
+    Seconds left before a token created at `created` expires.
+    """
+    expires_at = created + timedelta(seconds=TOKEN_EXPIRE_TIME)
+    return int((expires_at - timezone.now()).total_seconds())
+
+
+class TokenCache:
+    """
+    Two tier cache for token key -> (user, token) resolution.
+    Tier 1 is a bounded in-process LRU, tier 2 is an optional shared Django cache (entries live at most `shared_ttl`).
+    Unknown keys are cached too (negative caching) to protect the database from bad tokens.
+    With the shared tier, each invalidation is also published under a sequence number: other processes
+    drop the key from their LRU at most `sync_interval` seconds later instead of when the entry expires.
+    Without it, LRU entries live at most `unshared_local_ttl` seconds.
+    """
+    def __init__(self, enabled=TOKEN_CACHE_ENABLED, max_size=TOKEN_CACHE_MAX_SIZE,
+                 local_ttl=TOKEN_CACHE_LOCAL_TTL, negative_ttl=TOKEN_CACHE_NEGATIVE_TTL, alias=TOKEN_CACHE_ALIAS,
+                 shared_ttl=TOKEN_CACHE_SHARED_TTL, sync_interval=TOKEN_CACHE_INVALIDATION_SYNC,
+                 unshared_local_ttl=TOKEN_CACHE_UNSHARED_LOCAL_TTL):
+        self.enabled = enabled
+        self.local_ttl = local_ttl
+        self.negative_ttl = negative_ttl
+        self.alias = alias
+        self.shared_ttl = shared_ttl
+        self.sync_interval = sync_interval
+        self.unshared_local_ttl = unshared_local_ttl
+        self.local = LRUCache(max_size)
+        self.seen = None
+        self.synced_at = 0
+
+    @property
+    def shared(self):
+        # A process-local cache (LocMemCache) would only duplicate the LRU
+        return get_shared_cache(self.alias)
+
+    @property
+    def lru_ttl(self):
+        """
+        Lifetime of in-process entries. Without the shared tier invalidations stay in the process that made them,
+        entries are then kept only briefly so a logout is seen by every process within a few seconds.
+        """
+        if self.shared is None:
+            return min(self.local_ttl, self.unshared_local_ttl)
+        return self.local_ttl
+
+    def get_or_load(self, key, loader):
+        """
+        Return the token for `key`, calling `loader(key)` on a cache miss.
+        The loader returns a Token with its user selected, or None if the key does not exist.
+        Returns None for unknown keys.
+        """
+        if not self.enabled:
+            return loader(key)
+
+        self.sync()
+        snapshot = self.local.get(key)
+        if snapshot is None and self.shared is not None:
+            snapshot = self.shared.get(SHARED_KEY_PREFIX + key)
+            if snapshot is not None:
+                self._set_local(key, snapshot)
+
+        if snapshot == MISSING:
+            return None
+        if snapshot is not None:
+            return restore_token(key, snapshot)
+
+        token = loader(key)
+        if token is None:
+            self.set_missing(key)
+        else:
+            self.set(token)
+        return token
+
+    def set(self, token):
+        """
+        Cache a token. Entries never outlive the token itself (TOKEN_EXPIRE_TIME).
+        """
+        snapshot = snapshot_token(token)
+        ttl = remaining_lifetime(token.created)
+        if ttl <= 0:
+            return
+        self.local.set(token.key, snapshot, min(ttl, self.lru_ttl))
+        if self.shared is not None:
+            self.shared.set(SHARED_KEY_PREFIX + token.key, snapshot, min(ttl, self.shared_ttl))
+
+    def set_missing(self, key):
+        self.local.set(key, MISSING, self.negative_ttl)
+        if self.shared is not None:
+            self.shared.set(SHARED_KEY_PREFIX + key, MISSING, self.negative_ttl)
+
+    def invalidate(self, key):
+        """
+        Drop a token key from every tier, and from the in-process tier of the other processes.
+        Called whenever a token is deleted (post_delete signal) or its user changes.
+        """
+        self.local.delete(key)
+        shared = self.shared
+        if shared is not None:
+            shared.delete(SHARED_KEY_PREFIX + key)
+            shared.add(INVALIDATION_SEQUENCE_KEY, 0, None)
+            sequence = shared.incr(INVALIDATION_SEQUENCE_KEY)
+            # Only needed while an LRU entry of the key may still be alive
+            shared.set(INVALIDATION_KEY.format(sequence), key, self.local_ttl)
+
+    def sync(self):
+        """
+        Drop the keys invalidated by other processes since the last sync from the in-process tier.
+        """
+        shared = self.shared
+        if shared is None or time.monotonic() - self.synced_at < self.sync_interval:
+            return
+        self.synced_at = time.monotonic()
+        sequence = shared.get(INVALIDATION_SEQUENCE_KEY) or 0
+        if self.seen is None or sequence < self.seen or sequence - self.seen > MAX_SYNC:
+            # First sync, sequence lost (evicted) or too many missed: nothing in the LRU can be trusted
+            self.local.clear()
+        elif sequence > self.seen:
+            keys = shared.get_many([INVALIDATION_KEY.format(i) for i in range(self.seen + 1, sequence + 1)])
+            for key in keys.values():
+                self.local.delete(key)
+        self.seen = sequence
+
+    def invalidate_user(self, user):
+        """
+        Drop every token belonging to `user`.
+        """
+        for key in Token.objects.filter(user=user).values_list('key', flat=True):
+            self.invalidate(key)
+
+    def _set_local(self, key, snapshot):
+        if snapshot == MISSING:
+            self.local.set(key, MISSING, self.negative_ttl)
+        else:
+            self.local.set(key, snapshot, min(remaining_lifetime(snapshot['created']), self.lru_ttl))
+
+    def clear(self):
+        self.local.clear()
+        self.seen = None
+        self.synced_at = 0
+
+
+token_cache = TokenCache()
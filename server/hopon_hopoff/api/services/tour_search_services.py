@@ -0,0 +1,216 @@
+from bisect import bisect_right
+from collections import defaultdict
+from itertools import islice
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from database.models import Tour, TourSearch, TicketType
+from api.contants import PAGE_SIZE, TOUR_PRICE_BUCKETS
+from api.services.filter_services import FilterError, LIST_SEPARATOR, to_date
+from api.services.pricing_services import PriceTable
+from api.ultils import cursor_pagination
+
+# Public sort name -> indexed column of the search document
+SORTS = {
+    'price': 'from_price',
+    'rating': 'rating_score',
+    'start_date': 'start_date',
+}
+# Facet name (query string) -> column of the search document
+FACETS = {
+    'city': 'city_id',
+    'type': 'tour_type_id',
+    'price': 'price_bucket',
+    'dynamic_level': 'dynamic_level',
+}
+DOCUMENT_FIELDS = [
+    'name', 'text', 'city', 'destination', 'tour_type', 'start_date', 'end_date',
+    'from_price', 'price_bucket', 'dynamic_level', 'rating_score',
+]
+RESULT_FIELDS = [
+    'tour_id', 'name', 'from_price', 'rating_score', 'tour__rating_count', 'city_id', 'destination_id',
+    'tour_type_id', 'start_date', 'end_date', 'dynamic_level',
+]
+# Tours per refresh batch
+REFRESH_BATCH_SIZE = 1000
+
+
+def price_bucket(price) -> int:
+    return max(bisect_right(TOUR_PRICE_BUCKETS, price) - 1, 0)
+
+
+def is_postgres(queryset) -> bool:
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def build_document(tour, from_price) -> TourSearch:
+    destination = tour.destination
+    city = destination.city if destination else None
+    words = [
+        destination.name if destination else None,
+        city.name if city else None,
+        city.country if city else None,
+        tour.tour_type.name if tour.tour_type else None,
+        tour.description,
+    ]
+    return TourSearch(
+        tour=tour,
+        name=tour.name,
+        text=' '.join(word for word in words if word),
+        city=city,
+        destination=destination,
+        tour_type=tour.tour_type,
+        start_date=tour.start_date,
+        end_date=tour.end_date,
+        from_price=from_price,
+        price_bucket=price_bucket(from_price),
+        dynamic_level=tour.dynamic_level,
+        rating_score=tour.rating_score,
+    )
+
+
+def refresh_documents(tour_ids=None, batch_size=REFRESH_BATCH_SIZE) -> int:
+    """
+    (Re)build the search documents of the given tours, or of every tour, in batches:
+    one SELECT with the joined destination/city/type, one PriceTable and one upsert per batch.
+    Inactive tours lose their document. Run `rebuild_tour_search` after changing ticket types.
+    returns the number of documents written.
+    """
+    tours = Tour.objects.filter(is_active=True).select_related('destination__city', 'tour_type').order_by('pk')
+    stale = TourSearch.objects.exclude(tour__is_active=True)
+    if tour_ids is not None:
+        tours = tours.filter(pk__in=tour_ids)
+        stale = stale.filter(tour_id__in=tour_ids)
+    ticket_types = list(TicketType.objects.filter(is_active=True).order_by('id'))
+    written = 0
+    with transaction.atomic():
+        stale.delete()
+        iterator = tours.iterator(chunk_size=batch_size)
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                break
+            prices = PriceTable(batch, ticket_types)
+            documents = []
+            for tour in batch:
+                from_price = prices.from_price(tour.pk)
+                # No ticket types: the tour price. A free tour stays at 0
+                documents.append(build_document(tour, tour.price if from_price is None else from_price))
+            TourSearch.objects.bulk_create(
+                documents, update_conflicts=True, unique_fields=['tour'], update_fields=DOCUMENT_FIELDS,
+            )
+            updated = TourSearch.objects.filter(tour_id__in=[tour.pk for tour in batch])
+            if is_postgres(updated):
+                from django.contrib.postgres.search import SearchVector
+                updated.update(
+                    document=SearchVector('name', weight='A', config='simple')
+                    + SearchVector('text', weight='B', config='simple'),
+                )
+            written += len(documents)
+    return written
+
+
+def parse_ids(value) -> set:
+    try:
+        return {int(item) for item in value.split(LIST_SEPARATOR) if item}
+    except ValueError:
+        raise FilterError(f"Invalid list '{value}'.")
+
+
+def parse_search_filters(filters) -> dict:
+    """
+    Table filters (?filter=city=1|2,type=3,price=0|1,dynamic_level=2,date_from=...,date_to=...) -> search arguments.
+    """
+    unknown = set(filters) - set(FACETS) - {'date_from', 'date_to'}
+    if unknown:
+        raise FilterError(f"Unknown filter '{sorted(unknown)[0]}'.")
+    selected = {name: parse_ids(filters[name]) for name in FACETS if filters.get(name)}
+    dates = {}
+    for name in ('date_from', 'date_to'):
+        if filters.get(name):
+            try:
+                dates[name] = to_date(filters[name])
+            except ValueError:
+                raise FilterError(f"Invalid date '{filters[name]}' for '{name}'.")
+    return {'selected': selected, **dates}
+
+
+def text_filter(queryset, search):
+    if is_postgres(queryset):
+        from django.contrib.postgres.search import SearchQuery
+        # Served by the GIN index on document (migration 0016)
+        return queryset.filter(document=SearchQuery(search, config='simple', search_type='websearch'))
+    return queryset.filter(Q(name__icontains=search) | Q(text__icontains=search))
+
+
+def count_facets(queryset, selected):
+    """
+    Facet counts for city, type, price bucket and dynamic level from one GROUP BY over the four columns.
+    Each facet is counted with the selections of the other facets only, so unselected values keep
+    their counts (multi-select facets). returns (facets, total number of matching tours).
+    """
+    names = list(FACETS)
+    combinations = queryset.order_by().values_list(*FACETS.values()).annotate(count=Count('id'))
+    facets = {name: defaultdict(int) for name in names}
+    total = 0
+    for *values, count in combinations:
+        matches = [name not in selected or value in selected[name] for name, value in zip(names, values)]
+        missing = matches.count(False)
+        if not missing:
+            total += count
+        for name, value, match in zip(names, values, matches):
+            # Counted when every other facet matches
+            if missing == 0 or (missing == 1 and not match):
+                facets[name][value] += count
+    return facets, total
+
+
+def format_facets(facets, selected) -> dict:
+    result = {}
+    for name, counts in facets.items():
+        items = [
+            {'value': value, 'count': count, 'selected': value in selected.get(name, ())}
+            for value, count in counts.items() if value is not None
+        ]
+        if name == 'price':
+            for item in items:
+                bucket = item['value']
+                item['min'] = TOUR_PRICE_BUCKETS[bucket]
+                item['max'] = TOUR_PRICE_BUCKETS[bucket + 1] if bucket + 1 < len(TOUR_PRICE_BUCKETS) else None
+            items.sort(key=lambda item: item['value'])
+        else:
+            items.sort(key=lambda item: (-item['count'], item['value']))
+        result[name] = items
+    return result
+
+
+def search_tours(search='', selected=None, date_from=None, date_to=None, sort_by='rating', sort_order='desc',
+                 page_size=PAGE_SIZE, cursor=None) -> dict:
+    """
+    Search active tours: full text, multi-select facets (city, type, price bucket, dynamic level),
+    departure period overlap, sorted by price, rating or start date with keyset pagination.
+    Costs 3 queries whatever the page depth: facets (which also give the total), page keys, page rows.
+    """
+    selected = selected or {}
+    column = SORTS.get(sort_by or 'rating')
+    if column is None:
+        raise FilterError(f"Cannot sort by '{sort_by}'.")
+    sort_order = sort_order or ('asc' if column == 'from_price' else 'desc')
+
+    queryset = TourSearch.objects.all()
+    if search.strip():
+        queryset = text_filter(queryset, search.strip())
+    if date_from:
+        queryset = queryset.filter(end_date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(start_date__lte=date_to)
+
+    facets, total = count_facets(queryset, selected)
+    for name, values in selected.items():
+        queryset = queryset.filter(**{f'{FACETS[name]}__in': values})
+    rows, total, next_cursor = cursor_pagination(queryset, page_size, cursor, column, sort_order, total=total)
+    return {
+        'tours': list(rows.values(*RESULT_FIELDS)),
+        'facets': format_facets(facets, selected),
+        'total': total,
+        'next_cursor': next_cursor,
+    }
@@ -0,0 +1,213 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from database.models import (
+    Permission, RolePermission, UserPermission, UserRole, Booking, BookingItem, Discount, Review,
+    Tour, Destination, City, TourType, TourPricing,
+)
+from api.services.token_services import remaining_lifetime, token_cache
+from api.services.signed_token_services import signed_tokens
+from api.services import (
+    permission_services, discount_services, rating_services, catalogue_services, tour_search_services,
+)
+from api.services.availability_services import (
+    SOLD_STATUSES, adjust_departure, booking_state, departure_day, record_booking_transition,
+)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """
+    Cached tokens carry a snapshot of the user (is_active, password...), drop them when the user changes.
+    """
+    if not created:
+        token_cache.invalidate_user(instance)
+        if signed_tokens.enabled and not instance.is_active:
+            # Signed access tokens are never looked up: revoke them
+            signed_tokens.revocations.revoke(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    # Token rows go with the user (post_delete of Token below), signed access tokens are revoked
+    if signed_tokens.enabled:
+        signed_tokens.revocations.revoke(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    # Logout, cascade from the user, admin... Cache entries never outlive the token: nothing to drop for expired
+    # ones, which keeps the expiry sweep off the cache
+    if remaining_lifetime(instance.created) > 0:
+        token_cache.invalidate(instance.key)
+
+
+@receiver([post_save, post_delete], sender=RolePermission)
+def invalidate_role_permissions(sender, instance, **kwargs):
+    permission_services.invalidate_role(instance.role_id)
+
+
+@receiver([post_save, post_delete], sender=UserPermission)
+@receiver([post_save, post_delete], sender=UserRole)
+def invalidate_user_permissions(sender, instance, **kwargs):
+    permission_services.invalidate_user(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=UserRole)
+def revoke_signed_tokens(sender, instance, **kwargs):
+    # Signed access tokens carry the role of the user
+    if signed_tokens.enabled:
+        signed_tokens.revocations.revoke(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Permission)
+def invalidate_all_permissions(sender, instance, **kwargs):
+    permission_services.invalidate_all()
+
+
+@receiver([post_save, post_delete], sender=Discount)
+def invalidate_discount(sender, instance, **kwargs):
+    discount_services.invalidate(instance.code)
+
+
+@receiver(pre_save, sender=Booking)
+def remember_booking_state(sender, instance, raw=False, **kwargs):
+    instance._departure_state = None
+    if instance.pk and not raw:
+        # State captured when the booking was loaded, a query only for instances built by hand or deferred fields
+        old = getattr(instance, '_loaded_state', None)
+        if old is None or None in old:
+            old = Booking.objects.filter(pk=instance.pk).values_list('tour_id', 'departure_date', 'status').first()
+        if old is not None:
+            instance._departure_state = (old[0], departure_day(old[1]), old[2] in SOLD_STATUSES)
+
+
+@receiver(post_save, sender=Booking)
+def update_booking_departure(sender, instance, created, raw=False, **kwargs):
+    """
+    Keep TourDeparture.sold in step when a booking is confirmed, cancelled or moved to another date.
+    """
+    if raw:
+        return
+    old_state = getattr(instance, '_departure_state', None)
+    instance._loaded_state = (instance.tour_id, instance.departure_date, instance.status)
+    # A new booking has no items yet, they are counted as they are added
+    if not created and old_state is not None:
+        record_booking_transition(instance, old_state, booking_state(instance))
+
+
+@receiver(pre_save, sender=BookingItem)
+def remember_booking_item_quantity(sender, instance, raw=False, **kwargs):
+    instance._old_quantity = None
+    if instance.pk and not raw:
+        instance._old_quantity = getattr(instance, '_loaded_quantity', None)
+        if instance._old_quantity is None or None in instance._old_quantity:
+            instance._old_quantity = (
+                BookingItem.objects.filter(pk=instance.pk).values_list('booking_id', 'quantity').first()
+            )
+
+
+def sold_booking_departure(booking_id):
+    """
+    (tour_id, date) of a sold booking, None if its seats are not counted as sold.
+    """
+    booking = Booking.objects.filter(pk=booking_id).values_list('tour_id', 'departure_date', 'status').first()
+    if booking is None or booking[2] not in SOLD_STATUSES:
+        return None
+    return booking[0], booking[1]
+
+
+@receiver(post_save, sender=BookingItem)
+def update_booking_item_departure(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_old_quantity', None)
+    instance._loaded_quantity = (instance.booking_id, instance.quantity)
+    if old is not None and old[0] != instance.booking_id:
+        departure = sold_booking_departure(old[0])
+        if departure is not None:
+            adjust_departure(*departure, sold=-old[1])
+        old = None
+    delta = instance.quantity - (old[1] if old else 0)
+    if delta:
+        departure = sold_booking_departure(instance.booking_id)
+        if departure is not None:
+            adjust_departure(*departure, sold=delta)
+
+
+@receiver(post_delete, sender=BookingItem)
+def release_booking_item_departure(sender, instance, **kwargs):
+    departure = sold_booking_departure(instance.booking_id)
+    if departure is not None:
+        adjust_departure(*departure, sold=-instance.quantity)
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, raw=False, **kwargs):
+    instance._old_rating = None
+    if instance.pk and not raw:
+        instance._old_rating = Review.objects.filter(pk=instance.pk).values_list('tour_id', 'rating').first()
+
+
+@receiver(post_save, sender=Review)
+def update_tour_rating(sender, instance, created, raw=False, **kwargs):
+    """
+    Keep the rating aggregates of the tour in step with its reviews.
+    """
+    if raw:
+        return
+    old = None if created else getattr(instance, '_old_rating', None)
+    if old is None:
+        rating_services.apply_ratings(instance.tour_id, added=[instance.rating])
+    elif old != (instance.tour_id, instance.rating):
+        if old[0] == instance.tour_id:
+            rating_services.apply_ratings(instance.tour_id, added=[instance.rating], removed=[old[1]])
+        else:
+            rating_services.apply_ratings(old[0], removed=[old[1]])
+            rating_services.apply_ratings(instance.tour_id, added=[instance.rating])
+
+
+@receiver(post_delete, sender=Review)
+def remove_tour_rating(sender, instance, **kwargs):
+    rating_services.apply_ratings(instance.tour_id, removed=[instance.rating])
+
+
+@receiver([post_save, post_delete], sender=Tour)
+@receiver([post_save, post_delete], sender=Destination)
+@receiver([post_save, post_delete], sender=City)
+def invalidate_catalogue(sender, instance, raw=False, **kwargs):
+    if not raw:
+        catalogue_services.invalidate()
+
+
+@receiver(post_save, sender=Tour)
+def refresh_tour_search(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    # Saved without any change to the searched columns since it was loaded: the document is still right
+    if not created and getattr(instance, '_search_state', None) == instance.search_state():
+        return
+    tour_search_services.refresh_documents([instance.pk])
+    instance._search_state = instance.search_state()
+
+
+@receiver([post_save, post_delete], sender=TourPricing)
+def refresh_tour_search_prices(sender, instance, raw=False, origin=None, **kwargs):
+    # Nothing to refresh when the prices go away with their tour
+    if raw or isinstance(origin, Tour) or getattr(origin, 'model', None) is Tour:
+        return
+    tour_search_services.refresh_documents([instance.tour_id])
+
+
+@receiver(post_save, sender=Destination)
+@receiver(post_save, sender=City)
+@receiver(post_save, sender=TourType)
+def refresh_tour_search_places(sender, instance, raw=False, **kwargs):
+    """
+    Names of destinations, cities and tour types are part of the search documents of their tours.
+    """
+    if raw:
+        return
+    lookup = {Destination: 'destination', City: 'destination__city', TourType: 'tour_type'}[sender]
+    tour_search_services.refresh_documents(Tour.objects.filter(**{lookup: instance}).values_list('pk', flat=True))
@@ -1,3 +1,1244 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import time as time_module
+from unittest import mock
+from django.core import mail
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, connections
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from datetime import date, datetime, time, timedelta
+from django.utils import timezone
+from database.models import (
+    Profile, Role, Permission, RolePermission, UserRole, UserPermission, Tour, TourImage, OutboxEmail, RefreshToken,
+    TicketType, Booking, BookingItem, TourDeparture, SeatHold, Discount, DiscountShard, Post, Review, TourPricing,
+    City, Destination, TourType, TourSearch,
+)
+from api.services.email_services import EmailOutbox, outbox
+from api.services.counter_services import BufferedCounter, counters
+from api.services.sweeper_services import sweep, sweep_expired
+from api.services.token_services import TokenCache, token_cache
+from api.services.inventory_services import (
+    hold_seats, confirm_booking, cancel_booking, release_expired_holds, SoldOut,
+)
+from api.services import catalogue_services, count_services, discount_services, login_services, permission_services, rating_services
+from api.contants import CATALOGUE_CACHE_TTL, CATALOGUE_LOCAL_CACHE_TTL
+from api.services.booking_services import create_bookings
+from api.services.search_services import search_users
+from api.services.filter_services import FilterError, FilterField, FilterSpec
+from api.controllers.user_controllers import USER_FILTERS
+from api.services.pricing_services import PriceTable, PricingError
+from api.services.availability_services import adjust_departure, departure_day, rebuild_departures
+from api.services.tour_search_services import refresh_documents, search_tours
+from api.services.signed_token_services import RevocationList, SignedTokens, now_ms, signed_tokens
+from api.authentication import CustomTokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from api._serializers.user_serializers import ProfileSerializer
+from api import ultils
+from api.ultils import encode_cursor
+from api.middleware import PermissionMiddleware, PermissionRouter
+from django.core.exceptions import ImproperlyConfigured
 
-# Create your tests here.
+
+class SharedPermissionCacheMixin:
+    """
+    Stand the test process' LocMemCache in for a shared permission cache (Redis, Memcached in production).
+    """
+    def setUp(self):
+        super().setUp()
+        cache = caches['default']
+        cache.clear()
+        patcher = mock.patch.object(permission_services, 'get_cache', return_value=cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class ProfileSerializerQueryCountTest(TestCase):
+    """
+    Serialising profiles must cost the same number of queries for 1 or 500 rows.
+    """
+    # profiles + user permissions prefetch + role permissions prefetch
+    EXPECTED_QUERIES = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='Staff', code='staff')
+        view_tour = Permission.objects.create(name='View tour', code='can_read_tour', module='tour', action='read')
+        create_tour = Permission.objects.create(name='Create tour', code='can_create_tour', module='tour', action='create')
+        RolePermission.objects.create(role=role, permission=view_tour)
+
+        users = User.objects.bulk_create([User(username=f'user{i}', email=f'user{i}@example.com') for i in range(500)])
+        Profile.objects.bulk_create([Profile(user=user) for user in users])
+        UserRole.objects.bulk_create([UserRole(user=user, role=role) for user in users[::2]])
+        UserPermission.objects.bulk_create([UserPermission(user=user, permission=create_tour) for user in users[::3]])
+
+    def serialize(self, limit):
+        return ProfileSerializer(Profile.objects.for_serializer().order_by('id')[:limit], many=True).data
+
+    def test_constant_queries(self):
+        for limit in (1, 500):
+            with self.assertNumQueries(self.EXPECTED_QUERIES):
+                data = self.serialize(limit)
+            self.assertEqual(len(data), limit)
+
+    def test_role_and_permissions(self):
+        data = {item['user']['username']: item for item in self.serialize(500)}
+        self.assertEqual(data['user0']['role'], 'Staff')
+        self.assertEqual(data['user0']['permissions'], ['can_create_tour', 'can_read_tour'])
+        self.assertEqual(data['user1']['role'], None)
+        self.assertEqual(data['user1']['permissions'], [])
+        self.assertEqual(data['user3']['permissions'], ['can_create_tour'])
+
+
+class TourMainImageTest(TestCase):
+    """
+    Main images of a page of tours are loaded in one query, whatever the page size.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        tours = Tour.objects.bulk_create([
+            Tour(name=f'Tour {i}', description='', price=100, duration=1, max_participants=10,
+                 start_date=date(2026, 1, 1), end_date=date(2026, 12, 31), departure_time=time(8, 0))
+            for i in range(30)
+        ])
+        TourImage.objects.bulk_create(
+            [TourImage(tour=tour, image=f'tours/{tour.pk}-main.jpg', is_main=True) for tour in tours[1:]]
+            + [TourImage(tour=tour, image=f'tours/{tour.pk}-other.jpg') for tour in tours]
+        )
+
+    def test_constant_queries(self):
+        # tours + main images prefetch
+        with self.assertNumQueries(2):
+            images = {tour.pk: tour.get_main_image() for tour in Tour.objects.with_main_image()}
+        self.assertEqual(len(images), 30)
+        self.assertEqual(sum(image is None for image in images.values()), 1)
+        for tour_id, image in images.items():
+            if image is not None:
+                self.assertEqual(image.image.name, f'tours/{tour_id}-main.jpg')
+
+    def test_prefetch_loaded_objects(self):
+        tours = list(Tour.objects.all()[:10])
+        with self.assertNumQueries(1):
+            Tour.prefetch_main_images(tours)
+            [tour.get_main_image() for tour in tours]
+
+    def test_single_main_image(self):
+        tour = Tour.objects.filter(images__is_main=True).first()
+        image = TourImage.objects.create(tour=tour, image='tours/new-main.jpg', is_main=True)
+        self.assertEqual(list(TourImage.objects.filter(tour=tour, is_main=True)), [image])
+        self.assertEqual(Tour.objects.get(pk=tour.pk).get_main_image(), image)
+
+
+class EmailOutboxTest(TestCase):
+    """
+    Reset emails are queued by the request and sent by the outbox (locmem backend in tests).
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reset', email='reset@example.com', password='old-password')
+
+    def request_reset(self):
+        response = self.client.post('/api/reset-password', {'email': 'reset@example.com'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_reset_is_queued_and_deduplicated(self):
+        self.request_reset()
+        self.request_reset()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxEmail.objects.filter(status='pending').count(), 1)
+
+        self.assertEqual(EmailOutbox().process(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        # The latest reset link is the one sent
+        token = self.user.password_reset_tokens.latest('id').token
+        self.assertIn(token, mail.outbox[0].body)
+        self.assertEqual(mail.outbox[0].to, ['reset@example.com'])
+        self.assertEqual(OutboxEmail.objects.get().status, 'sent')
+
+    def test_retry_with_backoff(self):
+        self.request_reset()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            self.assertEqual(EmailOutbox().process(), 0)
+        message = OutboxEmail.objects.get()
+        self.assertEqual((message.status, message.attempts, message.last_error), ('pending', 1, 'down'))
+        # Not due before its backoff delay
+        self.assertEqual(EmailOutbox().process(), 0)
+        OutboxEmail.objects.update(next_attempt_at=message.created_at)
+        self.assertEqual(EmailOutbox().process(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_in_process_pool_is_opt_in(self):
+        # Web workers start no sender threads unless EMAIL_OUTBOX_WORKERS is set
+        with mock.patch.object(EmailOutbox, 'start') as start:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.request_reset()
+            start.assert_not_called()
+            with mock.patch.object(outbox, 'workers', 1), mock.patch.object(outbox, 'threads', []):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.request_reset()
+            start.assert_called_once()
+
+    def test_backlog_warning(self):
+        self.request_reset()
+        outbox = EmailOutbox(workers=0)
+        with self.assertNoLogs('api.services.email_services', 'WARNING'):
+            outbox.wake()
+        OutboxEmail.objects.update(next_attempt_at=timezone.now() - timedelta(hours=1))
+        outbox.checked_at = None
+        with self.assertLogs('api.services.email_services', 'WARNING') as logs:
+            outbox.wake()
+        self.assertIn('send_outbox', logs.output[0])
+
+
+class TokenSweeperTest(TestCase):
+    def test_deletes_expired_rows_only(self):
+        now = timezone.now()
+        users = User.objects.bulk_create([User(username=f'sweep{i}') for i in range(25)])
+        RefreshToken.objects.bulk_create([
+            RefreshToken(key=f'key{i}', user=user, expires_at=now + timedelta(days=-1 if i < 20 else 1))
+            for i, user in enumerate(users)
+        ])
+        metrics = sweep_expired(batch_size=8, pause=0)
+        self.assertEqual((metrics['refresh_token']['deleted'], metrics['refresh_token']['batches']), (20, 3))
+        self.assertEqual(RefreshToken.objects.count(), 5)
+
+    def test_row_renewed_after_select_is_kept(self):
+        users = User.objects.bulk_create([User(username=f'renew{i}') for i in range(2)])
+        tokens = RefreshToken.objects.bulk_create([
+            RefreshToken(key=f'renew{i}', user=user, expires_at=timezone.now() - timedelta(days=1))
+            for i, user in enumerate(users)
+        ])
+        expired = RefreshToken.objects.filter(expires_at__lt=timezone.now())
+        selected = list(expired.values_list('pk', flat=True))
+        # Renewed by a login between the SELECT and the DELETE
+        RefreshToken.objects.filter(pk=tokens[0].pk).update(expires_at=timezone.now() + timedelta(days=7))
+        queryset = mock.Mock(wraps=expired)
+        queryset.order_by.return_value.values_list.return_value = selected
+        self.assertEqual(sweep(queryset, batch_size=10, pause=0)['deleted'], 1)
+        self.assertEqual(list(RefreshToken.objects.values_list('key', flat=True)), ['renew0'])
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class LoginTest(SharedPermissionCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='Customer', code='customer')
+        permission = Permission.objects.create(name='View tour', code='can_read_tour', module='tour', action='read')
+        RolePermission.objects.create(role=role, permission=permission)
+        cls.user = User.objects.create_user('login', email='login@example.com', password='secret-password')
+        Profile.objects.create(user=cls.user)
+        UserRole.objects.create(user=cls.user, role=role)
+
+    def login(self):
+        response = self.client.post('/api/login', {'email': 'login@example.com', 'password': 'secret-password'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']
+
+    def test_query_budget(self):
+        self.login()
+        # user + profile + role, access token upsert, refresh token upsert (one statement on Postgres)
+        with self.assertNumQueries(3):
+            data = self.login()
+        self.assertEqual(data['profile']['role'], 'Customer')
+        self.assertEqual(data['profile']['permissions'], ['can_read_tour'])
+
+    def test_tokens_reused_until_expired(self):
+        first = self.login()
+        self.assertEqual(self.login()['access_token'], first['access_token'])
+        Token.objects.filter(user=self.user).update(created=timezone.now() - timedelta(days=2))
+        RefreshToken.objects.filter(user=self.user).update(expires_at=timezone.now() - timedelta(days=1))
+        second = self.login()
+        self.assertNotEqual(second['access_token'], first['access_token'])
+        self.assertNotEqual(second['refresh_token'], first['refresh_token'])
+        self.assertEqual(Token.objects.get(user=self.user).key, second['access_token'])
+        self.assertEqual(RefreshToken.objects.get(user=self.user).key, second['refresh_token'])
+
+    def test_rehash_on_login(self):
+        with self.settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertIsNotNone(login_services.login('login@example.com', 'secret-password'))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+    def test_refresh_rotates_refresh_token(self):
+        data = self.login()
+        access_key, refresh_key = login_services.refresh(data['refresh_token'])
+        self.assertEqual(access_key, data['access_token'])
+        self.assertNotEqual(refresh_key, data['refresh_token'])
+        with self.assertRaises(login_services.RefreshError):
+            login_services.refresh(data['refresh_token'])
+
+    def test_invalid_credentials(self):
+        self.assertIsNone(login_services.login('login@example.com', 'wrong'))
+        self.assertIsNone(login_services.login('nobody@example.com', 'secret-password'))
+
+
+class TokenCacheTest(TestCase):
+    """
+    Deleted tokens leave the cache of every process.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cached', password='password')
+
+    def setUp(self):
+        caches['default'].clear()
+        token_cache.clear()
+        self.token = Token.objects.create(user=self.user)
+        self.loader = mock.Mock(side_effect=lambda key: Token.objects.select_related('user').filter(key=key).first())
+
+    def test_delete_invalidates(self):
+        token_cache.get_or_load(self.token.key, self.loader)
+        self.user.delete()
+        self.assertIsNone(token_cache.get_or_load(self.token.key, self.loader))
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_invalidation_reaches_other_processes(self):
+        with mock.patch.object(TokenCache, 'shared', caches['default']):
+            first, second = TokenCache(sync_interval=0), TokenCache(sync_interval=0)
+            for cache in (first, second):
+                token = cache.get_or_load(self.token.key, self.loader)
+            self.assertEqual(self.loader.call_count, 1)
+            self.assertEqual((token._state.db, token.user._state.db), ('default', 'default'))
+            # Logout in the first process
+            Token.objects.filter(pk=self.token.pk).delete()
+            first.invalidate(self.token.key)
+            self.assertIsNone(second.get_or_load(self.token.key, self.loader))
+
+    def test_short_lived_without_shared_tier(self):
+        cache = TokenCache(local_ttl=60, unshared_local_ttl=2)
+        cache.set(self.token)
+        expires_at, _ = cache.local._data[self.token.key]
+        self.assertLessEqual(expires_at - time_module.monotonic(), 2)
+        with mock.patch.object(TokenCache, 'shared', caches['default']):
+            self.assertEqual(cache.lru_ttl, 60)
+
+    def test_shared_entries_are_bounded(self):
+        shared = mock.Mock()
+        with mock.patch.object(TokenCache, 'shared', shared):
+            TokenCache(shared_ttl=60).set(self.token)
+        self.assertLessEqual(shared.set.call_args.args[2], 60)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class SignedTokenTest(SharedPermissionCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = Role.objects.create(name='Customer', code='customer')
+        cls.user = User.objects.create_user('signed', email='signed@example.com', password='secret-password')
+        Profile.objects.create(user=cls.user)
+        UserRole.objects.create(user=cls.user, role=cls.role)
+
+    def setUp(self):
+        super().setUp()
+        for patcher in (
+            mock.patch.object(signed_tokens, 'enabled', True),
+            # Signed tokens require shared revocations
+            mock.patch.object(RevocationList, 'shared', caches['default']),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        signed_tokens.revocations.clear()
+
+    def login(self):
+        response = self.client.post('/api/login', {'email': 'signed@example.com', 'password': 'secret-password'})
+        return response.json()['data']
+
+    def authenticate(self, key):
+        return CustomTokenAuthentication().authenticate_credentials(key)
+
+    def test_verified_without_queries(self):
+        data = self.login()
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        with self.assertNumQueries(0):
+            user, token = self.authenticate(data['access_token'])
+        self.assertEqual((user.pk, token.role_id), (self.user.pk, self.role.pk))
+        # Other fields are loaded on access
+        self.assertEqual(user.email, 'signed@example.com')
+
+    def test_tampered_token(self):
+        key = self.login()['access_token']
+        payload, signature = key.rsplit(':', 1)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(f'{payload}:{signature[::-1]}')
+
+    def test_refresh_rotation(self):
+        data = self.login()
+        response = self.client.post('/api/refresh-token', {'refresh_token': data['refresh_token']})
+        self.assertEqual(response.status_code, 200)
+        rotated = response.json()['data']
+        self.assertNotEqual(rotated['refresh_token'], data['refresh_token'])
+        self.authenticate(rotated['access_token'])
+        # A refresh token works once
+        response = self.client.post('/api/refresh-token', {'refresh_token': data['refresh_token']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_revokes(self):
+        key = self.login()['access_token']
+        response = self.client.post('/api/logout', HTTP_AUTHORIZATION=f'Token {key}')
+        self.assertEqual(response.status_code, 200)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(key)
+        self.assertFalse(RefreshToken.objects.filter(user=self.user).exists())
+
+    def test_permission_change_expires_token(self):
+        key = self.login()['access_token']
+        permission = Permission.objects.create(name='View tour', code='can_read_tour', module='tour', action='read')
+        RolePermission.objects.create(role=self.role, permission=permission)
+        with self.assertRaisesMessage(AuthenticationFailed, 'Token has expired'):
+            self.authenticate(key)
+
+    def test_inactive_user_refused_on_load(self):
+        key = self.login()['access_token']
+        # Deactivated without signals: the token is not revoked
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        user, _ = self.authenticate(key)
+        with self.assertRaisesMessage(AuthenticationFailed, 'User inactive or deleted.'):
+            user.email
+        response = self.client.get('/api/user', HTTP_AUTHORIZATION=f'Token {key}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_deleted_user_refused_on_load(self):
+        key = self.login()['access_token']
+        user, _ = self.authenticate(key)
+        User.objects.filter(pk=self.user.pk).delete()
+        with self.assertRaisesMessage(AuthenticationFailed, 'User inactive or deleted.'):
+            user.is_staff
+
+    def test_revocations_survive_a_sequence_reset(self):
+        cache = caches['default']
+        first, second = RevocationList(sync_interval=0), RevocationList(sync_interval=0)
+        for user_id in (1, 2, 3):
+            first.revoke(user_id, at=now_ms())
+        self.assertTrue(second.is_revoked(3, 0))
+        # Cache restarted: the sequence starts over below what the second process has seen
+        cache.clear()
+        first.revoke(4, at=now_ms())
+        self.assertTrue(second.is_revoked(4, 0))
+        # and again, this time climbing back above it before the next sync
+        cache.clear()
+        for user_id in (5, 6, 7, 8):
+            first.revoke(user_id, at=now_ms())
+        self.assertTrue(second.is_revoked(5, 0))
+
+    def test_requires_shared_caches(self):
+        tokens = SignedTokens(enabled=True)
+        with mock.patch.object(RevocationList, 'shared', None):
+            with self.assertRaises(ImproperlyConfigured):
+                tokens.check()
+        with mock.patch.object(permission_services, 'get_cache', return_value=None):
+            with self.assertRaises(ImproperlyConfigured):
+                tokens.check()
+        tokens.check()
+        SignedTokens(enabled=False).check()
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class RegistrationTest(TestCase):
+    def register(self, username, email):
+        return self.client.post('/api/register', {
+            'username': username, 'email': email, 'first_name': 'New', 'last_name': 'User',
+            'password': 'secret-password', 'password2': 'secret-password',
+        })
+
+    def test_user_and_profile_in_one_transaction(self):
+        # SAVEPOINT, INSERT user, INSERT profile, RELEASE (BEGIN/COMMIT outside tests)
+        with self.assertNumQueries(4):
+            response = self.register('new', 'new@example.com')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Profile.objects.filter(user__username='new').exists())
+
+    def test_duplicates_keep_validation_messages(self):
+        self.register('new', 'new@example.com')
+        response = self.register('new', 'other@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], {'username': ['A user with that username already exists.']})
+        response = self.register('other', 'NEW@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], {'non_field_errors': ['Email đã tồn tại.']})
+        self.assertEqual(User.objects.count(), 1)
+        self.assertEqual(Profile.objects.count(), 1)
+
+
+class UserListSortTest(TestCase):
+    """
+    sort_by goes through USER_SORTS: the sort key of the last row is sent back in the cursor.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', email='customer@example.com', password='secret')
+        cls.staff = User.objects.create_user('staff', email='staff@example.com', password='secret', is_staff=True)
+        User.objects.create_user('other', email='other@example.com', password='secret')
+        cls.customer_token = Token.objects.create(user=cls.customer)
+        cls.staff_token = Token.objects.create(user=cls.staff)
+        read_user = Permission.objects.create(name='View users', code='can_read_user', module='user', action='read')
+        UserPermission.objects.create(user=cls.customer, permission=read_user)
+
+    def get(self, url, token=None):
+        return self.client.get(url, HTTP_AUTHORIZATION=f'Token {(token or self.customer_token).key}')
+
+    def test_sort_outside_whitelist(self):
+        for sort_by in ('password', 'auth_token__key', 'profile__user__password'):
+            for url in (f'/api/user?sort_by={sort_by}&sort_order=asc', f'/api/user?cursor=&sort_by={sort_by}'):
+                response = self.get(url)
+                self.assertEqual(response.status_code, 400, url)
+                self.assertNotIn('next_cursor', response.json())
+
+    def test_cursor_pages(self):
+        response = self.get('/api/user?cursor=&sort_by=username&page_size=2')
+        self.assertEqual(response.status_code, 200)
+        first = response.json()
+        self.assertEqual([row['username'] for row in first['data']], ['customer', 'other'])
+        response = self.get(f"/api/user?cursor={first['next_cursor']}&sort_by=username&page_size=2")
+        self.assertEqual([row['username'] for row in response.json()['data']], ['staff'])
+
+    def pages(self, sort_by, sort_order):
+        rows, cursor = [], ''
+        while cursor is not None:
+            response = self.get(f'/api/user?cursor={cursor}&sort_by={sort_by}&sort_order={sort_order}&page_size=1')
+            self.assertEqual(response.status_code, 200)
+            rows += [row['username'] for row in response.json()['data']]
+            cursor = response.json()['next_cursor']
+        return rows
+
+    def test_cursor_pages_over_datetimes(self):
+        # Microseconds apart: a cursor rounded to milliseconds would return the same row again
+        joined = timezone.now().replace(microsecond=123456)
+        for i, username in enumerate(('customer', 'staff', 'other')):
+            User.objects.filter(username=username).update(date_joined=joined + timedelta(microseconds=i * 10))
+        self.assertEqual(self.pages('date_joined', 'asc'), ['customer', 'staff', 'other'])
+        self.assertEqual(self.pages('date_joined', 'desc'), ['other', 'staff', 'customer'])
+
+    def test_cursor_pages_over_nullable_column(self):
+        User.objects.filter(username='staff').update(last_login=timezone.now())
+        User.objects.filter(username='other').update(last_login=timezone.now() - timedelta(days=1))
+        self.assertEqual(self.pages('last_login', 'asc'), ['other', 'staff', 'customer'])
+        self.assertEqual(self.pages('last_login', 'desc'), ['staff', 'other', 'customer'])
+
+    def test_invalid_cursor(self):
+        next_cursor = self.get('/api/user?cursor=&sort_by=username&page_size=1').json()['next_cursor']
+        for url in (
+            '/api/user?cursor=not-a-cursor',
+            f'/api/user?cursor={next_cursor}&sort_by=email',
+            f'/api/user?cursor={encode_cursor(["username", "asc", {"a": 1}, 1])}&sort_by=username',
+            f'/api/user?cursor={encode_cursor(["date_joined", "asc", "yesterday", 1])}&sort_by=date_joined',
+            f'/api/user?cursor={encode_cursor(["date_joined", "asc", None, 1])}&sort_by=date_joined',
+        ):
+            self.assertEqual(self.get(url).status_code, 400, url)
+
+    def test_export_restricted(self):
+        self.assertEqual(self.get('/api/user/export').status_code, 403)
+        permission = Permission.objects.create(name='Export users', code='can_export_user', module='user', action='export')
+        UserPermission.objects.create(user=self.customer, permission=permission)
+        self.assertEqual(self.get('/api/user/export').status_code, 200)
+        response = self.get('/api/user/export?sort_by=password', self.staff_token)
+        self.assertEqual(response.status_code, 400)
+
+
+class CountStrategyTest(TestCase):
+    """
+    List totals use the strategy configured per endpoint and filter complexity in COUNT_STRATEGIES.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            User.objects.create_user(f'user{i}', email=f'user{i}@example.com', password='secret')
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_choose_strategy(self):
+        self.assertEqual(count_services.choose_strategy('user_list'), count_services.ESTIMATE)
+        self.assertEqual(count_services.choose_strategy('user_list', count_services.SIMPLE), count_services.CACHED)
+        self.assertEqual(count_services.choose_strategy('user_list', count_services.COMPLEX), count_services.CACHED)
+        self.assertEqual(count_services.choose_strategy('unknown'), count_services.EXACT)
+
+    def test_estimate_falls_back_to_exact_outside_postgres(self):
+        total = count_services.count_queryset(User.objects.all(), endpoint='user_list')
+        self.assertEqual(total, (3, False))
+
+    def test_estimate_on_postgres(self):
+        users = User.objects.all()
+        with mock.patch.object(connections['default'], 'vendor', 'postgresql'):
+            with mock.patch.object(count_services, 'table_estimate', return_value=250000) as table_estimate:
+                self.assertEqual(count_services.count_queryset(users, endpoint='user_list'), (250000, True))
+            table_estimate.assert_called_once()
+            # Small or unknown estimates are replaced by an exact count
+            for estimate in (10, None):
+                with mock.patch.object(count_services, 'table_estimate', return_value=estimate):
+                    self.assertEqual(count_services.count_queryset(users, endpoint='user_list'), (3, False))
+            # Filtered querysets are estimated from the query plan, not the table size
+            with mock.patch.object(count_services, 'plan_estimate', return_value=150000) as plan_estimate:
+                total = count_services.estimated_count(users.filter(is_active=True), filtered=True)
+            self.assertEqual(total, (150000, True))
+            plan_estimate.assert_called_once()
+
+    def test_cached_count(self):
+        users = User.objects.filter(username__startswith='user')
+        self.assertEqual(count_services.count_queryset(users, 'user_list', count_services.SIMPLE), (3, False))
+        User.objects.create_user('user3', email='user3@example.com', password='secret')
+        with self.assertNumQueries(0):
+            self.assertEqual(count_services.count_queryset(users, 'user_list', count_services.SIMPLE), (3, False))
+        # A different filter is a different key
+        other = User.objects.filter(username__startswith='user', is_active=True)
+        self.assertEqual(count_services.count_queryset(other, 'user_list', count_services.SIMPLE), (4, False))
+
+    def test_unknown_endpoint_counts_exactly(self):
+        users = User.objects.all()
+        count_services.count_queryset(users, 'unknown', count_services.SIMPLE)
+        User.objects.create_user('user3', email='user3@example.com', password='secret')
+        self.assertEqual(count_services.count_queryset(users, 'unknown', count_services.SIMPLE), (4, False))
+
+
+class UserSearchTest(TestCase):
+    """
+    search_users filters on username/email and ranks prefix matches first, then by trigram similarity on Postgres.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.substring = User.objects.create_user('the_annabel', email='t@example.com', password='secret')
+        cls.prefix = User.objects.create_user('anna', email='a@example.com', password='secret')
+        cls.email = User.objects.create_user('zed', email='anna.zed@example.com', password='secret')
+        User.objects.create_user('bob', email='bob@example.com', password='secret')
+
+    def search(self, term):
+        return list(search_users(User.objects.all(), term).values_list('username', flat=True))
+
+    def test_prefix_matches_first(self):
+        self.assertEqual(self.search('ANNA'), ['anna', 'zed', 'the_annabel'])
+
+    def test_short_terms_match_prefixes_only(self):
+        self.assertEqual(self.search('an'), ['anna', 'zed'])
+        self.assertEqual(self.search('be'), [])
+
+    def test_blank_search(self):
+        self.assertEqual(sorted(self.search('  ')), ['anna', 'bob', 'the_annabel', 'zed'])
+
+    def test_list_endpoint(self):
+        token = Token.objects.create(user=User.objects.create_user('staff', password='secret', is_staff=True))
+        response = self.client.get('/api/user?search=anna', HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['username'] for row in response.json()['data']], ['anna', 'zed', 'the_annabel'])
+        self.assertEqual(response.json()['total'], 3)
+
+    def test_trigram_rank(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('pg_trgm similarity needs Postgres')
+        User.objects.create_user('my_annabelle_account', email='m@example.com', password='secret')
+        users = search_users(User.objects.all(), 'annabel')
+        self.assertEqual([user.username for user in users], ['the_annabel', 'my_annabelle_account'])
+        self.assertGreater(users[0].search_rank, users[1].search_rank)
+
+
+class UserFilterTest(TestCase):
+    """
+    ?filter= is compiled through the USER_FILTERS whitelist, anything else is refused with a 400.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', email='staff@example.com', password='secret', is_staff=True)
+        User.objects.create_user('alice', email='alice@example.com', password='secret', first_name='Alice')
+        User.objects.create_user('bob', email='bob@example.com', password='secret', is_active=False)
+        cls.token = Token.objects.create(user=cls.staff)
+
+    def get(self, filters):
+        return self.client.get(f'/api/user?filter={filters}&sort_by=username&sort_order=asc', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def usernames(self, filters):
+        response = self.get(filters)
+        self.assertEqual(response.status_code, 200, filters)
+        return [row['username'] for row in response.json()['data']]
+
+    def test_allowed_filters(self):
+        self.assertEqual(self.usernames('username__prefix=AL'), ['alice'])
+        self.assertEqual(self.usernames('username__in=bob|staff'), ['bob', 'staff'])
+        self.assertEqual(self.usernames('is_active=false'), ['bob'])
+        self.assertEqual(self.usernames('first_name=Alice,is_active=true'), ['alice'])
+        self.assertEqual(self.usernames(f'id__range={self.staff.pk}|{self.staff.pk + 1}'), ['alice', 'staff'])
+
+    def test_rejected_filters(self):
+        for filters in (
+            'password=secret',  # unknown field
+            'auth_token__key=abc',  # relation traversal
+            'username__contains=a',  # unknown operator
+            'is_active__in=true|false',  # operator not allowed on the field
+            'date_joined=2026-01-01',  # no default operator on the field
+            'id=abc',  # invalid value
+            'is_active=maybe',
+            'id__range=1',
+            'last_login__gte=yesterday',
+        ):
+            response = self.get(filters)
+            self.assertEqual(response.status_code, 400, filters)
+            self.assertFalse(response.json()['success'])
+
+    def test_unindexed_filters(self):
+        self.assertFalse(USER_FILTERS.compile({'username': 'bob'}).slow)
+        self.assertTrue(USER_FILTERS.compile({'is_active': 'true'}).slow)
+        strict = FilterSpec({'name': FilterField('first_name', str, ('eq', 'prefix'), indexed=('eq',))})
+        self.assertTrue(strict.compile({'name': 'Alice'}))
+        self.assertFalse(strict.compile({}))
+        with self.assertRaises(FilterError):
+            strict.compile({'name__prefix': 'Al'})
+
+    def test_compiled_once(self):
+        spec = FilterSpec({'id': FilterField('id', int, ('eq', 'in'), indexed=('eq', 'in'))})
+        first = spec.compile({'id__in': '1|2', 'id': '1'})
+        self.assertIs(spec.compile({'id': '1', 'id__in': '1|2'}), first)
+        self.assertEqual(spec.compile_string.cache_info().hits, 1)
+
+
+class UserExportTest(TestCase):
+    """
+    /api/user/export streams every matching user as json, ndjson or csv.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', email='staff@example.com', password='secret', is_staff=True)
+        User.objects.create_user('alice', email='alice@example.com', password='secret', first_name='Alice, "Al"')
+        User.objects.create_user('bob', email='bob@example.com', password='secret', last_name='Line\nbreak')
+        cls.token = Token.objects.create(user=cls.staff)
+
+    def export(self, params):
+        response = self.client.get(f'/api/user/export?sort_by=username&sort_order=asc&{params}',
+                                   HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_json(self):
+        response, body = self.export('export=json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        data = json.loads(body)
+        self.assertEqual([row['username'] for row in data['data']], ['alice', 'bob', 'staff'])
+        self.assertEqual(data['total'], 3)
+        self.assertTrue(data['success'])
+
+    def test_ndjson(self):
+        response, body = self.export('export=ndjson&filter=username__in=alice|bob')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="users.ndjson"')
+        self.assertTrue(body.endswith('\n'))
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['username'] for row in rows], ['alice', 'bob'])
+        self.assertEqual(rows[1]['last_name'], 'Line\nbreak')
+        self.assertNotIn('password', rows[0])
+
+    def test_csv(self):
+        response, body = self.export('export=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="users.csv"')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([row['username'] for row in rows], ['alice', 'bob', 'staff'])
+        self.assertEqual(rows[0]['first_name'], 'Alice, "Al"')
+        self.assertEqual(rows[1]['last_name'], 'Line\nbreak')
+        self.assertEqual(rows[2]['is_staff'], 'True')
+        self.assertNotIn('password', rows[0])
+
+    def test_empty_export(self):
+        self.assertEqual(self.export('export=csv&filter=username=nobody')[1], '')
+        self.assertEqual(self.export('export=ndjson&filter=username=nobody')[1], '')
+        self.assertEqual(json.loads(self.export('filter=username=nobody')[1]), {'success': True, 'data': [], 'total': 0})
+
+    def test_small_chunks(self):
+        with mock.patch.object(ultils, 'STREAM_BUFFER_SIZE', 1):
+            response, body = self.export('export=ndjson')
+        self.assertEqual([json.loads(line)['username'] for line in body.splitlines()], ['alice', 'bob', 'staff'])
+
+    def test_flatten_row(self):
+        rows = [{'id': 1, 'user': {'name': 'a', 'roles': ['x', 'y']}}, {'id': 2, 'user': {'name': 'b', 'roles': []}}]
+        self.assertEqual(''.join(ultils.stream_csv(rows)), 'id,user.name,user.roles\r\n1,a,x|y\r\n2,b,\r\n')
+
+
+class DepartureInventoryTest(TestCase):
+    """
+    Seats are taken per departure date, guarded by the departure row.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.tour = Tour.objects.create(
+            name='Tour', description='', price=100, duration=1, max_participants=3,
+            start_date=date(2026, 1, 1), end_date=date(2026, 12, 31), departure_time=time(8, 0),
+        )
+        cls.ticket = TicketType.objects.create(name='Adult', code='ADULT')
+
+    def test_full_date_does_not_block_other_dates(self):
+        hold_seats(self.tour.pk, 3, departure_date=date(2026, 3, 1))
+        with self.assertRaises(SoldOut):
+            hold_seats(self.tour.pk, 1, departure_date=date(2026, 3, 1))
+        hold_seats(self.tour.pk, 2, departure_date=date(2026, 3, 2))
+        departures = dict(TourDeparture.objects.values_list('date', 'held'))
+        self.assertEqual(departures, {date(2026, 3, 1): 3, date(2026, 3, 2): 2})
+        self.tour.refresh_from_db()
+        self.assertEqual(self.tour.current_participants, 5)
+
+    def test_saving_a_loaded_booking_does_not_select(self):
+        booking = Booking.objects.create(
+            tour=self.tour, departure_date=timezone.now(), total_price=100, final_price=100,
+        )
+        BookingItem.objects.create(booking=booking, ticket_type=self.ticket, quantity=2, unit_price=100)
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.notes = 'Late arrival'
+        with self.assertNumQueries(1):
+            booking.save()
+        booking.status = 'confirmed'
+        booking.save()
+        item = BookingItem.objects.get(booking=booking)
+        item.quantity = 3
+        item.save()
+        self.assertEqual(TourDeparture.objects.get().sold, 3)
+
+    def test_rebuild_counts_existing_bookings(self):
+        booking = Booking.objects.create(
+            tour=self.tour, departure_date=timezone.now(), status='confirmed', total_price=100, final_price=100,
+        )
+        BookingItem.objects.create(booking=booking, ticket_type=self.ticket, quantity=2, unit_price=100)
+        hold_seats(self.tour.pk, 1, departure_date=date(2026, 3, 2))
+        # Bookings taken before departure rows existed
+        TourDeparture.objects.all().delete()
+        self.assertEqual(rebuild_departures(), 2)
+        departures = {day: (sold, held) for day, sold, held in TourDeparture.objects.values_list('date', 'sold', 'held')}
+        self.assertEqual(departures, {departure_day(booking.departure_date): (2, 0), date(2026, 3, 2): (0, 1)})
+        # The date is full again
+        with self.assertRaises(SoldOut):
+            hold_seats(self.tour.pk, 2, departure_date=booking.departure_date)
+
+    def test_release_never_goes_below_zero(self):
+        hold_seats(self.tour.pk, 1, departure_date=date(2026, 3, 1))
+        adjust_departure(self.tour.pk, date(2026, 3, 1), sold=-2, held=-3)
+        self.assertEqual(TourDeparture.objects.values_list('sold', 'held').get(), (0, 0))
+
+
+class BookingSeatOwnershipTest(TestCase):
+    """
+    confirm_booking / cancel_booking only give back or take over the seats the booking owns.
+    """
+    DAY = date(2026, 3, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tour = Tour.objects.create(
+            name='Tour', description='', price=100, duration=1, max_participants=4,
+            start_date=date(2026, 1, 1), end_date=date(2026, 12, 31), departure_time=time(8, 0),
+        )
+        cls.ticket = TicketType.objects.create(name='Adult', code='ADULT')
+
+    def book(self, quantity):
+        booking = Booking.objects.create(
+            tour=self.tour, departure_date=timezone.make_aware(datetime.combine(self.DAY, time(8, 0))),
+            total_price=100, final_price=100,
+        )
+        BookingItem.objects.create(booking=booking, ticket_type=self.ticket, quantity=quantity, unit_price=100)
+        hold_seats(self.tour.pk, quantity, booking=booking)
+        return booking
+
+    def sweep(self, booking):
+        SeatHold.objects.filter(booking=booking).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(release_expired_holds(), 1)
+
+    def assertSeats(self, sold, held):
+        departure = TourDeparture.objects.get(tour=self.tour, date=self.DAY)
+        self.tour.refresh_from_db()
+        self.assertEqual((departure.sold, departure.held, self.tour.current_participants), (sold, held, sold + held))
+
+    def test_sweep_then_cancel(self):
+        swept = self.book(2)
+        self.book(2)
+        self.sweep(swept)
+        self.assertSeats(0, 2)
+        self.assertTrue(cancel_booking(swept))
+        # The sweep already gave the seats back
+        self.assertSeats(0, 2)
+        self.assertFalse(cancel_booking(swept))
+
+    def test_sweep_then_confirm(self):
+        swept = self.book(2)
+        self.sweep(swept)
+        other = self.book(3)
+        with self.assertRaises(SoldOut):
+            confirm_booking(swept)
+        self.assertSeats(0, 3)
+        self.assertEqual(Booking.objects.get(pk=swept.pk).status, 'pending')
+        self.assertTrue(cancel_booking(other))
+        self.assertTrue(confirm_booking(swept))
+        self.assertSeats(2, 0)
+        self.assertTrue(cancel_booking(swept))
+        self.assertSeats(0, 0)
+
+    def test_confirm_then_cancel(self):
+        booking = self.book(2)
+        self.assertTrue(confirm_booking(booking))
+        self.assertFalse(confirm_booking(booking))
+        self.assertSeats(2, 0)
+        self.assertTrue(cancel_booking(booking))
+        self.assertSeats(0, 0)
+
+
+class DiscountRedemptionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.tour = Tour.objects.create(
+            name='Tour', description='', price=100, duration=1, max_participants=10,
+            start_date=date(2026, 1, 1), end_date=date(2026, 12, 31), departure_time=time(8, 0),
+        )
+        cls.ticket = TicketType.objects.create(name='Adult', code='ADULT')
+        cls.discount = Discount.objects.create(
+            code='SUMMER', discount_percentage=10, valid_from=now - timedelta(days=1),
+            valid_to=now + timedelta(days=1), max_uses=4,
+        )
+
+    def setUp(self):
+        discount_services.invalidate(self.discount.code)
+
+    def uses(self):
+        return discount_services.sync_uses(self.discount)
+
+    def test_cancel_releases_only_redeemed_uses(self):
+        booked, = create_bookings([{
+            'tour_id': self.tour.pk, 'departure_date': timezone.now(), 'discount_code': 'SUMMER',
+            'items': [{'ticket_type_id': self.ticket.pk, 'quantity': 1}],
+        }])
+        self.assertEqual((booked.discount_uses, self.uses()), (1, 1))
+        # Code set through save(): nothing was redeemed
+        saved = Booking.objects.create(
+            tour=self.tour, departure_date=timezone.now(), discount_code='SUMMER', total_price=100, final_price=90,
+        )
+        self.assertTrue(cancel_booking(saved))
+        self.assertEqual(self.uses(), 1)
+        self.assertTrue(cancel_booking(booked))
+        self.assertEqual(self.uses(), 0)
+        self.assertFalse(cancel_booking(booked))
+        self.assertEqual(self.uses(), 0)
+
+    def test_multi_use_redeem_spans_shards(self):
+        discount_services.enable_sharding(self.discount, shards=2)
+        discount = discount_services.get_discount('SUMMER')
+        self.assertTrue(discount_services.redeem(discount, 3))
+        self.assertEqual(self.uses(), 3)
+        # Not enough left over all shards: nothing is taken
+        self.assertFalse(discount_services.redeem(discount, 2))
+        self.assertEqual(self.uses(), 3)
+        self.assertTrue(discount_services.release(discount, 3))
+        self.assertEqual(list(DiscountShard.objects.values_list('uses', flat=True)), [0, 0])
+
+    def book(self, code, quantity=1):
+        return create_bookings([{
+            'tour_id': self.tour.pk, 'departure_date': timezone.now(), 'discount_code': code,
+            'items': [{'ticket_type_id': self.ticket.pk, 'quantity': quantity}],
+        }])[0]
+
+    def test_no_use_spent_without_a_discount(self):
+        Discount.objects.filter(pk=self.discount.pk).update(min_purchase_amount=500)
+        discount_services.invalidate(self.discount.code)
+        booking = self.book('SUMMER')
+        self.assertEqual((booking.discount_code, booking.discount_uses, booking.final_price), ('', 0, 100))
+        self.assertEqual(self.uses(), 0)
+        booking = self.book('SUMMER', quantity=5)
+        self.assertEqual((booking.discount_uses, booking.final_price), (1, 450))
+        self.assertEqual(self.uses(), 1)
+
+    def test_unusable_code_is_refused(self):
+        Discount.objects.create(
+            code='OLD', discount_percentage=10, valid_from=timezone.now() - timedelta(days=3),
+            valid_to=timezone.now() - timedelta(days=2),
+        )
+        for code in ('NOPE', 'OLD'):
+            with self.assertRaisesMessage(PricingError, f'Discount code {code} is not valid.'):
+                self.book(code)
+        self.assertFalse(Booking.objects.exists())
+
+
+class PermissionCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = Role.objects.create(name='Staff', code='staff')
+        cls.permission = Permission.objects.create(name='View tour', code='can_read_tour', module='tour', action='read')
+        cls.grant = RolePermission.objects.create(role=cls.role, permission=cls.permission)
+        cls.user = User.objects.create_user('staff', email='staff@example.com')
+        UserRole.objects.create(user=cls.user, role=cls.role)
+
+    def codes(self):
+        return permission_services.get_permission_codes(User.objects.get(pk=self.user.pk))
+
+    def test_process_local_cache_is_not_used(self):
+        # No CACHES setting: 'default' is a LocMemCache, other workers would never see an invalidation
+        self.assertIsNone(permission_services.get_cache())
+        self.assertEqual(self.codes(), {'can_read_tour'})
+        RolePermission.objects.filter(pk=self.grant.pk).update(role=Role.objects.create(name='Other', code='other'))
+        self.assertEqual(self.codes(), set())
+
+    def test_evicted_version_does_not_revive_stale_entries(self):
+        cache = caches['default']
+        cache.clear()
+        with mock.patch.object(permission_services, 'get_cache', return_value=cache):
+            self.assertEqual(self.codes(), {'can_read_tour'})
+            self.grant.delete()
+            self.assertEqual(self.codes(), set())
+            # The versions are evicted while an entry stored at the first version is still cached
+            stale = dict(cache.get(permission_services.USER_KEY.format(self.user.pk)), codes=frozenset({'can_read_tour'}))
+            cache.delete_many([permission_services.ROLE_VERSION_KEY.format(self.role.pk), permission_services.GLOBAL_VERSION_KEY])
+            cache.set(permission_services.USER_KEY.format(self.user.pk), stale)
+            self.assertEqual(self.codes(), set())
+
+
+class PermissionMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', email='customer@example.com', password='secret')
+        cls.token = Token.objects.create(user=cls.customer)
+
+    def test_mapped_route_needs_the_code(self):
+        response = self.client.post(
+            '/api/booking/bulk', {'bookings': []}, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Token {self.token.key}',
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {'detail': 'Permission denied'})
+        self.assertEqual(self.client.get('/api/user', HTTP_AUTHORIZATION=f'Token {self.token.key}').status_code, 403)
+        permission = Permission.objects.create(name='View users', code='can_read_user', module='user', action='read')
+        UserPermission.objects.create(user=self.customer, permission=permission)
+        self.assertEqual(self.client.get('/api/user', HTTP_AUTHORIZATION=f'Token {self.token.key}').status_code, 200)
+
+    def test_bulk_booking_body_must_be_an_object(self):
+        permission = Permission.objects.create(
+            name='Create booking', code='can_create_booking', module='booking', action='create',
+        )
+        UserPermission.objects.create(user=self.customer, permission=permission)
+        # A JSON list and a JSON string
+        for body in ([{'tour_id': 1}], '"bookings"'):
+            response = self.client.post(
+                '/api/booking/bulk', body, content_type='application/json',
+                HTTP_AUTHORIZATION=f'Token {self.token.key}',
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(response.json()['success'])
+
+    def test_unknown_route_names_are_rejected(self):
+        PermissionRouter(PermissionMiddleware.permission_routes)
+        for routes in ({'tour_create': {'*': 'can_create_tour'}}, {'tours_*': {'POST': 'can_create_tour'}}):
+            with self.assertRaises(ImproperlyConfigured):
+                PermissionRouter(routes)
+
+
+class BufferedCounterTest(TestCase):
+    """
+    Two processes buffering views of the same post in a shared cache write every view once.
+    """
+    def setUp(self):
+        caches['default'].clear()
+        self.post = Post.objects.create(title='Post', content='')
+        # One counter per process
+        self.counters = [BufferedCounter(Post, 'views', cache_alias='default') for _ in range(2)]
+        self.addCleanup(lambda: [counters.remove(counter) for counter in self.counters])
+
+    def test_concurrent_flushes(self):
+        first, second = self.counters
+        first.buffer(self.post.pk, 3)
+        second.buffer(self.post.pk, 2)
+        first.flush()
+        second.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 5)
+
+    def test_claim_after_stale_read(self):
+        cache = caches['default']
+        key = self.counters[0].key(self.post.pk)
+        cache.set(key, 5, None)
+        # Both flushers read 5 before either claims
+        with mock.patch.object(cache, 'get', return_value=5):
+            claims = [BufferedCounter.claim(cache, key), BufferedCounter.claim(cache, key)]
+        self.assertEqual(sorted(claims), [0, 5])
+        self.assertEqual(cache.get(key), 0)
+
+
+class TourRatingSaveTest(TestCase):
+    """
+    Saving a tour loaded before a review changed its ratings keeps the ratings written by the review.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.tour = Tour.objects.create(
+            name='Tour', description='', price=100, duration=1, max_participants=10,
+            start_date=date(2026, 1, 1), end_date=date(2026, 12, 31), departure_time=time(8, 0),
+        )
+        cls.user = User.objects.create_user('reviewer', password='password')
+
+    def save_stale(self, change):
+        stale = Tour.objects.get(pk=self.tour.pk)
+        change()
+        stale.name = 'Renamed'
+        stale.save()
+        return Tour.objects.get(pk=self.tour.pk)
+
+    def test_review_create(self):
+        tour = self.save_stale(lambda: Review.objects.create(tour=self.tour, user=self.user, rating=4, comment=''))
+        self.assertEqual((tour.name, tour.rating_count, tour.rating_sum, tour.rating_4), ('Renamed', 1, 4, 1))
+        self.assertGreater(tour.rating_score, 0)
+
+    def test_review_update(self):
+        review = Review.objects.create(tour=self.tour, user=self.user, rating=4, comment='')
+
+        def change():
+            review.rating = 2
+            review.save()
+        tour = self.save_stale(change)
+        self.assertEqual((tour.rating_count, tour.rating_sum, tour.rating_2, tour.rating_4), (1, 2, 1, 0))
+
+    def test_review_delete(self):
+        review = Review.objects.create(tour=self.tour, user=self.user, rating=5, comment='')
+        tour = self.save_stale(review.delete)
+        self.assertEqual((tour.rating_count, tour.rating_sum, tour.rating_5, tour.rating_score), (0, 0, 0, 0))
+
+    def test_rebuild_from_existing_reviews(self):
+        Review.objects.create(tour=self.tour, user=self.user, rating=4, comment='')
+        Review.objects.create(tour=self.tour, user=self.user, rating=2, comment='')
+        # Reviews written before the aggregate columns existed
+        Tour.objects.filter(pk=self.tour.pk).update(rating_count=0, rating_sum=0, rating_2=0, rating_4=0, rating_score=0)
+        self.assertEqual(rating_services.rebuild_ratings(), 1)
+        tour = Tour.objects.get(pk=self.tour.pk)
+        self.assertEqual((tour.rating_count, tour.rating_sum, tour.rating_2, tour.rating_4), (2, 6, 1, 1))
+        self.assertEqual(tour.rating_score, rating_services.bayesian_average(2, 6))
+
+    def test_save_ratings_explicitly(self):
+        tour = Tour.objects.get(pk=self.tour.pk)
+        tour.rating_count, tour.rating_sum = 2, 9
+        tour.save()
+        self.assertEqual(Tour.objects.get(pk=self.tour.pk).rating_count, 0)
+        tour.save(save_ratings=True)
+        self.assertEqual(Tour.objects.filter(pk=self.tour.pk).values_list('rating_count', 'rating_sum').get(), (2, 9))
+
+
+class BookingItemPriceTest(TestCase):
+    """
+    BookingItem.save() prices a ticket with the tour's TourPricing override, else the ticket type percentage.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.tour = Tour.objects.create(
+            name='Tour', description='', price=100, duration=1, max_participants=10,
+            start_date=date(2026, 1, 1), end_date=date(2026, 12, 31), departure_time=time(8, 0),
+        )
+        cls.adult = TicketType.objects.create(name='Adult', code='ADULT')
+        cls.child = TicketType.objects.create(name='Child', code='CHILD', price_percentage=50)
+        TourPricing.objects.create(tour=cls.tour, ticket_type=cls.adult, price=80)
+        cls.booking = Booking.objects.create(
+            tour=cls.tour, departure_date=timezone.now(), status='cancelled', total_price=1, final_price=1,
+        )
+
+    def prices(self, **kwargs):
+        items = [
+            BookingItem(booking=self.booking, ticket_type=ticket_type, quantity=2)
+            for ticket_type in (self.adult, self.child)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            for item in items:
+                item.save(**kwargs)
+        return [(item.unit_price, item.total_price) for item in items], queries
+
+    def test_loaded_prices(self):
+        prices, _ = self.prices()
+        self.assertEqual(prices, [(80, 160), (50, 100)])
+
+    def test_preloaded_prices(self):
+        table = PriceTable([self.tour])
+        prices, queries = self.prices(prices=table)
+        self.assertEqual(prices, [(80, 160), (50, 100)])
+        self.assertFalse([query for query in queries if 'pricing' in query['sql'] or '"database_tour"' in query['sql']])
+
+
+class TourSearchTest(TestCase):
+    """
+    Search documents follow their tours; facets count each facet with the other selections only.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.hanoi = City.objects.create(name='Ha Noi', country='VN')
+        cls.saigon = City.objects.create(name='Sai Gon', country='VN')
+        cls.domestic = TourType.objects.create(name='Domestic', code='DOM')
+        cls.foreign = TourType.objects.create(name='Foreign', code='FOR')
+        adult = TicketType.objects.create(name='Adult', code='ADULT')
+
+        def tour(name, price, city, tour_type, start):
+            destination = Destination.objects.create(name=f'{name} place', city=city, type=tour_type)
+            return Tour.objects.create(
+                name=name, description='', price=price, duration=1, max_participants=10,
+                start_date=start, end_date=date(2026, 12, 31), departure_time=time(8, 0),
+                destination=destination, tour_type=tour_type,
+            )
+        cls.cheap = tour('Cheap', 300000, cls.hanoi, cls.domestic, date(2026, 3, 1))
+        cls.mid = tour('Mid', 700000, cls.hanoi, cls.foreign, date(2026, 1, 1))
+        cls.free = tour('Free', 1500000, cls.saigon, cls.domestic, date(2026, 2, 1))
+        # Every ticket of the tour is free: its from price is 0, not the tour price
+        TourPricing.objects.create(tour=cls.free, ticket_type=adult, price=0)
+
+    def counts(self, facet):
+        return {item['value']: item['count'] for item in facet}
+
+    def test_full_rebuild(self):
+        # Tours created before the search table existed
+        TourSearch.objects.all().delete()
+        self.assertEqual(refresh_documents(), 3)
+        self.assertEqual(search_tours()['total'], 3)
+
+    def test_free_tour_from_price(self):
+        document = TourSearch.objects.get(tour=self.free)
+        self.assertEqual((document.from_price, document.price_bucket), (0, 0))
+
+    def test_facets(self):
+        result = search_tours(selected={'city': {self.hanoi.pk}})
+        self.assertEqual(result['total'], 2)
+        facets = result['facets']
+        # Unselected cities keep their counts
+        self.assertEqual(self.counts(facets['city']), {self.hanoi.pk: 2, self.saigon.pk: 1})
+        self.assertEqual(self.counts(facets['type']), {self.domestic.pk: 1, self.foreign.pk: 1})
+        self.assertEqual(self.counts(facets['price']), {0: 1, 1: 1})
+
+    def test_sort(self):
+        def names(**kwargs):
+            return [row['name'] for row in search_tours(**kwargs)['tours']]
+        self.assertEqual(names(sort_by='price', sort_order='asc'), ['Free', 'Cheap', 'Mid'])
+        self.assertEqual(names(sort_by='price', sort_order='desc'), ['Mid', 'Cheap', 'Free'])
+        self.assertEqual(names(sort_by='start_date', sort_order='asc'), ['Mid', 'Free', 'Cheap'])
+        first = search_tours(sort_by='price', sort_order='asc', page_size=2)
+        self.assertEqual([row['name'] for row in first['tours']], ['Free', 'Cheap'])
+        rest = search_tours(sort_by='price', sort_order='asc', page_size=2, cursor=first['next_cursor'])
+        self.assertEqual([row['name'] for row in rest['tours']], ['Mid'])
+
+    def test_refreshed_only_when_searched_fields_change(self):
+        tour = Tour.objects.get(pk=self.cheap.pk)
+        tour.current_participants = 3
+        with CaptureQueriesContext(connection) as queries:
+            tour.save()
+        self.assertFalse([query for query in queries if TourSearch._meta.db_table in query['sql']])
+        tour.name = 'Renamed'
+        tour.save()
+        self.assertEqual(TourSearch.objects.get(tour=tour).name, 'Renamed')
+
+
+class CatalogueCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.city = City.objects.create(name='Ha Noi', country='VN')
+        Destination.objects.create(name='Old Quarter', city=cls.city)
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_process_local_cache_is_short_lived(self):
+        cache, ttl = catalogue_services.get_cache()
+        self.assertEqual(ttl, CATALOGUE_LOCAL_CACHE_TTL)
+        with mock.patch.object(catalogue_services, 'get_shared_cache', return_value=caches['default']):
+            self.assertEqual(catalogue_services.get_cache(), (caches['default'], CATALOGUE_CACHE_TTL))
+
+    def test_invalidated_on_commit(self):
+        self.assertEqual(catalogue_services.get_city_summary(self.city.pk)['destinations'][0]['name'], 'Old Quarter')
+        with self.captureOnCommitCallbacks(execute=True):
+            Destination.objects.create(name='West Lake', city=self.city)
+        names = [item['name'] for item in catalogue_services.get_city_summary(self.city.pk)['destinations']]
+        self.assertEqual(sorted(names), ['Old Quarter', 'West Lake'])
+        # An evicted version never brings back an older tree
+        caches['default'].delete(catalogue_services.VERSION_KEY)
+        self.assertEqual(len(catalogue_services.get_city_summary(self.city.pk)['destinations']), 2)
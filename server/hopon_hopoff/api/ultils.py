@@ -1,10 +1,25 @@
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q, QuerySet
+from django.db.models.constants import LOOKUP_SEP
 from api.contants import PAGE_SIZE
+from api.services.filter_services import FilterError, sort_column
+import base64
+import datetime
+import csv
+import json
 import os
 
-def app_response(success: bool, data: dict, status: int = 200, total: int = 0) -> Response:
+def app_response(success: bool, data: dict, status: int = 200, total: int = 0, meta: dict = None) -> Response:
     """
     Format the response for the app.
+    `meta` holds extra top level keys such as the next page cursor.
     """
     res_dict = {
         "success": success,
@@ -15,8 +30,112 @@ def app_response(success: bool, data: dict, status: int = 200, total: int = 0) -
         res_dict["error"] = data
     if total:
         res_dict["total"] = total
+    if meta:
+        res_dict.update(meta)
     return Response(res_dict, status=status)
 
+def get_shared_cache(alias):
+    """
+    The Django cache `alias` if every process sees the same data (Redis, Memcached, database),
+    None when the alias is unset or process-local (LocMemCache, the default without a CACHES setting).
+    Use it for caches that must see invalidations made by other processes.
+    """
+    if not alias:
+        return None
+    cache = caches[alias]
+    if isinstance(cache, (LocMemCache, DummyCache)):
+        return None
+    return cache
+
+STREAM_BUFFER_SIZE = 64 * 1024  # Flush streamed output in ~64KB chunks
+
+def buffered(parts):
+    """
+    Group many small strings into ~STREAM_BUFFER_SIZE chunks.
+    """
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= STREAM_BUFFER_SIZE:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer)
+
+def stream_json(rows):
+    """
+    Write the app_response envelope incrementally: {"success":true,"data":[...],"total":n}
+    """
+    encoder = JSONEncoder()
+    yield '{"success":true,"data":['
+    total = 0
+    for row in rows:
+        yield ("," if total else "") + encoder.encode(row)
+        total += 1
+    yield '],"total":%d}' % total
+
+def stream_ndjson(rows):
+    """
+    One JSON object per line.
+    """
+    encoder = JSONEncoder()
+    for row in rows:
+        yield encoder.encode(row) + "\n"
+
+def flatten_row(row: dict, prefix: str = "") -> dict:
+    """
+    Flatten nested dicts into "parent.child" columns and lists into "a|b" for CSV.
+    """
+    flat = {}
+    for key, value in row.items():
+        if isinstance(value, dict):
+            flat.update(flatten_row(value, f"{prefix}{key}."))
+        elif isinstance(value, (list, tuple)):
+            flat[prefix + key] = "|".join(str(item) for item in value)
+        else:
+            flat[prefix + key] = value
+    return flat
+
+class Echo:
+    """
+    File-like object for csv.writer that returns the line instead of storing it.
+    """
+    def write(self, value):
+        return value
+
+def stream_csv(rows):
+    """
+    Header from the first row, then one line per row.
+    """
+    writer = None
+    for row in rows:
+        row = flatten_row(row)
+        if writer is None:
+            writer = csv.DictWriter(Echo(), fieldnames=list(row), extrasaction="ignore")
+            yield writer.writeheader()
+        yield writer.writerow(row)
+
+STREAM_FORMATS = {
+    "json": (stream_json, "application/json"),
+    "ndjson": (stream_ndjson, "application/x-ndjson"),
+    "csv": (stream_csv, "text/csv"),
+}
+
+def app_stream_response(rows, export_format: str = "json", filename: str = "export", status: int = 200) -> StreamingHttpResponse:
+    """
+    Stream rows (an iterator of dicts, e.g. from queryset.iterator(chunk_size=...)) as json, ndjson or csv.
+    Memory use stays constant regardless of the result size.
+    The status is sent before the rows, so errors while streaming cannot change it.
+    """
+    stream, content_type = STREAM_FORMATS.get(export_format, STREAM_FORMATS["json"])
+    response = StreamingHttpResponse(buffered(stream(rows)), content_type=content_type, status=status)
+    if export_format in ("csv", "ndjson"):
+        response["Content-Disposition"] = f'attachment; filename="{filename}.{export_format}"'
+    return response
+
 def get_UI_URL() -> str:
     """
     Get the UI URL from environment variables or use a default value.
@@ -74,8 +193,10 @@ def load_table_params(request) -> dict:
     search = request.GET.get("search", "")
     sort_by = request.GET.get("sort_by", "")
     sort_order = request.GET.get("sort_order", "")
+    # Keyset pagination is used when the "cursor" param is present (empty for the first page)
+    cursor = request.GET.get("cursor")
     filters = filter_obj
-    return page, page_size, search, sort_by, sort_order, filters
+    return page, page_size, search, sort_by, sort_order, filters, cursor
 
 def string_to_int(string: str) -> int:
     """
@@ -86,9 +207,10 @@ def string_to_int(string: str) -> int:
     except ValueError:
         return 0
 
-def pagination(data, page, page_size) -> dict:
+def pagination(data, page, page_size, total=None) -> dict:
     """
     Paginate the data based on page and page size.
+    `total` may be given when it was already counted (or estimated) by the caller.
     returns a tuple of paginated data and total count.
     """
     page = string_to_int(page)
@@ -97,18 +219,122 @@ def pagination(data, page, page_size) -> dict:
     page_size = page_size if page_size > 0 else PAGE_SIZE
     start = page * page_size
     end = start + page_size
-    total = len(data)
-    if end > total:
-        end = total
-    if start > total:
-        start = total
+    if total is None:
+        # Let the database count rows instead of loading the whole queryset
+        total = data.count() if isinstance(data, QuerySet) else len(data)
+    # Querysets are sliced with LIMIT/OFFSET, and the total may only be an estimate
+    if not isinstance(data, QuerySet):
+        if end > total:
+            end = total
+        if start > total:
+            start = total
     data = data[start:end]
     return data, total
 
-def sort_queryset(queryset, sort_by, sort_order) -> dict:
+def encode_cursor(values: list) -> str:
+    """
+    Encode the last row sort key into an opaque cursor.
+    Dates and times keep their microseconds (DjangoJSONEncoder cuts them to milliseconds): the seek
+    predicate must compare against the exact stored value, or the last row of a page comes back on the next one.
+    """
+    values = [
+        value.isoformat() if isinstance(value, (datetime.datetime, datetime.time)) else value
+        for value in values
+    ]
+    raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    """
+    Decode a cursor produced by encode_cursor, raise ValueError if it is malformed.
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != 4:
+        raise ValueError("Invalid cursor")
+    return values
+
+def cursor_pagination(queryset, page_size, cursor, sort_by, sort_order, total=None, sorts=None):
+    """
+    Keyset pagination: seek to rows after the cursor with WHERE (sort_key, id) > (...) LIMIT n.
+    The cost of a page does not depend on its depth, unlike OFFSET.
+    `sorts` is the whitelist of sortable columns ({name: column}) when sort_by comes from the request.
+    The sort key is sent back to the client in the cursor: only plain columns are accepted.
+    NULL sort keys come last in both directions.
+    returns a tuple of the page queryset, total count and the next cursor (None on the last page).
+    raises ValueError (FilterError) for a sort that is not allowed or a malformed / mismatched cursor.
+    """
+    page_size = string_to_int(page_size)
+    page_size = page_size if page_size > 0 else PAGE_SIZE
+    if sorts is not None:
+        sort_by = sort_column(sorts, sort_by)
+    sort_by = sort_by or "id"
+    if LOOKUP_SEP in sort_by:
+        raise FilterError(f"Cannot page by cursor on '{sort_by}'.")
+    try:
+        field = queryset.model._meta.get_field(sort_by)
+    except FieldDoesNotExist:
+        # Annotation: computed by the query itself
+        field = None
+    nullable = field is not None and field.null
+    descending = sort_order == "desc"
+    prefix = "-" if descending else ""
+    op = "lt" if descending else "gt"
+
+    if total is None:
+        total = queryset.count()
+    if nullable:
+        # Same NULL position on every backend, the seek predicate below relies on it
+        key = F(sort_by).desc(nulls_last=True) if descending else F(sort_by).asc(nulls_last=True)
+        queryset = queryset.order_by(key, prefix + "id")
+    else:
+        queryset = queryset.order_by(prefix + sort_by, prefix + "id")
+    if cursor:
+        cursor_sort_by, cursor_sort_order, value, last_id = decode_cursor(cursor)
+        if cursor_sort_by != sort_by or cursor_sort_order != ("desc" if descending else "asc"):
+            raise ValueError("Cursor does not match the requested sort")
+        if not isinstance(last_id, int) or isinstance(value, (list, dict)) or (value is None and not nullable):
+            raise ValueError("Invalid cursor")
+        if field is not None and value is not None:
+            try:
+                value = field.to_python(value)
+            except ValidationError:
+                raise ValueError("Invalid cursor")
+        if sort_by == "id":
+            queryset = queryset.filter(**{f"id__{op}": last_id})
+        elif value is None:
+            # Inside the trailing NULL rows
+            queryset = queryset.filter(**{f"{sort_by}__isnull": True, f"id__{op}": last_id})
+        elif nullable:
+            queryset = queryset.filter(
+                Q(**{f"{sort_by}__{op}": value}) | Q(**{sort_by: value, f"id__{op}": last_id})
+                | Q(**{f"{sort_by}__isnull": True})
+            )
+        else:
+            # (sort_key, id) > (value, last_id), written so the planner can range scan the sort index
+            queryset = queryset.filter(**{f"{sort_by}__{op}e": value}).filter(
+                Q(**{f"{sort_by}__{op}": value}) | Q(**{f"id__{op}": last_id})
+            )
+
+    # Seek the page keys on the (sort_key, id) index, then load the page rows by id
+    keys = list(queryset.values_list(sort_by, "id")[:page_size + 1])
+    next_cursor = None
+    if len(keys) > page_size:
+        keys = keys[:page_size]
+        value, last_id = keys[-1]
+        next_cursor = encode_cursor([sort_by, "desc" if descending else "asc", value, last_id])
+    rows = queryset.filter(id__in=[key[1] for key in keys])
+    return rows, total, next_cursor
+
+def sort_queryset(queryset, sort_by, sort_order, sorts) -> dict:
     """
     Sort queryset by given field and order.
+    `sorts` is the whitelist of sortable columns ({name: column}), raises FilterError for other fields.
     """
+    sort_by = sort_column(sorts, sort_by)
     if not sort_by or not sort_order:
         return queryset
     if sort_order == "asc":
@@ -1,5 +1,5 @@
 from django.urls import path
-from ._views import user_views
+from ._views import user_views, tour_views, booking_views
 
 
 urlpatterns = [
@@ -14,4 +14,11 @@ urlpatterns = [
 
     path("profile", user_views.ProfileView.as_view(), name="profile"),
     path("user", user_views.UserListView.as_view(), name="user_list"),
+    path("user/export", user_views.UserExportView.as_view(), name="user_export"),
+
+    path("tour/search", tour_views.TourSearchView.as_view(), name="tour_search"),
+    path("tour/availability", tour_views.TourAvailabilityView.as_view(), name="tour_availability"),
+    path("catalogue", tour_views.CatalogueView.as_view(), name="catalogue"),
+
+    path("booking/bulk", booking_views.BookingBulkCreateView.as_view(), name="booking_bulk_create"),
 ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:00
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0009_passwordresettoken'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # Composite (sort_key, id) indexes used by keyset pagination of the user table
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS auth_user_date_joined_id_idx ON auth_user (date_joined, id);',
+            reverse_sql='DROP INDEX IF EXISTS auth_user_date_joined_id_idx;',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS auth_user_email_id_idx ON auth_user (email, id);',
+            reverse_sql='DROP INDEX IF EXISTS auth_user_email_id_idx;',
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:30
+
+from django.db import migrations
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Indexes the exact expression Django emits for icontains/istartswith on Postgres
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm;')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS auth_user_username_trgm_idx ON auth_user USING gin (UPPER(username::text) gin_trgm_ops);'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS auth_user_email_trgm_idx ON auth_user USING gin (UPPER(email::text) gin_trgm_ops);'
+    )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS auth_user_username_trgm_idx;')
+    schema_editor.execute('DROP INDEX IF EXISTS auth_user_email_trgm_idx;')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0010_auth_user_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:51
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0011_auth_user_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('booking', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='seat_hold', to='database.booking')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to='database.tour')),
+            ],
+        ),
+    ]
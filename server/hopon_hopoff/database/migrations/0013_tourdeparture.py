@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0012_seathold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seathold',
+            name='departure_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='TourDeparture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('capacity', models.IntegerField()),
+                ('sold', models.IntegerField(default=0)),
+                ('held', models.IntegerField(default=0)),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='departures', to='database.tour')),
+            ],
+            options={
+                'unique_together': {('tour', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0013_tourdeparture'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscountShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.IntegerField()),
+                ('uses', models.IntegerField(default=0)),
+                ('max_uses', models.IntegerField(blank=True, null=True)),
+                ('discount', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='database.discount')),
+            ],
+            options={
+                'unique_together': {('discount', 'shard')},
+            },
+        ),
+    ]
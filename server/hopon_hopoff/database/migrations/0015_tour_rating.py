@@ -0,0 +1,57 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0014_discountshard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tour',
+            name='rating_1',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='rating_2',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='rating_3',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='rating_4',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='rating_5',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='rating_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(fields=['rating_score', 'id'], name='tour_rating_score_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:04
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_document_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS database_toursearch_document_idx ON database_toursearch USING gin (document);'
+    )
+
+
+def drop_document_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS database_toursearch_document_idx;')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0015_tour_rating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TourSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=500)),
+                ('text', models.TextField(blank=True)),
+                ('document', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('from_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('price_bucket', models.SmallIntegerField()),
+                ('dynamic_level', models.IntegerField(blank=True, null=True)),
+                ('rating_score', models.FloatField(default=0)),
+                ('city', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='database.city')),
+                ('destination', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='database.destination')),
+                ('tour', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='database.tour')),
+                ('tour_type', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='database.tourtype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['city', 'tour_type', 'price_bucket', 'dynamic_level', 'start_date', 'end_date'], name='tour_search_facet_idx'), models.Index(fields=['from_price', 'id'], name='tour_search_price_idx'), models.Index(fields=['rating_score', 'id'], name='tour_search_rating_idx'), models.Index(fields=['start_date', 'id'], name='tour_search_start_idx'), models.Index(fields=['end_date'], name='tour_search_end_idx')],
+            },
+        ),
+        migrations.RunPython(create_document_index, drop_document_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+def keep_one_main_image(apps, schema_editor):
+    # get_main_image() returned the first is_main image: the others stop being main
+    for model_name, owner, ordering in (('TourImage', 'tour_id', ('id',)), ('PostImage', 'post_id', ('order', 'id'))):
+        model = apps.get_model('database', model_name)
+        seen = set()
+        extra = []
+        for pk, owner_id in model.objects.filter(is_main=True).order_by(owner, *ordering).values_list('pk', owner):
+            if owner_id in seen:
+                extra.append(pk)
+            seen.add(owner_id)
+        model.objects.filter(pk__in=extra).update(is_main=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0016_toursearch'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_one_main_image, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='postimage',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_main', True)), fields=('post',), name='post_image_one_main'),
+        ),
+        migrations.AddConstraint(
+            model_name='tourimage',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_main', True)), fields=('tour',), name='tour_image_one_main'),
+        ),
+    ]
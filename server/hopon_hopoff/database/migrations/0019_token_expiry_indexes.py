@@ -0,0 +1,48 @@
+from django.db import migrations, models
+
+# name -> (table, column)
+INDEXES = {
+    'refresh_token_expires_idx': ('auth_refresh_token', 'expires_at'),
+    'reset_token_expires_idx': ('auth_password_reset_token', 'expires_at'),
+    # DRF tokens expire TOKEN_EXPIRE_TIME after `created`
+    'authtoken_token_created_idx': ('authtoken_token', 'created'),
+}
+
+
+def create_indexes(apps, schema_editor):
+    # Built without blocking writes on the (hot) token tables on Postgres
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    for name, (table, column) in INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({column});')
+
+
+def drop_indexes(apps, schema_editor):
+    for name in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name};')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('authtoken', '0004_alter_tokenproxy_options'),
+        ('database', '0018_outboxemail'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='refreshtoken',
+                    index=models.Index(fields=['expires_at'], name='refresh_token_expires_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='passwordresettoken',
+                    index=models.Index(fields=['expires_at'], name='reset_token_expires_idx'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(create_indexes, drop_indexes),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# Emails are unique regardless of case, users without an email are not concerned
+INDEX = 'auth_user_email_ci_uniq'
+
+
+def create_index(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    emails = {}
+    for pk, email in User.objects.exclude(email='').values_list('pk', 'email'):
+        emails.setdefault(email.lower(), []).append(pk)
+    duplicates = {email: pks for email, pks in emails.items() if len(pks) > 1}
+    if duplicates:
+        raise RuntimeError(
+            f"Merge or rename the accounts sharing an email before migrating (email -> user ids): {duplicates}"
+        )
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    schema_editor.execute(
+        f"CREATE UNIQUE INDEX {concurrently}IF NOT EXISTS {INDEX} ON auth_user (LOWER(email)) WHERE email <> '';"
+    )
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX};')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('database', '0019_token_expiry_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
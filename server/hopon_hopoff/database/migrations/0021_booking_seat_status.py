@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:46
+
+from django.db import migrations, models
+
+
+def mark_held_bookings(apps, schema_editor):
+    # Bookings with a hold own its seats. Others are left at 'none': it is not known whether their
+    # seats were reserved, cancelling them must not give back seats they may never have taken.
+    Booking = apps.get_model('database', 'Booking')
+    Booking.objects.filter(seat_hold__isnull=False).update(seat_status='held')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0020_user_email_ci_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='seat_status',
+            field=models.CharField(choices=[('none', 'None'), ('held', 'Held'), ('sold', 'Sold'), ('released', 'Released')], default='none', max_length=20),
+        ),
+        migrations.RunPython(mark_held_bookings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0021_booking_seat_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='discount_uses',
+            field=models.IntegerField(default=0),
+        ),
+    ]
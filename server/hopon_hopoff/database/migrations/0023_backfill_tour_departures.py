@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def backfill_departures(apps, schema_editor):
+    # Departure rows were created empty on first use: count the seats of existing bookings and holds,
+    # otherwise dates with confirmed bookings could be sold to full capacity again
+    from api.services.availability_services import rebuild_departures
+    rebuild_departures()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0022_booking_discount_uses'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_departures, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def backfill_ratings(apps, schema_editor):
+    # The rating columns were added at 0 (migration 0015): compute them from the existing reviews,
+    # otherwise the review signals would build on 0 for tours that already have reviews
+    from api.services.rating_services import rebuild_ratings
+    rebuild_ratings()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0023_backfill_tour_departures'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def populate_documents(apps, schema_editor):
+    # The search documents table was created empty (migration 0016): build a document for every active tour,
+    # after the rating backfill so they carry the real scores
+    from api.services.tour_search_services import refresh_documents
+    refresh_documents()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0024_backfill_tour_ratings'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_documents, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator, URLValidator
 from django.utils import timezone
@@ -17,6 +18,10 @@ class RefreshToken(models.Model):
 
     class Meta:
         db_table = 'auth_refresh_token'
+        indexes = [
+            # Dọn token hết hạn theo lô (api/services/sweeper_services.py)
+            models.Index(fields=['expires_at'], name='refresh_token_expires_idx'),
+        ]
 
     def __str__(self):
         return self.key
@@ -44,6 +49,9 @@ class PasswordResetToken(models.Model):
 
     class Meta:
         db_table = 'auth_password_reset_token'
+        indexes = [
+            models.Index(fields=['expires_at'], name='reset_token_expires_idx'),
+        ]
 
     def is_expired(self):
         return timezone.now() > self.expires_at
@@ -153,6 +161,14 @@ class UserPermission(models.Model):
 # User ─────N-N─────> Permission (via UserPermission)
 
     
+class ProfileQuerySet(models.QuerySet):
+    def for_serializer(self):
+        """Load everything ProfileSerializer reads (user, role, permission codes) in a constant number of queries"""
+        return self.select_related('user', 'user__userrole__role').prefetch_related(
+            models.Prefetch('user__userpermission_set', queryset=UserPermission.objects.select_related('permission')),
+            models.Prefetch('user__userrole__role__permissions', queryset=RolePermission.objects.select_related('permission')),
+        )
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     phone_number = models.CharField(max_length=15)
@@ -164,6 +180,8 @@ class Profile(models.Model):
     gender = models.CharField(max_length=10, choices=[('M', 'Male'), ('F', 'Female')], null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProfileQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
@@ -242,7 +260,34 @@ class MeetingPoint(models.Model):
     name = models.CharField(max_length=500)
     link = models.URLField(max_length=500, blank=True, null=True)
 
-class Tour(models.Model):
+class MainImageMixin:
+    """get_main_image() for models with an `images` relation holding at most one is_main image"""
+    # Attribute filled by MainImageQuerySet.with_main_image()
+    MAIN_IMAGES = 'main_images'
+
+    @classmethod
+    def main_image_prefetch(cls):
+        images = cls._meta.get_field('images').related_model
+        return models.Prefetch('images', queryset=images.objects.filter(is_main=True), to_attr=cls.MAIN_IMAGES)
+
+    @classmethod
+    def prefetch_main_images(cls, objects):
+        """Load the main images of already fetched objects (one page) in one query"""
+        models.prefetch_related_objects(objects, cls.main_image_prefetch())
+
+    def get_main_image(self):
+        # Dùng kết quả prefetch nếu có, tránh một truy vấn cho mỗi dòng
+        if hasattr(self, self.MAIN_IMAGES):
+            main_images = getattr(self, self.MAIN_IMAGES)
+            return main_images[0] if main_images else None
+        return self.images.filter(is_main=True).first()
+
+class MainImageQuerySet(models.QuerySet):
+    def with_main_image(self):
+        """Main image of every row in one extra query, read through get_main_image()"""
+        return self.prefetch_related(self.model.main_image_prefetch())
+
+class Tour(MainImageMixin, models.Model):
     name = models.CharField(max_length=500)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)  # Giá vé mặc định
@@ -268,14 +313,66 @@ class Tour(models.Model):
     is_active = models.BooleanField(default=True)
     is_new = models.BooleanField(default=True)
 
+    # Đánh giá (cập nhật dần từ Review, xem api/services/rating_services.py)
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_1 = models.IntegerField(default=0)  # Số đánh giá 1 sao
+    rating_2 = models.IntegerField(default=0)
+    rating_3 = models.IntegerField(default=0)
+    rating_4 = models.IntegerField(default=0)
+    rating_5 = models.IntegerField(default=0)
+    rating_score = models.FloatField(default=0)  # Điểm trung bình Bayes, dùng để sắp xếp
+
+    # Chỉ rating_services ghi các cột đánh giá (UPDATE nguyên tử), save() thường không ghi đè chúng
+    RATING_FIELDS = ('rating_count', 'rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5', 'rating_score')
+    # Các cột được chép vào tài liệu tìm kiếm (TourSearch): chỉ build lại khi chúng thay đổi
+    SEARCH_FIELDS = ('name', 'description', 'price', 'destination_id', 'tour_type_id', 'start_date', 'end_date',
+                     'dynamic_level', 'is_active')
+
+    objects = MainImageQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['rating_score', 'id'], name='tour_rating_score_idx'),
+        ]
     
     def __str__(self):
         return self.name
-        
-    def get_main_image(self):
-        return self.images.filter(is_main=True).first() # Sắp xếp theo thời gian tạo mới nhất
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Giá trị lúc tải của các cột tìm kiếm: signal biết có cần build lại TourSearch hay không
+        instance._search_state = instance.search_state()
+        return instance
+
+    def search_state(self):
+        # Cột chưa tải (deferred) không bị đọc, coi như không đổi
+        return tuple(self.__dict__.get(field) for field in self.SEARCH_FIELDS)
+
+    def save(self, *args, save_ratings=False, **kwargs):
+        """
+        Updating an existing tour does not write the rating aggregates: the values loaded with the
+        instance may be stale, reviews change them concurrently with atomic UPDATEs.
+        Pass save_ratings=True, or list them in update_fields, to write them.
+        """
+        if not save_ratings and not self._state.adding and not args and not kwargs.get('force_insert') \
+                and kwargs.get('update_fields') is None:
+            skipped = set(self.RATING_FIELDS) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def rating_average(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_{star}') for star in range(1, 6)}
 
 # Loại vé
 class TicketType(models.Model):
@@ -306,12 +403,74 @@ class TourPricing(models.Model):
     def __str__(self):
         return f"{self.tour.name} - {self.ticket_type.name}"
 
+# Tình trạng chỗ theo từng ngày khởi hành (bảng phi chuẩn hóa, cập nhật dần từ Booking/BookingItem)
+class TourDeparture(models.Model):
+    tour = models.ForeignKey(Tour, on_delete=models.CASCADE, related_name='departures')
+    date = models.DateField()  # Ngày khởi hành
+    capacity = models.IntegerField()  # Số chỗ tối đa trong ngày
+    sold = models.IntegerField(default=0)  # Số chỗ đã bán (booking confirmed/completed)
+    held = models.IntegerField(default=0)  # Số chỗ đang giữ (booking pending)
+
+    class Meta:
+        unique_together = ['tour', 'date']
+
+    def __str__(self):
+        return f"{self.tour_id} - {self.date}: {self.sold}+{self.held}/{self.capacity}"
+
+    @property
+    def available(self):
+        return max(self.capacity - self.sold - self.held, 0)
+
+# Tài liệu tìm kiếm của tour (phi chuẩn hóa từ Tour, Destination, City, TourType, TourPricing)
+# Chỉ tour đang hoạt động mới có tài liệu, xem api/services/tour_search_services.py
+class TourSearch(models.Model):
+    tour = models.OneToOneField(Tour, on_delete=models.CASCADE, related_name='search_document')
+    name = models.CharField(max_length=500)
+    text = models.TextField(blank=True)  # Tên tour, điểm đến, thành phố, loại tour, mô tả
+    document = SearchVectorField(null=True)  # tsvector của name + text (chỉ dùng trên Postgres)
+    city = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, related_name='+')
+    destination = models.ForeignKey(Destination, on_delete=models.SET_NULL, null=True, related_name='+')
+    tour_type = models.ForeignKey(TourType, on_delete=models.SET_NULL, null=True, related_name='+')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    from_price = models.DecimalField(max_digits=10, decimal_places=2)  # Giá vé rẻ nhất
+    price_bucket = models.SmallIntegerField()  # Khoảng giá (TOUR_PRICE_BUCKETS)
+    dynamic_level = models.IntegerField(null=True, blank=True)
+    rating_score = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            # Covers the facet GROUP BY and its date filters: counted from the index alone
+            models.Index(fields=['city', 'tour_type', 'price_bucket', 'dynamic_level', 'start_date', 'end_date'],
+                         name='tour_search_facet_idx'),
+            models.Index(fields=['from_price', 'id'], name='tour_search_price_idx'),
+            models.Index(fields=['rating_score', 'id'], name='tour_search_rating_idx'),
+            models.Index(fields=['start_date', 'id'], name='tour_search_start_idx'),
+            models.Index(fields=['end_date'], name='tour_search_end_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
 # Quản lý nhiều hình ảnh cho mỗi tour
 class TourImage(models.Model):
     tour = models.ForeignKey(Tour, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='tours/')
     caption = models.CharField(max_length=200, blank=True)
     is_main = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            # Tối đa một hình ảnh chính cho mỗi tour (chỉ mục duy nhất một phần)
+            models.UniqueConstraint(fields=['tour'], condition=models.Q(is_main=True), name='tour_image_one_main'),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if self.is_main:
+                # Ảnh chính mới thay cho ảnh chính cũ
+                TourImage.objects.filter(tour_id=self.tour_id, is_main=True).exclude(pk=self.pk).update(is_main=False)
+            super().save(*args, **kwargs)
     
     def __str__(self):
         return f"Image for {self.tour.name}"
@@ -348,6 +507,12 @@ class Booking(models.Model):
         ('cancelled', 'Cancelled'),
         ('completed', 'Completed'),
     ]
+    SEAT_STATUS_CHOICES = [
+        ('none', 'None'),  # Chưa giữ chỗ qua inventory_services (booking tạo bằng save())
+        ('held', 'Held'),  # Đang giữ chỗ (SeatHold)
+        ('sold', 'Sold'),
+        ('released', 'Released'),  # Chỗ đã được trả lại (hủy hoặc giữ chỗ hết hạn)
+    ]
     
     # Tour information
     tour = models.ForeignKey(Tour, on_delete=models.CASCADE)
@@ -355,14 +520,23 @@ class Booking(models.Model):
     departure_date = models.DateTimeField()  # Ngày khởi hành
     booking_date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    seat_status = models.CharField(max_length=20, choices=SEAT_STATUS_CHOICES, default='none')  # Chỗ mà booking đang sở hữu
     notes = models.TextField(blank=True)
     discount_code = models.CharField(max_length=50, blank=True)
+    discount_uses = models.IntegerField(default=0)  # Số lượt dùng mã đã trừ cho booking này, trả lại khi hủy
     discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)  # Tổng giá trước giảm
     final_price = models.DecimalField(max_digits=10, decimal_places=2)  # Giá sau khi giảm
     
     def __str__(self):
         return f"Booking {self.id} - {self.tour.name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Tour, ngày và trạng thái lúc tải: signal biết booking có đổi chỗ hay không mà không cần truy vấn lại
+        instance._loaded_state = tuple(instance.__dict__.get(field) for field in ('tour_id', 'departure_date', 'status'))
+        return instance
     
     def calculate_total_price(self):
         """Calculate the total price from the BookingItem"""
@@ -376,6 +550,21 @@ class Booking(models.Model):
             self.final_price = self.total_price - self.discount_amount
         super().save(*args, **kwargs)
 
+# Giữ chỗ tạm thời cho booking chưa thanh toán (ghế đã được cộng vào current_participants)
+class SeatHold(models.Model):
+    tour = models.ForeignKey(Tour, on_delete=models.CASCADE, related_name='seat_holds')
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name='seat_hold', null=True, blank=True)
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    departure_date = models.DateField(null=True, blank=True)  # Ngày khởi hành được giữ chỗ
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)  # Hết hạn thì ghế được trả lại
+
+    def __str__(self):
+        return f"Hold {self.quantity} seats on {self.tour_id} until {self.expires_at}"
+
+    def is_expired(self):
+        return timezone.now() > self.expires_at
+
 # Chi tiết hóa từng loại vé trong booking
 class BookingItem(models.Model):
     booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name="items")
@@ -386,11 +575,29 @@ class BookingItem(models.Model):
 
     def __str__(self):
         return f"{self.quantity} x {self.booking.tour.name} - {self.ticket_type.name}"
-    
-    def save(self, *args, **kwargs):
-        """Automatically calculate total_price on save"""
-        if not self.unit_price:
-            self.unit_price = self.ticket_type.calculate_price(self.booking.tour.price)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Booking và số lượng lúc tải, dùng bởi signal cập nhật số chỗ đã bán
+        instance._loaded_quantity = (instance.__dict__.get('booking_id'), instance.__dict__.get('quantity'))
+        return instance
+    
+    def save(self, *args, prices=None, **kwargs):
+        """
+        Automatically calculate total_price on save.
+        `prices` is a preloaded price table (api.services.pricing_services.PriceTable) to price many items
+        without a query each, otherwise the price is loaded for this item.
+        """
+        if not self.unit_price and prices is not None:
+            self.unit_price = prices.unit_price(self.booking.tour_id, self.ticket_type_id)
+        elif not self.unit_price:
+            # Giá riêng của tour (TourPricing) nếu có, nếu không thì theo phần trăm của loại vé
+            self.unit_price = TourPricing.objects.filter(
+                tour_id=self.booking.tour_id, ticket_type_id=self.ticket_type_id,
+            ).values_list('price', flat=True).first()
+            if self.unit_price is None:
+                self.unit_price = self.ticket_type.calculate_price(self.booking.tour.price)
         self.total_price = self.unit_price * self.quantity
         super().save(*args, **kwargs)
 
@@ -424,6 +631,19 @@ class Discount(models.Model):
             return 0
         return total_amount * (self.discount_percentage / 100)
 
+# Bộ đếm lượt dùng chia nhỏ cho mã giảm giá "nóng": mỗi shard giữ một phần hạn mức max_uses
+class DiscountShard(models.Model):
+    discount = models.ForeignKey(Discount, on_delete=models.CASCADE, related_name='shards')
+    shard = models.IntegerField()
+    uses = models.IntegerField(default=0)
+    max_uses = models.IntegerField(null=True, blank=True)  # Phần hạn mức của shard, null = không giới hạn
+
+    class Meta:
+        unique_together = ['discount', 'shard']
+
+    def __str__(self):
+        return f"{self.discount_id}#{self.shard}: {self.uses}/{self.max_uses}"
+
 class Payment(models.Model):
     PAYMENT_STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -497,7 +717,7 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
-class Post(models.Model):
+class Post(MainImageMixin, models.Model):
     title = models.CharField(max_length=255)
     content = models.TextField()
     excerpt = models.TextField(blank=True)  # Tóm tắt bài viết
@@ -508,15 +728,16 @@ class Post(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='posts', null=True)
 
+    objects = MainImageQuerySet.as_manager()
+
     def __str__(self):
         return self.title
     
-    def get_main_image(self):
-        return self.images.filter(is_main=True).first()
-    
     def increase_views(self):
+        # Ghi trễ theo lô: lượt xem được cộng dồn rồi ghi bằng UPDATE views = views + n (xem counter_services)
+        from api.services.counter_services import post_views
+        post_views.incr(self.pk)
         self.views += 1
-        self.save(update_fields=['views'])
 
 class PostImage(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='images')
@@ -527,6 +748,15 @@ class PostImage(models.Model):
     
     class Meta:
         ordering = ['order', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['post'], condition=models.Q(is_main=True), name='post_image_one_main'),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if self.is_main:
+                PostImage.objects.filter(post_id=self.post_id, is_main=True).exclude(pk=self.pk).update(is_main=False)
+            super().save(*args, **kwargs)
     
     def __str__(self):
         return f"Image for {self.post.title}"
@@ -539,6 +769,43 @@ class Contact(models.Model):
     subject = models.CharField(max_length=255)
     message = models.TextField()
 
+#===================================== Email outbox ===========================
+# Email chờ gửi, được worker nền gửi đi (xem api/services/email_services.py)
+class OutboxEmail(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),  # Hết số lần thử
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbox_emails')
+    # Chỉ một email đang chờ cho mỗi khóa, ví dụ "reset-password:<user_id>"
+    dedupe_key = models.CharField(max_length=200, null=True, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.TextField()  # Danh sách địa chỉ, phân cách bằng dấu phẩy
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)  # Lần gửi (hoặc thử lại) kế tiếp
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_email_due_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedupe_key'], condition=models.Q(status='pending'), name='outbox_email_pending_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to}"
+
 #===================================== Websit config ===========================
 class WebsiteConfig(models.Model):
     hotline = models.CharField(max_length=200, blank=True, null=True)